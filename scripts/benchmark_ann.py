@@ -0,0 +1,60 @@
+# scripts/benchmark_ann.py
+# Recall@k and latency of the IVF index against exact cosine search on synthetic embeddings.
+# Usage: python -m scripts.benchmark_ann --n-vectors 200000 --n-probe 1 4 8 16 32 64
+
+import argparse
+import time
+import numpy as np
+from src.contants import RANDOM_STATE
+from src.models.vector_index import ExactCosineIndex, IVFCosineIndex
+
+def synthetic_embeddings(n_vectors, dim, n_topics, rng):
+    """
+    Clustered unit vectors, roughly like sentence embeddings of a topical corpus.
+    """
+    topics = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    vectors = topics[rng.integers(n_topics, size=n_vectors)]
+    vectors += 0.6 * rng.standard_normal((n_vectors, dim)).astype(np.float32)
+    return vectors
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF vs exact cosine search benchmark")
+    parser.add_argument("--n-vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384) # all-MiniLM-L6-v2
+    parser.add_argument("--n-topics", type=int, default=500)
+    parser.add_argument("--n-queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--n-lists", type=int, default=None)
+    parser.add_argument("--n-probe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(RANDOM_STATE)
+    corpus = synthetic_embeddings(args.n_vectors, args.dim, args.n_topics, rng)
+    # queries are perturbed corpus entries, like paraphrased FAQ questions
+    queries = corpus[rng.integers(args.n_vectors, size=args.n_queries)]
+    queries = queries + 0.5 * rng.standard_normal(queries.shape).astype(np.float32)
+
+    exact = ExactCosineIndex(corpus)
+    start = time.perf_counter()
+    truth = np.vstack([exact.search(q, k=args.k)[0] for q in queries])
+    exact_ms = (time.perf_counter() - start) * 1000 / args.n_queries
+
+    start = time.perf_counter()
+    ivf = IVFCosineIndex(n_lists=args.n_lists).fit(corpus)
+    build_s = time.perf_counter() - start
+
+    print(f"corpus={args.n_vectors} dim={args.dim} n_lists={ivf.n_lists} build={build_s:.1f}s")
+    print(f"exact: {exact_ms:.3f} ms/query")
+    print(f"{'n_probe':>8} {'recall@' + str(args.k):>10} {'ms/query':>10} {'speedup':>8}")
+    for n_probe in args.n_probe:
+        start = time.perf_counter()
+        found = np.vstack([ivf.search(q, k=args.k, n_probe=n_probe)[0] for q in queries])
+        ivf_ms = (time.perf_counter() - start) * 1000 / args.n_queries
+        print(f"{n_probe:>8} {recall_at_k(found, truth):>10.3f} {ivf_ms:>10.3f} {exact_ms / ivf_ms:>7.1f}x")
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+One-off migration for databases seeded while content_hash keyed the seeding (run by hand, never on start):
+
+    python -m scripts.migrate_seed_keys [--delete-duplicate-rows]
+
+- drops the content_hash column and its index from Workouts / Nutrition / FAQ
+- --delete-duplicate-rows: also deletes rows repeating the data of a lower-id row. Repeated rows
+  can be genuine samples (served predictions, repeated CSV entries), so this is opt-in.
+Seeding itself (scripts.seed_data) never deletes rows.
+"""
+from src.custom_logging.logger import logging
+from src.exception.exception import PersonalizedCoachException
+from src.db.connection import get_engine
+from scripts.seed_data import MODEL_MAP, data_columns
+from sqlalchemy import select, delete, func, inspect, text
+import argparse
+import sys
+
+def drop_content_hash(engine, model) -> bool:
+    """
+    Drop the legacy content_hash column (indexes first, SQLite cannot drop an indexed column).
+    """
+    table_name = model.__tablename__
+    inspector = inspect(engine)
+    if table_name not in inspector.get_table_names():
+        return False
+    if "content_hash" not in {column["name"] for column in inspector.get_columns(table_name)}:
+        return False
+    with engine.begin() as conn:
+        for index in inspector.get_indexes(table_name):
+            if "content_hash" in index["column_names"]:
+                conn.execute(text(f'DROP INDEX IF EXISTS "{index["name"]}"'))
+        conn.execute(text(f'ALTER TABLE "{table_name}" DROP COLUMN "content_hash"'))
+    logging.info(f"Dropped {table_name}.content_hash")
+    return True
+
+def delete_duplicate_rows(engine, model) -> int:
+    """
+    Delete rows whose data columns equal those of a lower-id row (the lowest id is kept).
+    """
+    table = model.__table__
+    columns = [table.c[column.name] for column in data_columns(model)]
+    keep = select(func.min(table.c.id)).group_by(*columns)
+    with engine.begin() as conn:
+        deleted = conn.execute(delete(table).where(table.c.id.not_in(keep))).rowcount
+    logging.info(f"Deleted {deleted} duplicate rows from {table.name}")
+    return deleted
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate seeded tables from content_hash to seed_key")
+    parser.add_argument("--delete-duplicate-rows", action="store_true",
+                        help="also delete rows repeating the data of a lower-id row")
+    args = parser.parse_args()
+    try:
+        engine = get_engine()
+        for model in MODEL_MAP.values():
+            dropped = drop_content_hash(engine, model)
+            print(f"{model.__tablename__}: content_hash {'dropped' if dropped else 'not present'}")
+            if args.delete_duplicate_rows:
+                print(f"{model.__tablename__}: {delete_duplicate_rows(engine, model)} duplicate rows deleted")
+    except Exception as e:
+        logging.error(f"Error occurred while migrating seed keys: {e}")
+        raise PersonalizedCoachException(e, sys)
+
+if __name__=="__main__":
+    main()
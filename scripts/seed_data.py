@@ -1,14 +1,49 @@
 from src.custom_logging.logger import logging
 from src.exception.exception import PersonalizedCoachException
 from src.db.connection import get_engine
-from src.db.models import base, Workout, Nutrition, FAQ
+from src.db.models import base, Workout, Nutrition, FAQ, ensure_columns, ensure_indexes
+from src.contants import SEED_CHUNK_ROWS
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import text
+from sqlalchemy import text, select, update, insert, bindparam, Integer, Float
 import pandas as pd
+import hashlib
+import time
+import io
 import os
 import sys
 
+MODEL_MAP = {
+    "Workout": Workout,
+    "Nutrition": Nutrition,
+    "FAQ": FAQ
+}
+
+def data_columns(model) -> list:
+    return [column for column in model.__table__.columns if column.name not in ("id", "seed_key")]
+
+def canonical_value(column, value) -> str:
+    if isinstance(column.type, Float):
+        return repr(float(value))
+    if isinstance(column.type, Integer):
+        return str(int(value))
+    return str(value)
+
+def content_hash(model, row:dict) -> str:
+    """
+    sha256 of the data columns in a type-normalized form (350 == 350.0 for Float columns),
+    so a CSV row and the stored row hash the same.
+    """
+    payload = "\x1f".join(canonical_value(column, row[column.name]) for column in data_columns(model))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def seed_key(source:str, csv_id) -> str:
+    """
+    Idempotency key of a seeded row: the CSV file name and the row's id in that file.
+    Repeated samples (equal data, different ids) stay separate rows.
+    """
+    return f"{source}:{csv_id}"
+
 class DataBaseSeeder:
     """
     Send CSV data into PostgreSQL database via ORM
@@ -17,6 +52,8 @@ class DataBaseSeeder:
         try:
             self.engine = get_engine(db_url)
             base.metadata.create_all(self.engine)
+            ensure_columns(self.engine)
+            ensure_indexes(self.engine)
             self.session = sessionmaker(bind=self.engine)
             
         except Exception as e:
@@ -27,15 +64,10 @@ class DataBaseSeeder:
         try:
             df = pd.read_csv(csv_path)
             session = self.session()
-            model_map = {
-                "Workout": Workout,
-                "Nutrition": Nutrition,
-                "FAQ": FAQ
-            }
-            if table_type not in model_map:
+            if table_type not in MODEL_MAP:
                 raise ValueError(f"Invalid table type: {table_type}")
             
-            ModelClass = model_map[table_type]
+            ModelClass = MODEL_MAP[table_type]
             records_added = 0
             for _, row in df.iterrows():
                 try:
@@ -60,6 +92,154 @@ class DataBaseSeeder:
             logging.error(f"Error occurred while seeding workouts: {e}")
             raise PersonalizedCoachException(e, sys)
         
+    def read_csv_chunks(self, model, csv_path:str, chunk_rows:int, counts:dict):
+        """
+        CSV chunks with the model's data columns coerced to the column types plus seed_key
+        (CSV ids only go into the key, the database assigns ids). A CSV id repeated within the file is
+        inserted once; counts["rows"] / counts["duplicates"] receive the raw CSV rows and the repeated ids.
+        """
+        columns = data_columns(model)
+        source = os.path.basename(csv_path)
+        seen = set()
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+            counts["rows"] += len(chunk)
+            keys = [seed_key(source, csv_id) for csv_id in chunk["id"]]
+            chunk = chunk[[column.name for column in columns]].copy()
+            for column in columns:
+                if isinstance(column.type, Float):
+                    chunk[column.name] = chunk[column.name].astype(float)
+                elif isinstance(column.type, Integer):
+                    chunk[column.name] = chunk[column.name].astype(int)
+                else:
+                    chunk[column.name] = chunk[column.name].astype(str)
+            chunk["seed_key"] = keys
+            unique = chunk.drop_duplicates(subset="seed_key")
+            unique = unique[~unique["seed_key"].isin(seen)]
+            counts["duplicates"] += len(chunk) - len(unique)
+            seen.update(unique["seed_key"])
+            yield unique
+
+    def backfill_seed_keys(self, model, csv_path:str, chunk_rows:int=SEED_CHUNK_ROWS) -> int:
+        """
+        Rows seeded before seed_key existed have it NULL. Each CSV row whose key is not stored yet claims
+        the lowest-id unkeyed row with equal data (at most one), so re-seeding skips it. Rows no CSV row
+        claims (e.g. served predictions written to the table) keep a NULL key; nothing is deleted.
+        """
+        table = model.__table__
+        unclaimed = {} # content hash -> [seed keys], in CSV order
+        with self.engine.connect() as conn:
+            for chunk in self.read_csv_chunks(model, csv_path, chunk_rows, {"rows": 0, "duplicates": 0}):
+                keys = list(chunk["seed_key"])
+                stored = set()
+                for start in range(0, len(keys), 500): # stay below SQLite's bound parameter limit
+                    stored.update(conn.execute(
+                        select(table.c.seed_key).where(table.c.seed_key.in_(keys[start:start + 500]))
+                    ).scalars())
+                for row in chunk.to_dict("records"):
+                    if row["seed_key"] not in stored:
+                        unclaimed.setdefault(content_hash(model, row), []).append(row["seed_key"])
+        if not unclaimed:
+            return 0
+        
+        columns = [table.c.id] + [table.c[column.name] for column in data_columns(model)]
+        claimed = []
+        with self.engine.connect() as conn:
+            result = conn.execution_options(yield_per=chunk_rows).execute(
+                select(*columns).where(table.c.seed_key.is_(None)).order_by(table.c.id)
+            ).mappings()
+            for row in result:
+                keys = unclaimed.get(content_hash(model, row))
+                if keys:
+                    claimed.append({"row_id": row["id"], "key": keys.pop(0)})
+        if claimed:
+            with self.engine.begin() as conn:
+                conn.execute(update(table).where(table.c.id == bindparam("row_id")).values(seed_key=bindparam("key")), claimed)
+            logging.info(f"Backfilled seed_key for {len(claimed)} existing {table.name} rows")
+        return len(claimed)
+    
+    def _copy_upsert(self, conn, model, chunks) -> int:
+        """
+        PostgreSQL: stream every chunk into a temporary staging table with COPY, then insert it with
+        one INSERT ... SELECT ... ON CONFLICT (seed_key) DO NOTHING (safe against concurrent seeders).
+        """
+        table_name = model.__tablename__
+        column_names = [column.name for column in data_columns(model)] + ["seed_key"]
+        column_list = ", ".join(f'"{name}"' for name in column_names)
+        conn.execute(text(f'CREATE TEMP TABLE seed_staging ON COMMIT DROP AS SELECT {column_list} FROM "{table_name}" WITH NO DATA'))
+        cursor = conn.connection.driver_connection.cursor()
+        for chunk in chunks:
+            buffer = io.StringIO()
+            chunk[column_names].to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY seed_staging ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+        return conn.execute(text(
+            f'INSERT INTO "{table_name}" ({column_list}) SELECT {column_list} FROM seed_staging '
+            f'ON CONFLICT (seed_key) DO NOTHING'
+        )).rowcount
+    
+    def _executemany_upsert(self, conn, model, chunks) -> int:
+        """
+        Other databases: executemany per chunk. SQLite inserts with INSERT OR IGNORE on the unique
+        seed_key; elsewhere stored keys are looked up first (the unique index still rejects a racing duplicate).
+        """
+        table = model.__table__
+        inserted = 0
+        for chunk in chunks:
+            rows = chunk.to_dict("records")
+            if self.engine.dialect.name == "sqlite":
+                if rows:
+                    inserted += conn.execute(insert(table).prefix_with("OR IGNORE"), rows).rowcount
+                continue
+            keys = list(chunk["seed_key"])
+            stored = set()
+            for start in range(0, len(keys), 500):
+                stored.update(conn.execute(
+                    select(table.c.seed_key).where(table.c.seed_key.in_(keys[start:start + 500]))
+                ).scalars())
+            rows = [row for row in rows if row["seed_key"] not in stored]
+            if rows:
+                conn.execute(insert(table), rows)
+                inserted += len(rows)
+        return inserted
+    
+    def bulk_seed(self, csv_path:str, table_type:str, chunk_rows:int=SEED_CHUNK_ROWS) -> dict:
+        """
+        Idempotent bulk seeding keyed on the unique seed_key (CSV file + CSV id): rows already stored are
+        skipped, so it is safe to run on every container start, also from several replicas at once.
+        Never deletes rows; de-duplicating old data is the explicit scripts.migrate_seed_keys migration.
+        PostgreSQL streams the CSV through COPY into a staging table; other databases use executemany.
+        Returns the throughput report (rows_read = inserted + skipped + duplicates within the file).
+        """
+        try:
+            if table_type not in MODEL_MAP:
+                raise ValueError(f"Invalid table type: {table_type}")
+            model = MODEL_MAP[table_type]
+            start = time.perf_counter()
+            self.backfill_seed_keys(model, csv_path, chunk_rows)
+            if self.engine.dialect.name == "postgresql":
+                self.reset_sequence(model.__tablename__) # explicit ids of older seeds may be ahead of the sequence
+            
+            counts = {"rows": 0, "duplicates": 0}
+            chunks = self.read_csv_chunks(model, csv_path, chunk_rows, counts)
+            with self.engine.begin() as conn:
+                if self.engine.dialect.name == "postgresql":
+                    inserted = self._copy_upsert(conn, model, chunks)
+                else:
+                    inserted = self._executemany_upsert(conn, model, chunks)
+            
+            seconds = time.perf_counter() - start
+            rows_read = counts["rows"]
+            report = {
+                "table": model.__tablename__, "rows_read": rows_read, "inserted": inserted,
+                "skipped": rows_read - counts["duplicates"] - inserted, "duplicates": counts["duplicates"],
+                "seconds": round(seconds, 3), "rows_per_s": round(rows_read / seconds) if seconds else None
+            }
+            logging.info(f"Seeded {csv_path}: {report}")
+            return report
+        except Exception as e:
+            logging.error(f"Error occurred while bulk seeding {table_type}: {e}")
+            raise PersonalizedCoachException(e, sys)
+    
     def reset_sequence(self, table_name:str):
         """Ensure PostgreSQL autoincrement sequences match max(id) after bulk insert"""
         try:
@@ -83,6 +263,6 @@ class DataBaseSeeder:
         
 if __name__ == "__main__":
     seeder = DataBaseSeeder()
-    seeder.seed_csvs(csv_path=os.path.join("data", "raw_data", "workouts.csv"), table_type="Workout")
-    seeder.seed_csvs(csv_path=os.path.join("data", "raw_data", "nutrition.csv"), table_type="Nutrition")
-    seeder.seed_csvs(csv_path=os.path.join("data", "raw_data", "faq.csv"), table_type="FAQ")
\ No newline at end of file
+    seeder.bulk_seed(csv_path=os.path.join("data", "raw_data", "workouts.csv"), table_type="Workout")
+    seeder.bulk_seed(csv_path=os.path.join("data", "raw_data", "nutrition.csv"), table_type="Nutrition")
+    seeder.bulk_seed(csv_path=os.path.join("data", "raw_data", "faq.csv"), table_type="FAQ")
\ No newline at end of file
@@ -0,0 +1,83 @@
+from src.custom_logging.logger import logging
+from src.contants import *
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import os
+import threading
+import time
+
+class MonitoredExecutor:
+    """
+    Sized thread pool used from async handlers, with queue-depth metrics:
+    - run() awaits fn(*args) on the pool without blocking the event loop
+    - queued = submitted but not started, active = running on a worker
+    - wait/run time totals give the average queueing delay per pool
+    """
+    def __init__(self, name:str, max_workers:int):
+        self.name = name
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-pool")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_queued = 0
+        self.total_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    def _call(self, submitted_at, fn, *args, **kwargs):
+        started_at = time.perf_counter()
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+            self.total_wait_seconds += started_at - submitted_at
+        failed = False
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+                self.failed += failed
+                self.total_run_seconds += time.perf_counter() - started_at
+
+    async def run(self, fn, *args, **kwargs):
+        with self._lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        call = functools.partial(self._call, time.perf_counter(), fn, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, call)
+
+    def shutdown(self, wait:bool=True):
+        logging.info(f"Shutting down {self.name} executor")
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "queued": self.queued,
+                "active": self.active,
+                "max_queued": self.max_queued,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_wait_ms": 1000 * self.total_wait_seconds / self.completed if self.completed else 0.0,
+                "avg_run_ms": 1000 * self.total_run_seconds / self.completed if self.completed else 0.0
+            }
+
+# CPU-bound model work (forests, embeddings) and blocking I/O (DB commits) get separate pools,
+# so slow I/O never occupies the workers that serve inference.
+cpu_executor = MonitoredExecutor("cpu", int(os.getenv("CPU_EXECUTOR_WORKERS", CPU_EXECUTOR_WORKERS or os.cpu_count() or 1)))
+io_executor = MonitoredExecutor("io", int(os.getenv("IO_EXECUTOR_WORKERS", IO_EXECUTOR_WORKERS)))
+
+def executor_stats() -> dict:
+    return {executor.name: executor.stats() for executor in (cpu_executor, io_executor)}
+
+def shutdown_executors(wait:bool=True):
+    for executor in (cpu_executor, io_executor):
+        executor.shutdown(wait=wait)
@@ -1,131 +1,407 @@
-from fastapi import FastAPI, HTTPException, Depends, APIRouter
-from src.pydantic_models import NutritionInput, WorkoutInput, ChatInput
+from fastapi import FastAPI, HTTPException, APIRouter, Request, Query
+from fastapi.responses import StreamingResponse
+from src.pydantic_models import NutritionInput, WorkoutInput, ChatInput, NutritionBatchInput, WorkoutBatchInput
 from src.pipeline.inference_pipeline import InferencePipeline
-from sqlalchemy.orm import sessionmaker, Session
-from src.db.models import base, Workout, Nutrition, FAQ
-from src.db.connection import get_engine
+from sqlalchemy.orm import sessionmaker
+from src.db.models import base, Workout, Nutrition, FAQ, ensure_columns, ensure_indexes, nutrition_log, workout_log
+from src.db.recommendation_log import insert_log_rows, ensure_partitions
+from src.db.record_queries import fetch_page, export_chunks
+from src.db.summaries import nutrition_cohorts, workout_durations, workout_duration_distribution
+from src.db.connection import get_engine, engine_stats
 from src.custom_logging.logger import logging
 from src.exception.exception import PersonalizedCoachException
+from src.API.executors import cpu_executor, io_executor, executor_stats, shutdown_executors
+from src.API.micro_batcher import MicroBatcher
+from src.db.write_behind import WriteBehindWriter, WriteBehindQueueFull
+from src.contants import *
+import os
+from contextlib import asynccontextmanager
 import uvicorn
+import json
+import uuid
+import hmac
+import re
+from typing import Optional
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if write_behind is not None:
+        await write_behind.start()
+    yield
+    if write_behind is not None:
+        await write_behind.stop() # flush queued rows before the executors go away
+    shutdown_executors()
 
 app = FastAPI(
     title="Personalized Coach API",
     description="Unified API for Nutrition, Workout, and Chatbot Recommendations",
-    version='1.0.0'
+    version='1.0.0',
+    lifespan=lifespan
 )
 
 # create DB engine and session
 engine = get_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 base.metadata.create_all(bind=engine)
+ensure_columns(engine)
+ensure_indexes(engine)
+ensure_partitions(engine)
 
-# dependency for database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Persistence of served recommendations: "sync" (logged before responding)
+# or "write_behind" (queued and bulk-inserted in the background); responses carry request_id
+PERSISTENCE = os.getenv("PERSISTENCE_MODE", PERSISTENCE_MODE)
+write_behind = WriteBehindWriter(
+    SessionLocal,
+    io_executor.run,
+    insert_fn=insert_log_rows,
+    max_queue_rows=int(os.getenv("WRITE_BEHIND_MAX_QUEUE_ROWS", WRITE_BEHIND_MAX_QUEUE_ROWS)),
+    flush_size=int(os.getenv("WRITE_BEHIND_FLUSH_SIZE", WRITE_BEHIND_FLUSH_SIZE)),
+    flush_interval_seconds=float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL_SECONDS", WRITE_BEHIND_FLUSH_INTERVAL_SECONDS)),
+    enqueue_timeout_seconds=float(os.getenv("WRITE_BEHIND_ENQUEUE_TIMEOUT_SECONDS", WRITE_BEHIND_ENQUEUE_TIMEOUT_SECONDS)),
+    max_backoff_seconds=float(os.getenv("WRITE_BEHIND_MAX_BACKOFF_SECONDS", WRITE_BEHIND_MAX_BACKOFF_SECONDS)),
+    stop_timeout_seconds=float(os.getenv("WRITE_BEHIND_STOP_TIMEOUT_SECONDS", WRITE_BEHIND_STOP_TIMEOUT_SECONDS)),
+    dead_letter_file=os.getenv("WRITE_BEHIND_DEAD_LETTER_FILE", WRITE_BEHIND_DEAD_LETTER_FILE)
+) if PERSISTENCE == "write_behind" else None
 
 # Initialize inference pipeline
 inference = InferencePipeline()
 
+# Micro-batchers: concurrent single requests share one vectorized model call on the CPU executor
+batch_size = int(os.getenv("MICRO_BATCH_MAX_SIZE", MICRO_BATCH_MAX_SIZE))
+batch_wait_ms = float(os.getenv("MICRO_BATCH_WAIT_MS", MICRO_BATCH_WAIT_MS))
+nutrition_batcher = MicroBatcher("nutrition", inference.recommend_nutrition_batch, cpu_executor, batch_size, batch_wait_ms)
+workout_batcher = MicroBatcher("workout", inference.recommend_workout_batch, cpu_executor, batch_size, batch_wait_ms)
+chat_batcher = MicroBatcher("chat_retrieval", inference.retrieve_chat_batch, cpu_executor, batch_size, batch_wait_ms)
+
 # api endpoints
 @app.get('/')
-def root():
+async def root():
     return {'message':"Welcome to the Personalized Coach API🚀"}
 
+# Served recommendations go to the append-only log tables, not the curated training tables.
+# Blocking DB work runs on the I/O executor with its own session.
+def save_log_rows(table, rows:list):
+    """
+    Insert log rows in a single transaction.
+    """
+    with SessionLocal() as db:
+        insert_log_rows(db, table, rows)
+        db.commit()
+
+async def persist(table, rows:list):
+    """
+    Write-behind mode: queue the rows (raises WriteBehindQueueFull under overload).
+    Sync mode: insert before returning.
+    """
+    if write_behind is not None:
+        await write_behind.enqueue(table, rows)
+    else:
+        await io_executor.run(save_log_rows, table, rows)
+
+REQUEST_ID_PATTERN = re.compile(rf"[A-Za-z0-9_.-]{{1,{REQUEST_ID_MAX_LENGTH}}}")
+
+def get_request_id(request: Request) -> str:
+    """
+    Client X-Request-ID if it fits the log column: UUIDs in any notation are stored as
+    32 hex chars, other ids must be 1-REQUEST_ID_MAX_LENGTH chars of [A-Za-z0-9_.-].
+    Anything else gets a fresh id, so a bad header can never fail the log insert.
+    """
+    header = request.headers.get("X-Request-ID", "").strip()
+    if header:
+        try:
+            return uuid.UUID(header).hex
+        except ValueError:
+            if REQUEST_ID_PATTERN.fullmatch(header):
+                return header
+        logging.warning("Ignoring invalid X-Request-ID header, generating a new request id.")
+    return uuid.uuid4().hex
+
+def queue_full_error(e) -> HTTPException:
+    logging.error(f"Write-behind queue full, rejecting request: {e}")
+    return HTTPException(status_code=503, detail="Server busy, retry shortly", headers={"Retry-After": "1"})
+
+def nutrition_row(record, result:dict, request_id:str) -> dict:
+    return dict(
+        request_id=request_id,
+        meal_name=result.get("meal"),
+        calories=result.get("calories"),
+        protein_g=result.get("protein_g"),
+        carbs_g=result.get("carbs_g"),
+        fats_g=result.get("fats_g"),
+        age=record.age,
+        gender=record.gender,
+        bmi=record.bmi,
+        goal=record.goal,
+        diet_type=record.diet_type,
+    )
+
+def workout_row(record, result:dict, request_id:str) -> dict:
+    return dict(
+        request_id=request_id,
+        name=result["workout"],
+        duration_min=result["duration"],
+        intensity=record.intensity,
+        muscle_group=record.muscle_group,
+        age=record.age,
+        gender=record.gender,
+        goal=record.goal,
+        bmi=record.bmi,
+        fitness_level=record.fitness_level,
+    )
+
 # Nutrition Recommendation Endpoint
 @app.post('/recommend/nutrition')
-def recommend_nutrition(input_data: NutritionInput, db: Session = Depends(get_db)):
+async def recommend_nutrition(input_data: NutritionInput, request: Request):
     try:
         logging.info("Received nutrition recommendation request...")
-        result = inference.recommend_nutrition(input_data.dict())
-
-        # Save to database
-        nutrition_entry = Nutrition(
-            meal_name=result.get("meal"),
-            calories=result.get("calories"),
-            protein_g=result.get("protein_g"),
-            carbs_g=result.get("carbs_g"),
-            fats_g=result.get("fats_g"),
-            age=input_data.age,
-            gender=input_data.gender,
-            bmi=input_data.bmi,
-            goal=input_data.goal,
-            diet_type=input_data.diet_type,
-        )
-        db.add(nutrition_entry)
-        db.commit()
-        db.refresh(nutrition_entry)
+        request_id = get_request_id(request)
+        result = await nutrition_batcher.submit(input_data.dict())
+
+        # Log the served recommendation
+        await persist(nutrition_log, [nutrition_row(input_data, result, request_id)])
 
-        return {
-            "status": "success",
-            "data": result,
-            "db_id": nutrition_entry.id
-        }
+        return {"status": "success", "data": result, "request_id": request_id}
 
+    except WriteBehindQueueFull as e:
+        raise queue_full_error(e)
     except PersonalizedCoachException as e:
         logging.error(f"Error in nutrition endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     
 # Workout Recommendation Endpoint
 @app.post("/recommend/workout")
-def recommend_workout(input_data:WorkoutInput, db: Session = Depends(get_db)):
+async def recommend_workout(input_data:WorkoutInput, request: Request):
     try:
         logging.info("Received workout recommendation request...")
-        result = inference.recommend_workout(input_data.dict())
-
-        # Save to database
-        workout_entry = Workout(
-            name=result["workout"],
-            duration_min=result["duration"],
-            intensity=input_data.intensity,
-            muscle_group=input_data.muscle_group,
-            age=input_data.age,
-            gender=input_data.gender,
-            goal=input_data.goal,
-            bmi=input_data.bmi,
-            fitness_level=input_data.fitness_level,
-        )
-        db.add(workout_entry)
-        db.commit()
-        db.refresh(workout_entry)
+        request_id = get_request_id(request)
+        result = await workout_batcher.submit(input_data.dict())
 
-        return {
-            "status": "success",
-            "data": result,
-            "db_id": workout_entry.id
-        }
+        # Log the served recommendation
+        await persist(workout_log, [workout_row(input_data, result, request_id)])
 
+        return {"status": "success", "data": result, "request_id": request_id}
+
+    except WriteBehindQueueFull as e:
+        raise queue_full_error(e)
     except PersonalizedCoachException as e:
         logging.error(f"Error in workout endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     
-# Chatbot Endpoint
+# Batch Nutrition Recommendation Endpoint
+@app.post('/recommend/nutrition/batch')
+async def recommend_nutrition_batch(input_data: NutritionBatchInput, request: Request):
+    try:
+        logging.info(f"Received batch nutrition recommendation request with {len(input_data.records)} records...")
+        request_id = get_request_id(request)
+        records = [record.dict() for record in input_data.records]
+        results = await cpu_executor.run(inference.recommend_nutrition_batch, records)
+
+        # Log all rows in a single transaction
+        await persist(nutrition_log, [
+            nutrition_row(record, result, request_id) for record, result in zip(input_data.records, results)
+        ])
+
+        return {"status": "success", "count": len(results), "data": results, "request_id": request_id}
+
+    except WriteBehindQueueFull as e:
+        raise queue_full_error(e)
+    except PersonalizedCoachException as e:
+        logging.error(f"Error in batch nutrition endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+# Batch Workout Recommendation Endpoint
+@app.post('/recommend/workout/batch')
+async def recommend_workout_batch(input_data: WorkoutBatchInput, request: Request):
+    try:
+        logging.info(f"Received batch workout recommendation request with {len(input_data.records)} records...")
+        request_id = get_request_id(request)
+        records = [record.dict() for record in input_data.records]
+        results = await cpu_executor.run(inference.recommend_workout_batch, records)
+
+        # Log all rows in a single transaction
+        await persist(workout_log, [
+            workout_row(record, result, request_id) for record, result in zip(input_data.records, results)
+        ])
+
+        return {"status": "success", "count": len(results), "data": results, "request_id": request_id}
+
+    except WriteBehindQueueFull as e:
+        raise queue_full_error(e)
+    except PersonalizedCoachException as e:
+        logging.error(f"Error in batch workout endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+# Chatbot Endpoint (batched embedding on the CPU executor, LLM through the async client)
 @app.post("/chat")
-def chatbot_chat(query: ChatInput):
+async def chatbot_chat(query: ChatInput):
     try:
         logging.info("Chatbot query recieved...")
-        response = inference.chat_with_bot(query.query)
+        response = await inference.achat_with_bot(query.query, retrieve=chat_batcher.submit)
         return {"query":query.query, "response":response}
     except PersonalizedCoachException as e:
         logging.error(f"Error in Chatbot endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     
-# Retreive stored recommendations (for ETL)
+# Streaming Chatbot Endpoint (Server-Sent Events: meta -> token* -> done)
+async def sse_events(events):
+    try:
+        async for event in events:
+            name = event.pop("event")
+            yield f"event: {name}\ndata: {json.dumps(event)}\n\n"
+    except Exception as e:
+        # headers are already sent, so the failure is reported in-band
+        logging.error(f"Error in streaming Chatbot endpoint: {e}")
+        yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+@app.post("/chat/stream")
+async def chatbot_chat_stream(query: ChatInput):
+    logging.info("Streaming chatbot query recieved...")
+    return StreamingResponse(
+        sse_events(inference.achat_with_bot_stream(query.query, retrieve=chat_batcher.submit)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    
+# Retreive stored recommendations (for ETL): keyset pages by id, equality filters
 @app.get("/data/nutrition")
-def get_all_nutrition_records(db:Session=Depends(get_db)):
-    records = db.query(Nutrition).all()
-    return {'count':len(records), 'data':records}
+async def get_all_nutrition_records(after_id: Optional[int] = None,
+                                    limit: int = Query(DATA_PAGE_DEFAULT_LIMIT, ge=1, le=DATA_PAGE_MAX_LIMIT),
+                                    goal: Optional[str] = None, gender: Optional[str] = None,
+                                    diet_type: Optional[str] = None):
+    filters = {"goal": goal, "gender": gender, "diet_type": diet_type}
+    return await io_executor.run(fetch_page, SessionLocal, Nutrition, filters, after_id, limit)
 
 @app.get("/data/workout")
-def get_all_workout_records(db:Session=Depends(get_db)):
-    records = db.query(Workout).all()
-    return {'count':len(records), 'data':records} 
+async def get_all_workout_records(after_id: Optional[int] = None,
+                                  limit: int = Query(DATA_PAGE_DEFAULT_LIMIT, ge=1, le=DATA_PAGE_MAX_LIMIT),
+                                  goal: Optional[str] = None, gender: Optional[str] = None,
+                                  fitness_level: Optional[str] = None, muscle_group: Optional[str] = None):
+    filters = {"goal": goal, "gender": gender, "fitness_level": fitness_level, "muscle_group": muscle_group}
+    return await io_executor.run(fetch_page, SessionLocal, Workout, filters, after_id, limit)
+
+# Streaming export of a whole table (server-side cursor, chunks pulled on the I/O executor)
+async def iterate_blocking(chunks):
+    try:
+        while True:
+            chunk = await io_executor.run(next, chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        await io_executor.run(chunks.close) # releases the cursor if the client disconnects
+
+def export_response(model, filters:dict, fmt:str, filename:str) -> StreamingResponse:
+    return StreamingResponse(
+        iterate_blocking(export_chunks(SessionLocal, model, filters, fmt)),
+        media_type="text/csv" if fmt == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename={filename}.{fmt}"}
+    )
+
+@app.get("/data/nutrition/export")
+async def export_nutrition_records(format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+                                   goal: Optional[str] = None, gender: Optional[str] = None,
+                                   diet_type: Optional[str] = None):
+    filters = {"goal": goal, "gender": gender, "diet_type": diet_type}
+    return export_response(Nutrition, filters, format, "nutrition")
+
+@app.get("/data/workout/export")
+async def export_workout_records(format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+                                 goal: Optional[str] = None, gender: Optional[str] = None,
+                                 fitness_level: Optional[str] = None, muscle_group: Optional[str] = None):
+    filters = {"goal": goal, "gender": gender, "fitness_level": fitness_level, "muscle_group": muscle_group}
+    return export_response(Workout, filters, format, "workout")
+
+# Aggregate analytics over served recommendations, read from the incrementally maintained
+# summary tables (cost depends on the number of cohorts, not on the number of logged rows)
+def read_summary(query_fn, *args):
+    with SessionLocal() as db:
+        return query_fn(db, *args)
+
+def group_by_columns(group_by:str) -> list:
+    return [column.strip() for column in group_by.split(",") if column.strip()]
+
+@app.get("/analytics/nutrition/by-cohort")
+async def nutrition_by_cohort(group_by: str = "goal,diet_type",
+                              goal: Optional[str] = None, gender: Optional[str] = None,
+                              diet_type: Optional[str] = None, meal_name: Optional[str] = None):
+    filters = {"goal": goal, "gender": gender, "diet_type": diet_type, "meal_name": meal_name}
+    try:
+        data = await io_executor.run(read_summary, nutrition_cohorts, group_by_columns(group_by), filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "success", "count": len(data), "data": data}
+
+@app.get("/analytics/workout/duration")
+async def workout_duration_by_cohort(group_by: str = "goal,fitness_level",
+                                     goal: Optional[str] = None, gender: Optional[str] = None,
+                                     fitness_level: Optional[str] = None, name: Optional[str] = None):
+    filters = {"goal": goal, "gender": gender, "fitness_level": fitness_level, "name": name}
+    try:
+        data = await io_executor.run(read_summary, workout_durations, group_by_columns(group_by), filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "success", "count": len(data), "data": data}
+
+@app.get("/analytics/workout/duration-histogram")
+async def workout_duration_histogram(goal: Optional[str] = None, fitness_level: Optional[str] = None):
+    filters = {"goal": goal, "fitness_level": fitness_level}
+    data = await io_executor.run(read_summary, workout_duration_distribution, filters)
+    return {"status": "success", "bucket_width_min": WORKOUT_DURATION_BUCKET_MIN, "data": data}
+
+# Recommendation cache counters
+@app.get("/cache/stats")
+async def recommendation_cache_stats():
+    return inference.cache_stats()
+
+# Chatbot cache counters (query embeddings, semantic answer cache)
+@app.get("/cache/chat/stats")
+async def chat_cache_stats():
+    return inference.chat_cache_stats()
+
+def check_admin_token(request: Request):
+    """
+    Admin endpoints need the X-Admin-Token header to match $ADMIN_TOKEN;
+    without ADMIN_TOKEN they are disabled.
+    """
+    token = os.getenv("ADMIN_TOKEN")
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("X-Admin-Token", "").encode(), token.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+# Reload recommender models from disk (invalidates the result cache)
+@app.post("/admin/reload-models")
+async def reload_models(request: Request):
+    check_admin_token(request)
+    try:
+        await io_executor.run(inference.reload_models)
+        return {"status": "success", "cache": inference.cache_stats()}
+    except PersonalizedCoachException as e:
+        logging.error(f"Error while reloading models: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Queue depth / wait time per executor pool
+@app.get("/metrics/executors")
+async def executors_metrics():
+    return executor_stats()
+
+# Write-behind queue depth and flush counters
+@app.get("/metrics/write-behind")
+async def write_behind_metrics():
+    return {"mode": PERSISTENCE, **(write_behind.stats() if write_behind is not None else {})}
+
+# Micro-batch size / wait-time histograms
+@app.get("/metrics/batching")
+async def batching_metrics():
+    return {batcher.name: batcher.stats() for batcher in (nutrition_batcher, workout_batcher, chat_batcher)}
+
+# Database pool occupancy and checkout-wait histograms
+@app.get("/metrics/db-pool")
+async def db_pool_metrics():
+    return {"engines": engine_stats()}
 
 @app.get("/api/health")
-def health_check():
+async def health_check():
     return {"status": "ok"}
 
 if __name__=="__main__":
@@ -0,0 +1,129 @@
+from src.custom_logging.logger import logging
+from src.contants import *
+import asyncio
+import bisect
+import threading
+import time
+
+class Histogram:
+    """
+    Fixed-bucket histogram (counts per upper bound, last bucket is +inf).
+    """
+    def __init__(self, bounds:list):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self.n = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value:float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.total += value
+            self.n += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            labels = [f"le_{bound:g}" for bound in self.bounds] + ["le_inf"]
+            return {
+                "count": self.n,
+                "mean": self.total / self.n if self.n else 0.0,
+                "buckets": dict(zip(labels, self.counts))
+            }
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-item requests into one vectorized call:
+    - requests arriving within max_wait_ms of the first pending one share a batch
+    - a batch is dispatched early once max_batch_size items are pending
+    - batch_fn(items) -> results (same order) runs on the given executor
+    - every caller awaits only its own result; if a batch fails, its items are retried
+      one by one so only the offending request gets the error
+    Batch sizes and per-item wait before dispatch are recorded as histograms.
+    """
+    def __init__(self, name:str, batch_fn, executor, max_batch_size:int=MICRO_BATCH_MAX_SIZE,
+                 max_wait_ms:float=MICRO_BATCH_WAIT_MS):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max_wait_ms
+        self._pending = [] # (item, future, enqueued_at)
+        self._timer = None
+        self._tasks = set()
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64, 128, 256])
+        self.wait_ms = Histogram([0.5, 1, 2, 5, 10, 20, 50, 100])
+        self.batches = 0
+        self.failed_batches = 0
+        self.failed_items = 0
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _call(self, items:list) -> list:
+        results = await self.executor.run(self.batch_fn, items)
+        if len(results) != len(items):
+            raise RuntimeError(f"{self.name} batch returned {len(results)} results for {len(items)} items")
+        return results
+
+    async def _run_single(self, item, future):
+        try:
+            result = (await self._call([item]))[0]
+        except Exception as e:
+            self.failed_items += 1
+            if not future.done(): # caller may have gone away
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
+
+    async def _run(self, batch):
+        dispatched_at = time.perf_counter()
+        self.batches += 1
+        self.batch_sizes.observe(len(batch))
+        for _, _, enqueued_at in batch:
+            self.wait_ms.observe(1000 * (dispatched_at - enqueued_at))
+
+        if len(batch) == 1:
+            await self._run_single(batch[0][0], batch[0][1])
+            return
+        try:
+            results = await self._call([item for item, _, _ in batch])
+        except Exception as e:
+            # isolate the failing request(s): every item is retried on its own
+            self.failed_batches += 1
+            logging.info(f"Error in {self.name} micro-batch of {len(batch)} items, retrying items one by one: {e}")
+            await asyncio.gather(*(self._run_single(item, future) for item, future, _ in batch))
+            return
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "failed_items": self.failed_items,
+            "batch_size": self.batch_sizes.snapshot(),
+            "wait_ms": self.wait_ms.snapshot()
+        }
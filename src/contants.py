@@ -11,17 +11,107 @@ FAQ_CSV_FILE_NAME = "faq.csv"
 WORKOUTS_TABLE_NAME = "Workouts"
 NUTRITION_TABLE_NAME = "Nutrition"
 FAQ_TABLE_NAME = "FAQ"
+NUTRITION_LOG_TABLE_NAME = "nutrition_log"
+WORKOUT_LOG_TABLE_NAME = "workout_log"
+RECOMMENDATION_CODES_TABLE_NAME = "recommendation_codes"
+NUTRITION_SUMMARY_TABLE_NAME = "nutrition_summary"
+WORKOUT_SUMMARY_TABLE_NAME = "workout_summary"
+WORKOUT_DURATION_HISTOGRAM_TABLE_NAME = "workout_duration_histogram"
 
-# File path for clean + processed data
-NUTRITION_PATH="D:\\AI---Personalized-Workout-Nutrition-Coach\\data\\processed\\Nutrition_transformed.csv"
-WORKOUT_PATH="D:\\AI---Personalized-Workout-Nutrition-Coach\\data\\processed\\Workout_tranformed.csv"
-FAQ_PATH="D:\\AI---Personalized-Workout-Nutrition-Coach\\data\\processed\\FAQ_transformed.csv"
+# File path for clean + processed data (the PROCESSED_DATA_DIR environment variable overrides the directory)
+PROCESSED_DATA_DIR="data/processed"
+NUTRITION_PROCESSED_FILE="Nutrition_transformed.csv"
+WORKOUT_PROCESSED_FILE="Workout_tranformed.csv"
+FAQ_PROCESSED_FILE="FAQ_transformed.csv"
+NUTRITION_PATH=f"{PROCESSED_DATA_DIR}/{NUTRITION_PROCESSED_FILE}"
+WORKOUT_PATH=f"{PROCESSED_DATA_DIR}/{WORKOUT_PROCESSED_FILE}"
+FAQ_PATH=f"{PROCESSED_DATA_DIR}/{FAQ_PROCESSED_FILE}"
 
 # OUTPUT DIR for model saving
 NUTRITION_OUT="models/nutrition_model"
 WORKOUT_OUT="models/workout_model"
 CHATBOT_OUT="models/chatbot_model"
 
+# Inference engine for the recommenders: "sklearn" or "compiled"
+INFERENCE_ENGINE="sklearn"
+
+# Prediction lookup tables (optional precomputation stage, saved next to the models)
+BUILD_LOOKUP_TABLES=False
+INFERENCE_LOOKUP=False # answer in-range requests from the lookup tables
+LOOKUP_AGE_STEP=1.0
+LOOKUP_BMI_STEP=0.5
+NUTRITION_LOOKUP_FILE="nutrition_lookup_table.npz"
+WORKOUT_LOOKUP_FILE="workout_lookup_table.npz"
+
+# Recommendation result cache (LRU + TTL), RESULT_CACHE_MAX_SIZE=0 disables it
+RESULT_CACHE_MAX_SIZE=10000
+RESULT_CACHE_TTL_SECONDS=600
+INPUT_BMI_PRECISION=1 # decimals of BMI kept by the request normalization (model input and cache key)
+
+# Chatbot retrieval index: "exact", "ivf" or "auto" (ivf once the corpus reaches ANN_MIN_CORPUS_SIZE)
+RETRIEVER_INDEX_TYPE="auto"
+ANN_MIN_CORPUS_SIZE=50000
+IVF_DEFAULT_N_PROBE=16
+IVF_INDEX_FILE="faq_ivf_index.npz"
+EMBEDDING_CACHE_MAX_SIZE=4096 # cached query embeddings (384 float32 each)
+
+# Semantic cache for generated (RAG) chatbot answers
+SEMANTIC_CACHE_MAX_SIZE=1000
+SEMANTIC_CACHE_TTL_SECONDS=3600
+SEMANTIC_CACHE_MIN_SIMILARITY=0.95 # cosine similarity needed to reuse a cached answer
+SEMANTIC_CACHE_WAIT_TIMEOUT_SECONDS=30 # max wait for a coalesced answer before generating independently
+
+# API
+RECOMMEND_BATCH_MAX_SIZE=1000 # max records accepted by /recommend/*/batch
+CPU_EXECUTOR_WORKERS=None # model inference pool size (None = os.cpu_count())
+IO_EXECUTOR_WORKERS=16 # blocking DB work pool size
+MICRO_BATCH_MAX_SIZE=64 # single-record requests coalesced per model call
+MICRO_BATCH_WAIT_MS=3 # max time the first request of a batch waits for others
+
+# Persistence of served recommendations: "sync" or "write_behind"
+PERSISTENCE_MODE="sync"
+WRITE_BEHIND_MAX_QUEUE_ROWS=50000 # buffered rows before requests get 503
+WRITE_BEHIND_FLUSH_SIZE=500
+WRITE_BEHIND_FLUSH_INTERVAL_SECONDS=0.5
+WRITE_BEHIND_ENQUEUE_TIMEOUT_SECONDS=0.05
+WRITE_BEHIND_MAX_BACKOFF_SECONDS=5 # cap of the retry backoff while the database is unreachable
+WRITE_BEHIND_STOP_TIMEOUT_SECONDS=30 # shutdown flush deadline, then remaining rows are dead-lettered
+WRITE_BEHIND_DEAD_LETTER_FILE="data/write_behind_dead_letter.jsonl" # rows that could not be inserted (JSON lines)
+
+# /data/* endpoints
+DATA_PAGE_DEFAULT_LIMIT=100
+DATA_PAGE_MAX_LIMIT=1000
+EXPORT_CHUNK_ROWS=1000 # rows per server-side cursor fetch / streamed chunk
+
+# Recommendation log (served predictions)
+LOG_PARTITION_MONTHS_AHEAD=2 # monthly PostgreSQL partitions created ahead of time
+LOG_RETENTION_DAYS=180
+LOG_COMPACT_AFTER_DAYS=7 # older rows with identical inputs/outputs are merged per day
+INCLUDE_LOGGED_PREDICTIONS=False # add logged predictions to the ETL training extract
+WORKOUT_DURATION_BUCKET_MIN=5 # bucket width of the workout duration histogram
+REQUEST_ID_MAX_LENGTH=32 # stored X-Request-ID length (UUIDs are kept as 32 hex chars)
+
+# ETL
+ETL_CHUNK_ROWS=50000 # rows per server-side cursor fetch in streaming mode
+ETL_STATE_FILE="etl_state.json" # high-water marks of the incremental ETL, kept in the processed data dir
+ETL_MAX_WORKERS=3 # table jobs run concurrently in parallel mode
+ETL_LOG_SAFETY_MARGIN_SECONDS=60 # incremental runs skip log rows newer than now - write-behind flush interval - margin
+PROCESSED_FORMAT="csv" # processed data files: "csv", "parquet" or "feather" (typed, columnar)
+TRAINING_HANDOFF="files" # ETL -> training: "files" (write, then re-read) or "memory" (DataFrames passed directly)
+PERSIST_PROCESSED="async" # processed files in "memory" handoff: "async" (background), "sync" or "none"
+
+# Database engine (shared per process; DB_* environment variables of the same name override)
+DB_POOL_SIZE=5
+DB_MAX_OVERFLOW=10
+DB_POOL_TIMEOUT_SECONDS=30 # max wait for a free connection before TimeoutError
+DB_POOL_RECYCLE_SECONDS=1800 # reconnect connections older than this (server/proxy idle timeouts)
+DB_POOL_PRE_PING=True # test connections on checkout, replacing dropped ones
+DB_STATEMENT_TIMEOUT_MS=0 # PostgreSQL statement_timeout, 0 disables it
+DB_SQLITE_BUSY_TIMEOUT_SECONDS=30 # SQLite: wait on a locked database before failing
+
+# Database seeding
+SEED_CHUNK_ROWS=10000 # CSV rows per COPY / executemany batch
+
 # Common
 RANDOM_STATE=42
 TRAIN_TEST_SPLIT_RATIO=0.2
\ No newline at end of file
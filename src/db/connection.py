@@ -1,19 +1,161 @@
 from src.custom_logging.logger import logging
 from src.exception.exception import PersonalizedCoachException
-from sqlalchemy import create_engine
+from src.contants import *
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool, StaticPool
 from sqlalchemy.orm import sessionmaker
 import os
 import sys
+import time
+import threading
 from dotenv import load_dotenv
 load_dotenv()
 
-def get_engine(db_url: str=None):
+# checkout waits are counted per upper bound (ms); the last bucket is everything slower
+CHECKOUT_WAIT_BUCKETS_MS = [1, 10, 100, 1000]
+# create_engine options only a QueuePool accepts
+QUEUE_POOL_OPTIONS = ("pool_size", "max_overflow", "pool_timeout", "pool_recycle")
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that records how long checkouts wait for a free connection
+    (pool exhausted -> wait up to pool_timeout, then TimeoutError).
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.wait_histogram = [0] * (len(CHECKOUT_WAIT_BUCKETS_MS) + 1)
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            waited = time.perf_counter() - started_at
+            bucket = next((i for i, bound in enumerate(CHECKOUT_WAIT_BUCKETS_MS) if 1000 * waited < bound),
+                          len(CHECKOUT_WAIT_BUCKETS_MS))
+            with self._stats_lock:
+                self.checkouts += 1
+                self.timeouts += timed_out
+                self.total_wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+                self.wait_histogram[bucket] += 1
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            labels = [f"<{bound}ms" for bound in CHECKOUT_WAIT_BUCKETS_MS] + [f">={CHECKOUT_WAIT_BUCKETS_MS[-1]}ms"]
+            return {
+                "pool_size": self.size(),
+                "checked_out": self.checkedout(),
+                "checked_in": self.checkedin(),
+                "overflow": self.overflow(),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": 1000 * self.total_wait_seconds / self.checkouts if self.checkouts else 0.0,
+                "max_wait_ms": 1000 * self.max_wait_seconds,
+                "wait_histogram": dict(zip(labels, self.wait_histogram))
+            }
+
+## process-wide registry: one engine (and pool) per URL + engine options
+_engines = {}
+_engines_lock = threading.Lock()
+
+def database_url(db_url:str=None) -> str:
+    """
+    db_url, else $DB_URI, else $DATABASE_URL (postgres:// is accepted as postgresql://).
+    """
+    db_url = db_url or os.getenv("DB_URI") or os.getenv("DATABASE_URL")
+    if not db_url:
+        raise ValueError("DB_URI (or DATABASE_URL) environment variable not set")
+    if db_url.startswith("postgres://"):
+        db_url = "postgresql://" + db_url[len("postgres://"):]
+    return db_url
+
+def pool_settings() -> dict:
+    """
+    Pool options from the environment (DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT_SECONDS,
+    DB_POOL_RECYCLE_SECONDS, DB_POOL_PRE_PING), defaults in contants.
+    """
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", DB_POOL_SIZE)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", DB_MAX_OVERFLOW)),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT_SECONDS", DB_POOL_TIMEOUT_SECONDS)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE_SECONDS", DB_POOL_RECYCLE_SECONDS)),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", str(DB_POOL_PRE_PING)).lower() in ("1", "true", "yes")
+    }
+
+def engine_options(db_url:str, **engine_kwargs) -> dict:
+    """
+    create_engine options for db_url: environment pool settings, dialect connect_args
+    (statement timeout on PostgreSQL, busy timeout + cross-thread use on SQLite), then engine_kwargs.
+    """
+    url = make_url(db_url)
+    options = {"poolclass": TimedQueuePool, **pool_settings()}
+    connect_args = {}
+    if url.get_backend_name() == "postgresql":
+        statement_timeout_ms = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", DB_STATEMENT_TIMEOUT_MS))
+        if statement_timeout_ms > 0:
+            connect_args["options"] = f"-c statement_timeout={statement_timeout_ms}"
+    elif url.get_backend_name() == "sqlite":
+        # connections move between the API/ETL worker threads; SQLite waits on locks instead of timing out statements
+        connect_args["check_same_thread"] = False
+        connect_args["timeout"] = float(os.getenv("DB_SQLITE_BUSY_TIMEOUT_SECONDS", DB_SQLITE_BUSY_TIMEOUT_SECONDS))
+        if url.database in (None, "", ":memory:"):
+            # an in-memory database exists per connection: share a single one, no pool options
+            options = {"poolclass": StaticPool}
+            engine_kwargs = {key: value for key, value in engine_kwargs.items() if key not in QUEUE_POOL_OPTIONS}
+    options["connect_args"] = {**connect_args, **engine_kwargs.pop("connect_args", {})}
+    options.update(engine_kwargs)
+    return options
+
+def get_engine(db_url: str=None, **engine_kwargs):
+    """
+    Shared engine for db_url (default $DB_URI / $DATABASE_URL): created on first use, then reused
+    process-wide so every caller draws from one pool. engine_kwargs (e.g. pool_size) override the
+    environment pool settings and get their own engine.
+    """
     try:
-        db_uri = os.getenv("DB_URI")
-        if not db_uri:
-            raise ValueError("DB_URI environment variable not set")
-        engine = create_engine(db_uri)
+        db_uri = database_url(db_url)
+        key = (db_uri, repr(sorted(engine_kwargs.items())))
+        with _engines_lock:
+            engine = _engines.get(key)
+            if engine is None:
+                options = engine_options(db_uri, **engine_kwargs)
+                engine = create_engine(db_uri, **options)
+                _engines[key] = engine
+                logging.info(f"Created database engine for {engine.url!r} with {engine.pool.__class__.__name__}")
         return engine
     except Exception as e:
         logging.error(f"Error occurred while getting database engine: {e}")
         raise PersonalizedCoachException(e, sys)
+
+def dispose_engines(close:bool=True):
+    """
+    Dispose every registered engine's pool. close=False (in a forked child) drops the
+    inherited connections without closing them, so the parent's sessions stay valid.
+    """
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose(close=close)
+
+def engine_stats() -> list:
+    """
+    Pool occupancy and checkout-wait metrics of every registered engine.
+    """
+    with _engines_lock:
+        engines = list(_engines.values())
+    stats = []
+    for engine in engines:
+        pool = engine.pool
+        stats.append({"url": engine.url.render_as_string(hide_password=True),
+                      **(pool.stats() if isinstance(pool, TimedQueuePool) else {"status": pool.status()})})
+    return stats
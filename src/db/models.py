@@ -1,10 +1,11 @@
 ## schema for db
 from src.custom_logging.logger import logging
 from src.exception.exception import PersonalizedCoachException
-from src.contants import WORKOUTS_TABLE_NAME, NUTRITION_TABLE_NAME, FAQ_TABLE_NAME
+from src.contants import (WORKOUTS_TABLE_NAME, NUTRITION_TABLE_NAME, FAQ_TABLE_NAME, NUTRITION_LOG_TABLE_NAME, WORKOUT_LOG_TABLE_NAME, RECOMMENDATION_CODES_TABLE_NAME,
+                          NUTRITION_SUMMARY_TABLE_NAME, WORKOUT_SUMMARY_TABLE_NAME, WORKOUT_DURATION_HISTOGRAM_TABLE_NAME, REQUEST_ID_MAX_LENGTH)
 import sys
 
-from sqlalchemy import Column, Integer, String, Float, Text
+from sqlalchemy import Column, Integer, SmallInteger, String, Float, Text, Index, Table, DateTime, REAL, UniqueConstraint, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 
 base = declarative_base()
@@ -21,6 +22,15 @@ class Workout(base):
     goal = Column(String(100), nullable=False)
     bmi = Column(Float, nullable=False)
     fitness_level = Column(String(100), nullable=False)
+    seed_key = Column(String(255), unique=True, index=True) # "<csv file>:<csv id>" of seeded rows (NULL otherwise), keys idempotent seeding
+    
+    # (filter, id) indexes serve keyset pagination with an equality filter
+    __table_args__ = (
+        Index('ix_workouts_goal_id', 'goal', 'id'),
+        Index('ix_workouts_gender_id', 'gender', 'id'),
+        Index('ix_workouts_fitness_level_id', 'fitness_level', 'id'),
+        Index('ix_workouts_muscle_group_id', 'muscle_group', 'id'),
+    )
     
 class Nutrition(base):
     __tablename__ = NUTRITION_TABLE_NAME
@@ -35,9 +45,136 @@ class Nutrition(base):
     bmi = Column(Float, nullable=False)
     goal = Column(String(100), nullable=False)
     diet_type = Column(String(100), nullable=False)
+    seed_key = Column(String(255), unique=True, index=True)
+    
+    __table_args__ = (
+        Index('ix_nutrition_goal_id', 'goal', 'id'),
+        Index('ix_nutrition_gender_id', 'gender', 'id'),
+        Index('ix_nutrition_diet_type_id', 'diet_type', 'id'),
+    )
     
 class FAQ(base):
     __tablename__ = FAQ_TABLE_NAME
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     question = Column(Text, nullable=False)
-    answer = Column(Text, nullable=False)
\ No newline at end of file
+    answer = Column(Text, nullable=False)
+    seed_key = Column(String(255), unique=True, index=True)
+
+## append-only log of served recommendations (kept out of the curated training tables)
+class RecommendationCode(base):
+    """
+    Dictionary of categorical values used by the log tables: (field, value) -> code.
+    """
+    __tablename__ = RECOMMENDATION_CODES_TABLE_NAME
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    field = Column(String(50), nullable=False)
+    value = Column(String(100), nullable=False)
+    __table_args__ = (UniqueConstraint('field', 'value', name='uq_recommendation_codes_field_value'),)
+
+# Log tables: no surrogate key, range-partitioned by logged_at on PostgreSQL (plain tables elsewhere).
+# <column>_code holds the RecommendationCode of the training-table column of the same name;
+# hits > 1 marks rows merged by compaction (request_id is NULL then).
+nutrition_log = Table(
+    NUTRITION_LOG_TABLE_NAME, base.metadata,
+    Column('logged_at', DateTime, nullable=False),
+    Column('request_id', String(REQUEST_ID_MAX_LENGTH)),
+    Column('meal_name_code', SmallInteger, nullable=False),
+    Column('calories', REAL, nullable=False),
+    Column('protein_g', REAL, nullable=False),
+    Column('carbs_g', REAL, nullable=False),
+    Column('fats_g', REAL, nullable=False),
+    Column('age', SmallInteger, nullable=False),
+    Column('gender_code', SmallInteger, nullable=False),
+    Column('bmi', REAL, nullable=False),
+    Column('goal_code', SmallInteger, nullable=False),
+    Column('diet_type_code', SmallInteger, nullable=False),
+    Column('hits', Integer, nullable=False, default=1),
+    Index('ix_nutrition_log_logged_at', 'logged_at'),
+    postgresql_partition_by='RANGE (logged_at)'
+)
+
+workout_log = Table(
+    WORKOUT_LOG_TABLE_NAME, base.metadata,
+    Column('logged_at', DateTime, nullable=False),
+    Column('request_id', String(REQUEST_ID_MAX_LENGTH)),
+    Column('name_code', SmallInteger, nullable=False),
+    Column('duration_min', REAL, nullable=False),
+    Column('intensity_code', SmallInteger, nullable=False),
+    Column('muscle_group_code', SmallInteger, nullable=False),
+    Column('age', SmallInteger, nullable=False),
+    Column('gender_code', SmallInteger, nullable=False),
+    Column('goal_code', SmallInteger, nullable=False),
+    Column('bmi', REAL, nullable=False),
+    Column('fitness_level_code', SmallInteger, nullable=False),
+    Column('hits', Integer, nullable=False, default=1),
+    Index('ix_workout_log_logged_at', 'logged_at'),
+    postgresql_partition_by='RANGE (logged_at)'
+)
+
+## summaries of served recommendations, upserted with every log insert (analytics endpoints read only these)
+nutrition_summary = Table(
+    NUTRITION_SUMMARY_TABLE_NAME, base.metadata,
+    Column('goal', String(100), primary_key=True),
+    Column('diet_type', String(100), primary_key=True),
+    Column('gender', String(10), primary_key=True),
+    Column('meal_name', String(100), primary_key=True),
+    Column('n', Integer, nullable=False),
+    Column('sum_calories', Float, nullable=False),
+    Column('sum_protein_g', Float, nullable=False),
+    Column('sum_carbs_g', Float, nullable=False),
+    Column('sum_fats_g', Float, nullable=False)
+)
+
+workout_summary = Table(
+    WORKOUT_SUMMARY_TABLE_NAME, base.metadata,
+    Column('goal', String(100), primary_key=True),
+    Column('fitness_level', String(100), primary_key=True),
+    Column('gender', String(10), primary_key=True),
+    Column('name', String(100), primary_key=True),
+    Column('n', Integer, nullable=False),
+    Column('sum_duration_min', Float, nullable=False),
+    Column('sum_sq_duration_min', Float, nullable=False),
+    Column('min_duration_min', Float, nullable=False),
+    Column('max_duration_min', Float, nullable=False)
+)
+
+workout_duration_histogram = Table(
+    WORKOUT_DURATION_HISTOGRAM_TABLE_NAME, base.metadata,
+    Column('goal', String(100), primary_key=True),
+    Column('fitness_level', String(100), primary_key=True),
+    Column('bucket_start', Float, primary_key=True), # duration bucket [start, start + width)
+    Column('n', Integer, nullable=False)
+)
+
+def ensure_columns(engine):
+    """
+    Add nullable columns missing from existing tables (create_all only creates whole tables).
+    """
+    try:
+        existing_tables = set(inspect(engine).get_table_names())
+        with engine.begin() as conn:
+            for table in base.metadata.sorted_tables:
+                if table.name not in existing_tables:
+                    continue
+                existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+                for column in table.columns:
+                    if column.name in existing or not column.nullable or column.primary_key:
+                        continue
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+                    logging.info(f"Added column {table.name}.{column.name}")
+    except Exception as e:
+        logging.error(f"Error while adding columns: {e}")
+        raise PersonalizedCoachException(e, sys)
+
+def ensure_indexes(engine):
+    """
+    Create missing indexes on existing tables (create_all only indexes tables it creates).
+    """
+    try:
+        for table in base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+    except Exception as e:
+        logging.error(f"Error while creating indexes: {e}")
+        raise PersonalizedCoachException(e, sys)
@@ -0,0 +1,250 @@
+from src.custom_logging.logger import logging
+from src.exception.exception import PersonalizedCoachException
+from src.contants import *
+from src.db.models import RecommendationCode, nutrition_log, workout_log
+from src.db.summaries import update_summaries, expire_summaries
+from sqlalchemy import select, insert, delete, func, text, and_
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
+import threading
+import sys
+import pandas as pd
+
+LOG_TABLES = {"nutrition": nutrition_log, "workout": workout_log}
+LOG_KINDS = {table.name: kind for kind, table in LOG_TABLES.items()}
+CODE_SUFFIX = "_code"
+
+class CodeDictionary:
+    """
+    Process-wide cache of the recommendation_codes table:
+    known (field, value) pairs never hit the database, new ones are inserted once.
+    """
+    def __init__(self):
+        self._codes = {} # (field, value) -> code
+        self._lock = threading.Lock()
+
+    def codes(self, db, field:str, values) -> dict:
+        """
+        {value: code} for every value of field, creating missing codes.
+        """
+        wanted = set(values)
+        with self._lock:
+            missing = [value for value in wanted if (field, value) not in self._codes]
+        if missing:
+            self._load(db, field, missing)
+            with self._lock:
+                still_missing = [value for value in missing if (field, value) not in self._codes]
+            if still_missing:
+                try:
+                    # own transaction, so a concurrent insert of the same value only fails this statement
+                    with db.get_bind().begin() as conn:
+                        conn.execute(insert(RecommendationCode), [{"field": field, "value": value} for value in still_missing])
+                except IntegrityError:
+                    pass
+                self._load(db, field, still_missing)
+        with self._lock:
+            return {value: self._codes[(field, value)] for value in wanted}
+
+    def _load(self, db, field, values):
+        rows = db.execute(
+            select(RecommendationCode.value, RecommendationCode.id)
+            .where(RecommendationCode.field == field, RecommendationCode.value.in_(values))
+        ).all()
+        with self._lock:
+            for value, code in rows:
+                self._codes[(field, value)] = code
+
+code_dictionary = CodeDictionary()
+
+def insert_log_rows(db, table, rows:list, logged_at:datetime=None):
+    """
+    Insert raw recommendation rows (training-table column names, e.g. gender='male')
+    into a log table, replacing categorical values by their codes.
+    The analytics summaries are updated in the same transaction.
+    """
+    logged_at = logged_at or datetime.utcnow()
+    coded_columns = [column.name for column in table.columns if column.name.endswith(CODE_SUFFIX)]
+    codes = {
+        column: code_dictionary.codes(db, column[:-len(CODE_SUFFIX)], [row[column[:-len(CODE_SUFFIX)]] for row in rows])
+        for column in coded_columns
+    }
+    log_rows = []
+    for row in rows:
+        log_row = {"logged_at": row.get("logged_at", logged_at), "request_id": row.get("request_id"), "hits": 1}
+        for column in table.columns:
+            name = column.name
+            if name in coded_columns:
+                log_row[name] = codes[name][row[name[:-len(CODE_SUFFIX)]]]
+            elif name not in log_row:
+                log_row[name] = row[name]
+        log_rows.append(log_row)
+    db.execute(insert(table), log_rows)
+    update_summaries(db, LOG_KINDS[table.name], rows)
+
+def partition_name(table, month_start:datetime) -> str:
+    return f"{table.name}_p{month_start:%Y%m}"
+
+def ensure_partitions(engine, months_ahead:int=LOG_PARTITION_MONTHS_AHEAD, now:datetime=None):
+    """
+    PostgreSQL: create monthly partitions from the current month to months_ahead (plus a
+    DEFAULT partition as a safety net). Other databases keep one plain table; nothing to do.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    try:
+        month = (now or datetime.utcnow()).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        with engine.begin() as conn:
+            for table in LOG_TABLES.values():
+                conn.execute(text(f'CREATE TABLE IF NOT EXISTS "{table.name}_default" PARTITION OF "{table.name}" DEFAULT'))
+                start = month
+                for _ in range(months_ahead + 1):
+                    end = (start + timedelta(days=32)).replace(day=1)
+                    conn.execute(text(
+                        f'CREATE TABLE IF NOT EXISTS "{partition_name(table, start)}" PARTITION OF "{table.name}" '
+                        f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+                    ))
+                    start = end
+        logging.info(f"Recommendation log partitions ensured {months_ahead} months ahead.")
+    except Exception as e:
+        logging.error(f"Error while creating recommendation log partitions: {e}")
+        raise PersonalizedCoachException(e, sys)
+
+def apply_retention(engine, retention_days:int=LOG_RETENTION_DAYS, now:datetime=None) -> dict:
+    """
+    Remove log rows older than retention_days.
+    PostgreSQL drops whole monthly partitions that ended before the cutoff (no row-by-row delete),
+    then deletes the remaining expired rows of the boundary month; other databases only delete.
+    The expired rows are folded out of the analytics summaries in the same transaction.
+    """
+    try:
+        cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+        report = {"cutoff": cutoff.isoformat(), "dropped_partitions": [], "deleted_rows": 0}
+        with engine.begin() as conn:
+            report["expired_from_summaries"] = expire_summaries(conn, cutoff)
+            for table in LOG_TABLES.values():
+                if engine.dialect.name == "postgresql":
+                    partitions = conn.execute(text(
+                        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :parent"
+                    ), {"parent": table.name}).scalars().all()
+                    for partition in partitions:
+                        suffix = partition[len(table.name) + 2:]
+                        if not (partition.startswith(f"{table.name}_p") and suffix.isdigit()):
+                            continue
+                        month_end = (datetime.strptime(suffix, "%Y%m") + timedelta(days=32)).replace(day=1)
+                        if month_end <= cutoff:
+                            conn.execute(text(f'DROP TABLE "{partition}"'))
+                            report["dropped_partitions"].append(partition)
+                result = conn.execute(delete(table).where(table.c.logged_at < cutoff))
+                report["deleted_rows"] += result.rowcount or 0
+        logging.info(f"Recommendation log retention applied: {report}")
+        return report
+    except Exception as e:
+        logging.error(f"Error while applying recommendation log retention: {e}")
+        raise PersonalizedCoachException(e, sys)
+
+def compact(engine, older_than_days:int=LOG_COMPACT_AFTER_DAYS, now:datetime=None) -> dict:
+    """
+    Merge rows older than older_than_days that share all inputs and outputs into one row per day
+    (logged_at = day start, request_id NULL, hits = number of merged requests).
+    Days already compacted are skipped, so the job can run repeatedly.
+    """
+    try:
+        cutoff = ((now or datetime.utcnow()) - timedelta(days=older_than_days)).replace(hour=0, minute=0, second=0, microsecond=0)
+        report = {}
+        for kind, table in LOG_TABLES.items():
+            group_columns = [column for column in table.columns if column.name not in ("logged_at", "request_id", "hits")]
+            merged_days, rows_before, rows_after = 0, 0, 0
+            cursor = None
+            while True:
+                with engine.begin() as conn:
+                    pending = select(func.min(table.c.logged_at)).where(table.c.request_id.isnot(None), table.c.logged_at < cutoff)
+                    if cursor is not None:
+                        pending = pending.where(table.c.logged_at >= cursor)
+                    first = conn.execute(pending).scalar()
+                    if first is None:
+                        break
+                    day_start = first.replace(hour=0, minute=0, second=0, microsecond=0)
+                    day_end = day_start + timedelta(days=1)
+                    in_day = and_(table.c.logged_at >= day_start, table.c.logged_at < day_end)
+
+                    rows_before += conn.execute(select(func.count()).select_from(table).where(in_day)).scalar()
+                    groups = conn.execute(
+                        select(*group_columns, func.sum(table.c.hits).label("hits")).where(in_day).group_by(*group_columns)
+                    ).mappings().all()
+                    conn.execute(delete(table).where(in_day))
+                    if groups:
+                        conn.execute(insert(table), [{**group, "logged_at": day_start, "request_id": None} for group in groups])
+                    rows_after += len(groups)
+                    merged_days += 1
+                    cursor = day_end
+            report[kind] = {"days": merged_days, "rows_before": rows_before, "rows_after": rows_after}
+        logging.info(f"Recommendation log compacted: {report}")
+        return report
+    except Exception as e:
+        logging.error(f"Error while compacting recommendation log: {e}")
+        raise PersonalizedCoachException(e, sys)
+
+def decode_log_frame(df:pd.DataFrame, codes:pd.DataFrame, table) -> pd.DataFrame:
+    """
+    Log rows (coded) -> training-table schema, compacted rows repeated hits times.
+    """
+    for column in [name for name in df.columns if name.endswith(CODE_SUFFIX)]:
+        field = column[:-len(CODE_SUFFIX)]
+        mapping = codes[codes["field"] == field].set_index("id")["value"]
+        df[field] = df[column].map(mapping)
+        df = df.drop(columns=[column])
+    df = df.loc[df.index.repeat(df["hits"])].reset_index(drop=True)
+    columns = [column.name[:-len(CODE_SUFFIX)] if column.name.endswith(CODE_SUFFIX) else column.name
+               for column in table.columns if column.name not in ("logged_at", "request_id", "hits")]
+    return df[columns]
+
+def iter_log_frames(engine, kind:str, since:datetime=None, chunk_rows:int=ETL_CHUNK_ROWS,
+                    after:datetime=None, until:datetime=None):
+    """
+    Generator of decoded logged predictions, chunk_rows log rows at a time (server-side cursor).
+    since <= logged_at, after < logged_at <= until (each bound optional).
+    """
+    try:
+        table = LOG_TABLES[kind]
+        query = select(table)
+        if since is not None:
+            query = query.where(table.c.logged_at >= since)
+        if after is not None:
+            query = query.where(table.c.logged_at > after)
+        if until is not None:
+            query = query.where(table.c.logged_at <= until)
+        with engine.connect() as conn:
+            codes = pd.read_sql(select(RecommendationCode.id, RecommendationCode.field, RecommendationCode.value), con=conn)
+        with engine.connect().execution_options(stream_results=True) as conn:
+            for chunk in pd.read_sql(query, con=conn, chunksize=chunk_rows):
+                yield decode_log_frame(chunk, codes, table)
+    except Exception as e:
+        logging.error(f"Error while reading recommendation log: {e}")
+        raise PersonalizedCoachException(e, sys)
+
+def read_log_frame(engine, kind:str, since:datetime=None) -> pd.DataFrame:
+    """
+    Logged predictions decoded into the training-table schema (one row per served request,
+    compacted rows are repeated hits times).
+    """
+    try:
+        table = LOG_TABLES[kind]
+        query = select(table)
+        if since is not None:
+            query = query.where(table.c.logged_at >= since)
+        with engine.connect() as conn:
+            df = pd.read_sql(query, con=conn)
+            codes = pd.read_sql(select(RecommendationCode.id, RecommendationCode.field, RecommendationCode.value), con=conn)
+        return decode_log_frame(df, codes, table)
+    except Exception as e:
+        logging.error(f"Error while reading recommendation log: {e}")
+        raise PersonalizedCoachException(e, sys)
+
+if __name__=="__main__":
+    # Maintenance job: partitions ahead, retention, compaction
+    from src.db.connection import get_engine
+    engine = get_engine()
+    ensure_partitions(engine)
+    print(apply_retention(engine))
+    print(compact(engine))
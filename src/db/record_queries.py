@@ -0,0 +1,65 @@
+from src.custom_logging.logger import logging
+from src.exception.exception import PersonalizedCoachException
+from src.contants import *
+from sqlalchemy import select
+import csv
+import io
+import json
+import sys
+
+def filtered_select(model, filters:dict, after_id:int=None):
+    """
+    SELECT of every column of model's table, equality filters (None = no filter),
+    rows after after_id in id order (keyset pagination).
+    """
+    table = model.__table__
+    query = select(*table.columns)
+    for column, value in filters.items():
+        if value is not None:
+            query = query.where(table.c[column] == value)
+    if after_id is not None:
+        query = query.where(table.c.id > after_id)
+    return query.order_by(table.c.id)
+
+def fetch_page(session_factory, model, filters:dict, after_id:int=None, limit:int=DATA_PAGE_DEFAULT_LIMIT) -> dict:
+    """
+    One page of rows; next_after_id is passed back to get the following page (None on the last page).
+    """
+    try:
+        with session_factory() as db:
+            rows = db.execute(filtered_select(model, filters, after_id).limit(limit)).mappings().all()
+        rows = [dict(row) for row in rows]
+        return {
+            "count": len(rows),
+            "data": rows,
+            "next_after_id": rows[-1]["id"] if len(rows) == limit else None
+        }
+    except Exception as e:
+        logging.error(f"Error while fetching {model.__tablename__} page: {e}")
+        raise PersonalizedCoachException(e, sys)
+
+def export_chunks(session_factory, model, filters:dict, fmt:str="ndjson", chunk_rows:int=EXPORT_CHUNK_ROWS):
+    """
+    Generator of NDJSON/CSV text chunks over the whole filtered table.
+    Rows are fetched through a server-side cursor (yield_per), so memory is bounded by chunk_rows.
+    """
+    try:
+        with session_factory() as db:
+            result = db.execute(filtered_select(model, filters).execution_options(yield_per=chunk_rows))
+            columns = list(result.keys())
+            if fmt == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(columns)
+                yield buffer.getvalue()
+            for partition in result.partitions():
+                if fmt == "csv":
+                    buffer.seek(0)
+                    buffer.truncate()
+                    writer.writerows(partition)
+                    yield buffer.getvalue()
+                else:
+                    yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in partition)
+    except Exception as e:
+        logging.error(f"Error while exporting {model.__tablename__}: {e}")
+        raise PersonalizedCoachException(e, sys)
@@ -0,0 +1,295 @@
+from src.custom_logging.logger import logging
+from src.exception.exception import PersonalizedCoachException
+from src.contants import *
+from src.db.models import (RecommendationCode, nutrition_log, workout_log, nutrition_summary,
+                           workout_summary, workout_duration_histogram)
+from sqlalchemy import select, insert, update, delete, func, case, and_, bindparam, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+import math
+import sys
+
+# Summaries are additive (counts, sums, sums of squares, min/max), so every batch of
+# log rows is folded in with one upsert and analytics never scan the log tables.
+SUMMARY_SPECS = {
+    "nutrition": {
+        "log_table": nutrition_log,
+        "table": nutrition_summary,
+        "keys": ["goal", "diet_type", "gender", "meal_name"],
+        "sums": {"sum_calories": "calories", "sum_protein_g": "protein_g", "sum_carbs_g": "carbs_g", "sum_fats_g": "fats_g"}
+    },
+    "workout": {
+        "log_table": workout_log,
+        "table": workout_summary,
+        "keys": ["goal", "fitness_level", "gender", "name"],
+        "sums": {"sum_duration_min": "duration_min"},
+        "sum_squares": {"sum_sq_duration_min": "duration_min"},
+        "mins": {"min_duration_min": "duration_min"},
+        "maxs": {"max_duration_min": "duration_min"}
+    }
+}
+HISTOGRAM_KEYS = ["goal", "fitness_level"]
+
+def duration_bucket(duration:float, width:float=WORKOUT_DURATION_BUCKET_MIN) -> float:
+    return float(math.floor(duration / width) * width)
+
+def upsert_additive(db, table, key_columns:list, rows:list):
+    """
+    INSERT ... ON CONFLICT DO UPDATE adding the new values to the stored ones
+    (min_*/max_* columns keep the smaller/larger value). Rows are sorted by key so
+    concurrent writers lock summary rows in the same order.
+    """
+    if not rows:
+        return
+    rows = sorted(rows, key=lambda row: tuple(row[key] for key in key_columns))
+    value_columns = [column.name for column in table.columns if column.name not in key_columns]
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        statement = (postgresql.insert if dialect == "postgresql" else sqlite.insert)(table).values(rows)
+        new = statement.excluded
+        set_ = {}
+        for column in value_columns:
+            if column.startswith("min_"):
+                set_[column] = case((new[column] < table.c[column], new[column]), else_=table.c[column])
+            elif column.startswith("max_"):
+                set_[column] = case((new[column] > table.c[column], new[column]), else_=table.c[column])
+            else:
+                set_[column] = table.c[column] + new[column]
+        db.execute(statement.on_conflict_do_update(index_elements=key_columns, set_=set_))
+        return
+
+    # other databases: update, insert when the key is new
+    for row in rows:
+        where = and_(*[table.c[key] == row[key] for key in key_columns])
+        current = db.execute(select(table).where(where)).mappings().first()
+        if current is None:
+            db.execute(insert(table).values(**row))
+            continue
+        values = {}
+        for column in value_columns:
+            if column.startswith("min_"):
+                values[column] = min(current[column], row[column])
+            elif column.startswith("max_"):
+                values[column] = max(current[column], row[column])
+            else:
+                values[column] = current[column] + row[column]
+        db.execute(update(table).where(where).values(**values))
+
+def aggregate(kind:str, rows:list) -> tuple:
+    """
+    Fold raw recommendation rows (training-table column names, optional 'hits') into
+    summary deltas and, for workouts, duration histogram deltas.
+    """
+    spec = SUMMARY_SPECS[kind]
+    summary, histogram = {}, {}
+    for row in rows:
+        hits = row.get("hits", 1)
+        key = tuple(row[column] for column in spec["keys"])
+        delta = summary.get(key)
+        if delta is None:
+            delta = dict(zip(spec["keys"], key), n=0)
+            delta.update({column: 0.0 for column in list(spec["sums"]) + list(spec.get("sum_squares", {}))})
+            delta.update({column: math.inf for column in spec.get("mins", {})})
+            delta.update({column: -math.inf for column in spec.get("maxs", {})})
+            summary[key] = delta
+        delta["n"] += hits
+        for column, source in spec["sums"].items():
+            delta[column] += hits * float(row[source])
+        for column, source in spec.get("sum_squares", {}).items():
+            delta[column] += hits * float(row[source]) ** 2
+        for column, source in spec.get("mins", {}).items():
+            delta[column] = min(delta[column], float(row[source]))
+        for column, source in spec.get("maxs", {}).items():
+            delta[column] = max(delta[column], float(row[source]))
+
+        if kind == "workout":
+            bucket = (row["goal"], row["fitness_level"], duration_bucket(float(row["duration_min"])))
+            histogram[bucket] = histogram.get(bucket, 0) + hits
+    histogram_rows = [
+        {"goal": goal, "fitness_level": level, "bucket_start": bucket, "n": n}
+        for (goal, level, bucket), n in histogram.items()
+    ]
+    return list(summary.values()), histogram_rows
+
+def update_summaries(db, kind:str, rows:list):
+    """
+    Fold a batch of newly logged rows into the summary tables (same transaction as the log insert).
+    """
+    try:
+        spec = SUMMARY_SPECS[kind]
+        summary_rows, histogram_rows = aggregate(kind, rows)
+        upsert_additive(db, spec["table"], spec["keys"], summary_rows)
+        if histogram_rows:
+            upsert_additive(db, workout_duration_histogram, HISTOGRAM_KEYS + ["bucket_start"], histogram_rows)
+    except Exception as e:
+        logging.error(f"Error while updating {kind} summaries: {e}")
+        raise PersonalizedCoachException(e, sys)
+
+def _log_groups(conn, kind:str, codes:dict, where=None) -> list:
+    """
+    Log rows grouped in SQL by coded key + value columns, decoded into rows (with summed hits)
+    that aggregate() folds exactly like newly logged rows. Each row keeps its key codes under "codes".
+    """
+    spec = SUMMARY_SPECS[kind]
+    log = spec["log_table"]
+    sources = sorted({source for part in ("sums", "sum_squares", "mins", "maxs")
+                      for source in spec.get(part, {}).values()})
+    code_columns = [log.c[f"{key}_code"] for key in spec["keys"]]
+    query = select(*code_columns, *[log.c[source] for source in sources], func.sum(log.c.hits).label("hits"))
+    if where is not None:
+        query = query.where(where)
+    groups = conn.execute(query.group_by(*code_columns, *[log.c[source] for source in sources])).mappings().all()
+    return [
+        {**{key: codes[group[f"{key}_code"]] for key in spec["keys"]},
+         **{source: group[source] for source in sources}, "hits": group["hits"],
+         "codes": tuple(group[f"{key}_code"] for key in spec["keys"])}
+        for group in groups
+    ]
+
+def rebuild_summaries(engine) -> dict:
+    """
+    Recompute every summary from the log tables (e.g. after enabling summaries on an existing log).
+    Summaries always describe the retained log (apply_retention folds expired rows out of them),
+    so a rebuild reproduces the incrementally maintained values.
+    """
+    try:
+        report = {}
+        with engine.begin() as conn:
+            codes = dict(conn.execute(select(RecommendationCode.id, RecommendationCode.value)).all())
+            conn.execute(delete(workout_duration_histogram))
+            for kind, spec in SUMMARY_SPECS.items():
+                summary_rows, histogram_rows = aggregate(kind, _log_groups(conn, kind, codes))
+
+                conn.execute(delete(spec["table"]))
+                if summary_rows:
+                    conn.execute(insert(spec["table"]), summary_rows)
+                if histogram_rows:
+                    conn.execute(insert(workout_duration_histogram), histogram_rows)
+                report[kind] = {"groups": len(summary_rows), "rows": int(sum(row["n"] for row in summary_rows))}
+        logging.info(f"Summaries rebuilt: {report}")
+        return report
+    except Exception as e:
+        logging.error(f"Error while rebuilding summaries: {e}")
+        raise PersonalizedCoachException(e, sys)
+
+def subtract_additive(conn, table, key_columns:list, rows:list):
+    """
+    Subtract deltas from the additive columns (n, sums, sums of squares) of existing rows,
+    then delete rows left with n <= 0. min_*/max_* columns are not touched.
+    """
+    if not rows:
+        return
+    additive = [column.name for column in table.columns
+                if column.name not in key_columns and not column.name.startswith(("min_", "max_"))]
+    statement = (
+        update(table)
+        .where(and_(*[table.c[key] == bindparam(f"key_{key}") for key in key_columns]))
+        .values({column: table.c[column] - bindparam(f"delta_{column}") for column in additive})
+    )
+    conn.execute(statement, [
+        {**{f"key_{key}": row[key] for key in key_columns}, **{f"delta_{column}": row[column] for column in additive}}
+        for row in rows
+    ])
+    conn.execute(delete(table).where(table.c.n <= 0))
+
+def expire_summaries(conn, cutoff) -> dict:
+    """
+    Fold log rows with logged_at < cutoff out of the summaries. Runs in the retention
+    transaction before those rows are dropped: counts/sums/histograms are subtracted, and
+    min/max of the affected cohorts are recomputed from the rows that remain.
+    """
+    codes = dict(conn.execute(select(RecommendationCode.id, RecommendationCode.value)).all())
+    report = {}
+    for kind, spec in SUMMARY_SPECS.items():
+        log = spec["log_table"]
+        expired = _log_groups(conn, kind, codes, log.c.logged_at < cutoff)
+        summary_rows, histogram_rows = aggregate(kind, expired)
+        subtract_additive(conn, spec["table"], spec["keys"], summary_rows)
+        subtract_additive(conn, workout_duration_histogram, HISTOGRAM_KEYS + ["bucket_start"], histogram_rows)
+
+        extremes = [(column, func.min(log.c[source])) for column, source in spec.get("mins", {}).items()]
+        extremes += [(column, func.max(log.c[source])) for column, source in spec.get("maxs", {}).items()]
+        affected = sorted({row["codes"] for row in expired})
+        if extremes and affected:
+            code_columns = [log.c[f"{key}_code"] for key in spec["keys"]]
+            remaining = conn.execute(
+                select(*code_columns, *[value.label(column) for column, value in extremes])
+                .where(log.c.logged_at >= cutoff, tuple_(*code_columns).in_(affected))
+                .group_by(*code_columns)
+            ).mappings().all()
+            table = spec["table"]
+            statement = (
+                update(table)
+                .where(and_(*[table.c[key] == bindparam(f"key_{key}") for key in spec["keys"]]))
+                .values({column: bindparam(f"value_{column}") for column, _ in extremes})
+            )
+            if remaining:
+                conn.execute(statement, [
+                    {**{f"key_{key}": codes[row[f"{key}_code"]] for key in spec["keys"]},
+                     **{f"value_{column}": row[column] for column, _ in extremes}}
+                    for row in remaining
+                ])
+        report[kind] = int(sum(row["n"] for row in summary_rows))
+    return report
+
+def _filtered(query, table, filters:dict):
+    for column, value in filters.items():
+        if value is not None:
+            query = query.where(table.c[column] == value)
+    return query
+
+def _group_columns(table, allowed:list, group_by:list):
+    unknown = [column for column in group_by if column not in allowed]
+    if unknown:
+        raise ValueError(f"Cannot group by {unknown}; allowed: {allowed}")
+    return [table.c[column] for column in group_by]
+
+def nutrition_cohorts(db, group_by:list, filters:dict) -> list:
+    """
+    Served nutrition recommendations per cohort: count and mean calories/macros.
+    """
+    table = nutrition_summary
+    columns = _group_columns(table, SUMMARY_SPECS["nutrition"]["keys"], group_by)
+    n = func.sum(table.c.n)
+    query = select(*columns, n.label("n"),
+                   *[(func.sum(table.c[column]) / n).label(f"mean_{source}")
+                     for column, source in SUMMARY_SPECS["nutrition"]["sums"].items()])
+    query = _filtered(query, table, filters).group_by(*columns).order_by(n.desc())
+    return [dict(row) for row in db.execute(query).mappings().all()]
+
+def workout_durations(db, group_by:list, filters:dict) -> list:
+    """
+    Served workout recommendations per cohort: count and duration mean/std/min/max.
+    """
+    table = workout_summary
+    columns = _group_columns(table, SUMMARY_SPECS["workout"]["keys"], group_by)
+    n = func.sum(table.c.n)
+    query = select(*columns, n.label("n"), func.sum(table.c.sum_duration_min).label("sum"),
+                   func.sum(table.c.sum_sq_duration_min).label("sum_sq"),
+                   func.min(table.c.min_duration_min).label("min_duration_min"),
+                   func.max(table.c.max_duration_min).label("max_duration_min"))
+    query = _filtered(query, table, filters).group_by(*columns).order_by(n.desc())
+    results = []
+    for row in db.execute(query).mappings().all():
+        row = dict(row)
+        total, total_sq = row.pop("sum"), row.pop("sum_sq")
+        mean = total / row["n"]
+        row["mean_duration_min"] = mean
+        row["std_duration_min"] = math.sqrt(max(total_sq / row["n"] - mean * mean, 0.0))
+        results.append(row)
+    return results
+
+def workout_duration_distribution(db, filters:dict) -> list:
+    """
+    Duration histogram (bucket width WORKOUT_DURATION_BUCKET_MIN) for the filtered cohort.
+    """
+    table = workout_duration_histogram
+    query = select(table.c.bucket_start, func.sum(table.c.n).label("n"))
+    query = _filtered(query, table, filters).group_by(table.c.bucket_start).order_by(table.c.bucket_start)
+    return [{"bucket_start": row.bucket_start, "bucket_end": row.bucket_start + WORKOUT_DURATION_BUCKET_MIN, "n": row.n}
+            for row in db.execute(query).all()]
+
+if __name__=="__main__":
+    # One-off backfill of the summaries from the recommendation log
+    from src.db.connection import get_engine
+    print(rebuild_summaries(get_engine()))
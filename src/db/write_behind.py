@@ -0,0 +1,241 @@
+from src.custom_logging.logger import logging
+from src.contants import *
+from sqlalchemy import insert, exc
+from collections import deque
+from datetime import datetime
+import asyncio
+import json
+import os
+
+class WriteBehindQueueFull(Exception):
+    """
+    Raised when rows cannot be queued within the enqueue timeout (backpressure).
+    """
+
+class WriteBehindWriter:
+    """
+    Write-behind persistence for served recommendations:
+    - handlers enqueue row dicts and respond without waiting for the database
+    - a background task bulk-inserts (executemany / multi-row INSERT) every
+      flush_interval_seconds, or as soon as flush_size rows are pending
+    - the buffer is bounded in rows; enqueue waits up to enqueue_timeout_seconds
+      for space and then raises WriteBehindQueueFull
+    - a flush that fails on the connection (database down, locked, pool timeout) puts its
+      requests back at the head of the buffer and backs off, so an outage turns into
+      backpressure instead of lost rows
+    - any other failure retries the flush one request at a time: the rows of a request
+      that still fails are appended to the dead-letter file (JSON lines), the others are written
+    - stop() flushes everything still buffered; rows it cannot deliver within
+      stop_timeout_seconds go to the dead-letter file before it returns
+    Blocking DB work runs through run_blocking (e.g. the I/O executor); insert_fn(db, table, rows)
+    writes one table's rows (plain executemany INSERT by default).
+    """
+    def __init__(self, session_factory, run_blocking, insert_fn=None, max_queue_rows:int=WRITE_BEHIND_MAX_QUEUE_ROWS,
+                 flush_size:int=WRITE_BEHIND_FLUSH_SIZE, flush_interval_seconds:float=WRITE_BEHIND_FLUSH_INTERVAL_SECONDS,
+                 enqueue_timeout_seconds:float=WRITE_BEHIND_ENQUEUE_TIMEOUT_SECONDS,
+                 max_backoff_seconds:float=WRITE_BEHIND_MAX_BACKOFF_SECONDS,
+                 stop_timeout_seconds:float=WRITE_BEHIND_STOP_TIMEOUT_SECONDS,
+                 dead_letter_file:str=WRITE_BEHIND_DEAD_LETTER_FILE):
+        self.session_factory = session_factory
+        self.run_blocking = run_blocking
+        self.insert_fn = insert_fn or (lambda db, table, rows: db.execute(insert(table), rows))
+        self.max_queue_rows = max_queue_rows
+        self.flush_size = flush_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.enqueue_timeout_seconds = enqueue_timeout_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.stop_timeout_seconds = stop_timeout_seconds
+        self.dead_letter_file = dead_letter_file
+
+        self._buffer = deque() # (model, [row dicts]) per request
+        self._pending_rows = 0 # buffered + being written
+        self._space = None
+        self._flush_now = None
+        self._task = None
+        self._stopping = False
+        self._giving_up = False
+        self._outage_failures = 0 # consecutive connection-level failures
+        self.flushed_rows = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.requeued_rows = 0
+        self.dead_lettered_rows = 0
+        self.rejected_rows = 0
+
+    async def start(self):
+        self._space = asyncio.Condition()
+        self._flush_now = asyncio.Event()
+        self._stopping = False
+        self._giving_up = False
+        self._task = asyncio.create_task(self._drain_loop())
+        logging.info("Write-behind writer started.")
+
+    async def enqueue(self, model, rows:list):
+        """
+        Queue rows for model's table. Raises WriteBehindQueueFull under sustained overload.
+        """
+        if self._task is None or self._stopping:
+            raise RuntimeError("Write-behind writer is not running")
+        async with self._space:
+            try:
+                await asyncio.wait_for(
+                    self._space.wait_for(lambda: self._pending_rows + len(rows) <= self.max_queue_rows),
+                    timeout=self.enqueue_timeout_seconds
+                )
+            except asyncio.TimeoutError:
+                self.rejected_rows += len(rows)
+                raise WriteBehindQueueFull(f"{self._pending_rows} rows already queued")
+            self._buffer.append((model, rows))
+            self._pending_rows += len(rows)
+        if self._pending_rows >= self.flush_size:
+            self._flush_now.set()
+
+    def _insert(self, requests:list):
+        grouped = {}
+        for model, rows in requests:
+            grouped.setdefault(model, []).extend(rows)
+        with self.session_factory() as db:
+            for model, rows in grouped.items():
+                self.insert_fn(db, model, rows)
+            db.commit()
+
+    def _write_dead_letters(self, requests:list, error:str):
+        os.makedirs(os.path.dirname(self.dead_letter_file) or ".", exist_ok=True)
+        failed_at = datetime.utcnow().isoformat()
+        with open(self.dead_letter_file, "a") as f:
+            for model, rows in requests:
+                f.write(json.dumps({"table": getattr(model, "name", None) or model.__tablename__, "rows": rows,
+                                    "error": error, "failed_at": failed_at}, default=str) + "\n")
+
+    @staticmethod
+    def _is_outage(e) -> bool:
+        """
+        Connection-level failures, where retrying the same rows later can succeed.
+        """
+        return (isinstance(e, (exc.OperationalError, exc.InterfaceError, exc.TimeoutError, OSError))
+                or getattr(e, "connection_invalidated", False))
+
+    async def _done(self, n_rows:int):
+        async with self._space:
+            self._pending_rows -= n_rows
+            self._space.notify_all()
+
+    async def _requeue(self, requests:list, e):
+        """
+        Put requests back at the head of the buffer (original order) and back off.
+        """
+        if self._giving_up:
+            await self._dead_letter(requests, e)
+            return
+        self._buffer.extendleft(reversed(requests))
+        n_rows = sum(len(rows) for _, rows in requests)
+        self.requeued_rows += n_rows
+        self._outage_failures += 1
+        backoff = min(0.5 * 2 ** (self._outage_failures - 1), self.max_backoff_seconds)
+        logging.error(f"Write-behind flush of {n_rows} rows failed, requeued, retrying in {backoff}s: {e}")
+        await asyncio.sleep(backoff)
+
+    async def _dead_letter(self, requests:list, e):
+        n_rows = sum(len(rows) for _, rows in requests)
+        try:
+            await self.run_blocking(self._write_dead_letters, requests, repr(e))
+        except Exception as write_error:
+            logging.error(f"Could not write {n_rows} rows to the dead-letter file {self.dead_letter_file}: {write_error}")
+            if not self._giving_up:
+                await self._requeue(requests, write_error)
+                return
+            # shutting down with neither the database nor the file available: the log is all that is left
+            logging.error(f"Undelivered write-behind rows: {requests}")
+            await self._done(n_rows)
+            return
+        self.dead_lettered_rows += n_rows
+        logging.error(f"Write-behind rows of {len(requests)} requests ({n_rows} rows) moved to {self.dead_letter_file}: {e}")
+        await self._done(n_rows)
+
+    async def _flush_batch(self):
+        """
+        Write up to flush_size buffered rows (whole requests) in one transaction.
+        """
+        requests, n_rows = [], 0
+        while self._buffer and (n_rows == 0 or n_rows + len(self._buffer[0][1]) <= self.flush_size):
+            requests.append(self._buffer.popleft())
+            n_rows += len(requests[-1][1])
+
+        try:
+            await self.run_blocking(self._insert, requests)
+            self.flushes += 1
+            self.flushed_rows += n_rows
+            self._outage_failures = 0
+            await self._done(n_rows)
+            return
+        except Exception as e:
+            self.failed_flushes += 1
+            if self._is_outage(e):
+                await self._requeue(requests, e)
+                return
+            if len(requests) == 1:
+                await self._dead_letter(requests, e)
+                return
+            logging.error(f"Write-behind flush of {n_rows} rows failed, retrying request by request: {e}")
+
+        # isolate the failing request(s): one transaction per request
+        for i, request in enumerate(requests):
+            try:
+                await self.run_blocking(self._insert, [request])
+                self.flushed_rows += len(request[1])
+                await self._done(len(request[1]))
+            except Exception as e:
+                if self._is_outage(e):
+                    await self._requeue(requests[i:], e)
+                    return
+                await self._dead_letter([request], e)
+        self.flushes += 1
+        self._outage_failures = 0
+
+    async def _drain_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            while self._buffer:
+                await self._flush_batch()
+            if self._stopping:
+                return
+
+    async def stop(self):
+        """
+        Stop accepting rows and flush everything buffered (durable shutdown). If the database is
+        still unreachable after stop_timeout_seconds, the remaining rows go to the dead-letter file.
+        """
+        if self._task is None:
+            return
+        self._stopping = True
+        self._flush_now.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout=self.stop_timeout_seconds)
+        except asyncio.TimeoutError:
+            logging.error(f"Write-behind writer could not flush {self._pending_rows} rows in "
+                          f"{self.stop_timeout_seconds}s, dead-lettering them.")
+            self._giving_up = True
+            await self._task
+        self._task = None
+        logging.info(f"Write-behind writer stopped after flushing {self.flushed_rows} rows "
+                     f"({self.dead_lettered_rows} rows dead-lettered to {self.dead_letter_file}).")
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "queued_rows": self._pending_rows,
+            "max_queue_rows": self.max_queue_rows,
+            "flush_size": self.flush_size,
+            "flush_interval_seconds": self.flush_interval_seconds,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "failed_flushes": self.failed_flushes,
+            "requeued_rows": self.requeued_rows,
+            "dead_lettered_rows": self.dead_lettered_rows,
+            "dead_letter_file": self.dead_letter_file,
+            "rejected_rows": self.rejected_rows
+        }
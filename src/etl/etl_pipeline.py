@@ -3,47 +3,409 @@ from src.exception.exception import PersonalizedCoachException
 from src.etl.extract import Extractor
 from src.etl.transform import Transformer
 from src.etl.load import Loader
-from src.db.connection import get_engine
-from src.contants import (NUTRITION_TABLE_NAME,FAQ_TABLE_NAME,WORKOUTS_TABLE_NAME)
+from src.etl.processed_data import NUTRITION_SCHEMA, WORKOUT_SCHEMA, FAQ_SCHEMA, apply_schema, processed_path, processed_dir
+from src.db.connection import get_engine, pool_settings, dispose_engines
+from src.contants import (NUTRITION_TABLE_NAME,FAQ_TABLE_NAME,WORKOUTS_TABLE_NAME,INCLUDE_LOGGED_PREDICTIONS,ETL_CHUNK_ROWS,ETL_STATE_FILE,ETL_MAX_WORKERS,PROCESSED_FORMAT,
+                          ETL_LOG_SAFETY_MARGIN_SECONDS,WRITE_BEHIND_FLUSH_INTERVAL_SECONDS,
+                          NUTRITION_PROCESSED_FILE,WORKOUT_PROCESSED_FILE,FAQ_PROCESSED_FILE)
+from datetime import datetime, timedelta
 import os
 import sys
+import time
+import json
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 import pandas as pd
 
-## creating engine as global 
-ENGINE = get_engine()
+def etl_engine():
+    """
+    Shared ETL engine, created on first use: at least one pooled connection per parallel
+    table job, plus one for metadata queries.
+    """
+    return get_engine(pool_size=max(pool_settings()["pool_size"], ETL_MAX_WORKERS + 1))
+
+## process-pool workers: shared cancel flag, own database connections
+_worker_cancelled = None
+
+def _init_etl_worker(cancelled):
+    global _worker_cancelled
+    _worker_cancelled = cancelled
+    dispose_engines(close=False) # a forked worker must not reuse the parent's pooled connections
+
+def _run_table_in_process(pipeline_kwargs:dict, table:str, options:dict, state_entry):
+    pipeline = ETLPipeline(**pipeline_kwargs)
+    pipeline._cancelled = _worker_cancelled
+    try:
+        return pipeline.run_table(table, options, {table: state_entry} if state_entry else {})
+    except Exception as e:
+        raise RuntimeError(str(e)) # PersonalizedCoachException holds sys and cannot be pickled back
 
 class ETLPipeline:
-    def __init__(self):
-        self.extractor = Extractor(ENGINE)
+    def __init__(self, include_logged_predictions:bool=INCLUDE_LOGGED_PREDICTIONS, logged_since=None,
+                 state_path:str=None, output_format:str=None, output_dir:str=None):
+        """
+        include_logged_predictions: also train on served predictions from the recommendation log
+        (optionally only those logged since logged_since); by default only curated tables are used.
+        output_dir: processed data directory (default $PROCESSED_DATA_DIR or data/processed).
+        state_path: JSON file with the per-table high-water marks of incremental runs (in output_dir by default).
+        output_format: "csv", or "parquet"/"feather" to store typed columns (category, float32);
+        defaults to the PROCESSED_FORMAT environment variable / constant.
+        """
+        self.extractor = Extractor(etl_engine())
         self.transformer = Transformer()
         self.loader = Loader()
+        self.include_logged_predictions = include_logged_predictions
+        self.logged_since = logged_since
+        self.output_dir = processed_dir(output_dir)
+        self.state_path = state_path or os.path.join(self.output_dir, ETL_STATE_FILE)
+        self.output_format = output_format or os.getenv("PROCESSED_FORMAT", PROCESSED_FORMAT)
+        self.pipeline_kwargs = {"include_logged_predictions": include_logged_predictions, "logged_since": logged_since,
+                                "state_path": self.state_path, "output_format": self.output_format, "output_dir": self.output_dir}
+        self._cancelled = threading.Event() # set when a parallel table job fails
+        self._persist_pool = None # background saves of in-memory runs
+        self._pending_saves = []
+    
+    def extract_training_table(self, table:str, log_kind:str) -> pd.DataFrame:
+        df = self.extractor.from_db(table=table)
+        if self.include_logged_predictions:
+            logged = self.extractor.from_recommendation_log(log_kind, since=self.logged_since)
+            logging.info(f"Adding {len(logged)} logged {log_kind} predictions to {len(df)} curated rows.")
+            df = pd.concat([df, logged], ignore_index=True)
+        return df
+    
+    def etl_jobs(self) -> list:
+        """
+        (table, recommendation log kind or None, transform function, output path) per dataset.
+        Columnar outputs also get the dataset's dtypes; CSV output is left as transformed.
+        """
+        jobs = [
+            (NUTRITION_TABLE_NAME, 'nutrition', self.transformer.transform_nutrition, NUTRITION_SCHEMA, os.path.join(self.output_dir, NUTRITION_PROCESSED_FILE)),
+            (WORKOUTS_TABLE_NAME, 'workout', self.transformer.transform_workout, WORKOUT_SCHEMA, os.path.join(self.output_dir, WORKOUT_PROCESSED_FILE)),
+            (FAQ_TABLE_NAME, None, self.transformer.transform_faq, FAQ_SCHEMA, os.path.join(self.output_dir, FAQ_PROCESSED_FILE))
+        ]
+        if self.output_format == "csv":
+            return [(table, log_kind, transform, path) for table, log_kind, transform, _, path in jobs]
+        return [
+            (table, log_kind, lambda df, transform=transform, schema=schema: apply_schema(transform(df), schema),
+             processed_path(path, self.output_format))
+            for table, log_kind, transform, schema, path in jobs
+        ]
     
-    def run_etl(self):
+    def transform_table(self, table:str, log_kind:str, transform) -> pd.DataFrame:
+        """
+        Whole-table extract -> transform.
+        """
+        df = self.extract_training_table(table, log_kind) if log_kind else self.extractor.from_db(table=table)
+        return transform(df)
+    
+    def load_table(self, table:str, log_kind:str, transform, path:str) -> dict:
+        """
+        Whole-table extract -> transform -> save.
+        """
+        start = time.perf_counter()
+        transformed_df = self.transform_table(table, log_kind, transform)
+        self.loader.save(df=pd.DataFrame(transformed_df), path=path) # save the clean data in the desired format and path
+        report = {"rows": len(transformed_df), "seconds": round(time.perf_counter() - start, 3)}
+        logging.info(f"ETL {table} finished: {report}")
+        return report
+    
+    def run_etl_in_memory(self, persist:str="async") -> dict:
+        """
+        Extract + transform every dataset and hand the DataFrames to the caller ({table: df}),
+        e.g. straight to TrainingPipeline, without writing and re-parsing processed files.
+        persist: "none" (no files), "sync" (saved before returning) or "async" (saved on a
+        background thread while the caller goes on; see wait_for_persistence()).
+        The frames must not be modified in place while an async save is running.
+        """
+        try:
+            if persist not in ("none", "sync", "async"):
+                raise ValueError(f"Unknown persist mode {persist!r}, expected 'none', 'sync' or 'async'")
+            logging.info(f"In-memory ETL initiated (persist={persist}).")
+            frames = {}
+            if persist != "none":
+                self.reset_state() # outputs are rewritten, the old watermarks no longer match them
+            for table, log_kind, transform, path in self.etl_jobs():
+                start = time.perf_counter()
+                frames[table] = self.transform_table(table, log_kind, transform)
+                logging.info(f"ETL {table}: {len(frames[table])} rows in memory in {time.perf_counter() - start:.3f}s")
+                if persist == "sync":
+                    self.loader.save(df=frames[table], path=path)
+                elif persist == "async":
+                    if self._persist_pool is None:
+                        self._persist_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="etl-persist")
+                    self._pending_saves.append((path, self._persist_pool.submit(self.loader.save, frames[table], path)))
+            logging.info("In-memory ETL finished.")
+            return frames
+        except Exception as e:
+            logging.error(f"Error occured while running in-memory etl: {e}")
+            raise PersonalizedCoachException(e,sys)
+    
+    def wait_for_persistence(self) -> list:
+        """
+        Block until the background saves of run_etl_in_memory() are done; returns the saved
+        paths and raises if any save failed.
+        """
+        saved, errors = [], []
+        for path, future in self._pending_saves:
+            try:
+                future.result()
+                saved.append(path)
+            except Exception as e:
+                errors.append(f"{path}: {e}")
+        self._pending_saves = []
+        if errors:
+            logging.error(f"Saving processed data failed: {errors}")
+            raise RuntimeError(f"Saving processed data failed: {errors}")
+        logging.info(f"Processed data persisted: {saved}")
+        return saved
+    
+    def transformed_chunks(self, chunks, transform):
+        """
+        Transform chunk by chunk; stops early when a parallel job of another table failed.
+        """
+        for chunk in chunks:
+            if self._cancelled.is_set():
+                raise RuntimeError("cancelled after another table failed")
+            yield transform(chunk)
+    
+    def stream_table(self, table:str, log_kind:str, transform, path:str, chunk_rows:int=ETL_CHUNK_ROWS) -> dict:
+        """
+        Extract -> transform -> append one chunk at a time; peak memory is about one chunk
+        whatever the table size. Logs progress and throughput, returns the table's report.
+        """
+        start = time.perf_counter()
+        chunks = self.extractor.iter_db(table=table, chunk_rows=chunk_rows)
+        if log_kind and self.include_logged_predictions:
+            chunks = itertools.chain(chunks, self.extractor.iter_recommendation_log(log_kind, since=self.logged_since, chunk_rows=chunk_rows))
+        
+        def progress(rows):
+            elapsed = time.perf_counter() - start
+            logging.info(f"ETL {table}: {rows} rows written ({rows / elapsed:.0f} rows/s)")
+        
+        rows = self.loader.save_chunks(self.transformed_chunks(chunks, transform), path, on_chunk=progress)
+        seconds = time.perf_counter() - start
+        report = {"rows": rows, "seconds": round(seconds, 3), "rows_per_s": round(rows / seconds) if seconds else None}
+        logging.info(f"ETL {table} finished: {report}")
+        return report
+    
+    def load_state(self) -> dict:
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path) as f:
+            return json.load(f)
+    
+    def save_state(self, state:dict):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+    
+    def reset_state(self):
+        """
+        Forget the watermarks (outputs rewritten outside the incremental mode).
+        """
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+    
+    def log_watermark(self) -> datetime:
+        """
+        Newest logged_at an incremental run may extract. logged_at is set before the log
+        transaction commits (per request in sync mode, at flush time in write-behind mode),
+        so rows younger than the flush interval plus a safety margin may still be in flight.
+        """
+        lag = (float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL_SECONDS", WRITE_BEHIND_FLUSH_INTERVAL_SECONDS))
+               + float(os.getenv("ETL_LOG_SAFETY_MARGIN_SECONDS", ETL_LOG_SAFETY_MARGIN_SECONDS)))
+        return datetime.utcnow() - timedelta(seconds=lag)
+    
+    def consistency_problem(self, table:str, log_kind:str, path:str, previous:dict, with_log:bool):
+        """
+        Reason why the output cannot be extended incrementally, or None:
+        output missing/shorter than recorded, rows at or below the watermark deleted or
+        added (history rewritten), logged predictions committed at or below the log watermark
+        after it was taken (fewer is fine: log retention), or the logged-predictions setting changed.
+        """
+        if previous.get("with_log") != with_log:
+            return "logged predictions setting changed"
+        if not os.path.exists(path) or os.path.getsize(path) < previous["bytes"]:
+            return "output file missing or truncated"
+        curated_rows = self.extractor.count_rows(table, until_id=previous["max_id"])
+        if curated_rows != previous["curated_rows"]:
+            return f"{curated_rows} rows at or below id {previous['max_id']}, expected {previous['curated_rows']}"
+        if with_log and previous.get("max_logged_at"):
+            logged = self.extractor.count_logged(log_kind, since=self.logged_since,
+                                                 until=datetime.fromisoformat(previous["max_logged_at"]))
+            if logged > previous.get("logged_rows", 0):
+                return f"{logged} logged predictions at or below {previous['max_logged_at']}, expected {previous.get('logged_rows', 0)}"
+        return None
+    
+    def incremental_table(self, table:str, log_kind:str, transform, path:str, state:dict,
+                          full_rebuild:bool=False, chunk_rows:int=ETL_CHUNK_ROWS) -> dict:
+        """
+        Extract only rows above the table's high-water mark (max id, and log_watermark() for
+        logged predictions), transform them and append them to the output. Bounds are read
+        before extracting, so rows arriving meanwhile are left for the next run.
+        Falls back to a full rebuild of the table when there is no watermark, when asked to,
+        or when the consistency check fails. Updates state[table].
+        """
+        start = time.perf_counter()
+        with_log = bool(log_kind and self.include_logged_predictions)
+        until_id = self.extractor.max_value(table, "id") or 0
+        until_logged = self.log_watermark() if with_log else None
+        
+        previous = state.get(table)
+        if full_rebuild:
+            reason = "full rebuild requested"
+        elif previous is None:
+            reason = "no watermark"
+        else:
+            reason = self.consistency_problem(table, log_kind, path, previous, with_log)
+        if reason:
+            logging.info(f"ETL {table}: full rebuild ({reason}).")
+            previous = {"max_id": None, "max_logged_at": None, "rows": 0}
+        after_logged = datetime.fromisoformat(previous["max_logged_at"]) if previous["max_logged_at"] else None
+        if until_logged is not None and after_logged is not None and until_logged < after_logged:
+            until_logged = after_logged # clock moved back: extract nothing new rather than rewind
+        # counted before extracting: a row committing meanwhile can only cause a spurious rebuild, never a silent loss
+        logged_rows = self.extractor.count_logged(log_kind, since=self.logged_since, until=until_logged) if with_log else 0
+        
+        chunks = self.extractor.iter_id_range(table, after_id=previous["max_id"], until_id=until_id, chunk_rows=chunk_rows)
+        if with_log:
+            chunks = itertools.chain(chunks, self.extractor.iter_recommendation_log(
+                log_kind, since=self.logged_since, chunk_rows=chunk_rows, after=after_logged, until=until_logged))
+        transformed = self.transformed_chunks(chunks, transform)
+        
+        def progress(rows):
+            elapsed = time.perf_counter() - start
+            logging.info(f"ETL {table}: {rows} rows written ({rows / elapsed:.0f} rows/s)")
+        
+        if reason:
+            new_rows = self.loader.save_csv_chunks(transformed, path, on_chunk=progress)
+        else:
+            new_rows = self.loader.append_csv_chunks(transformed, path, truncate_to=previous["bytes"], on_chunk=progress)
+        
+        state[table] = {
+            "max_id": until_id,
+            "max_logged_at": until_logged.isoformat() if until_logged else None,
+            "with_log": with_log,
+            "curated_rows": self.extractor.count_rows(table, until_id=until_id),
+            "logged_rows": logged_rows,
+            "rows": previous["rows"] + new_rows,
+            "bytes": os.path.getsize(path)
+        }
+        seconds = time.perf_counter() - start
+        report = {"mode": "full" if reason else "incremental", "reason": reason, "new_rows": new_rows,
+                  "total_rows": state[table]["rows"], "seconds": round(seconds, 3)}
+        logging.info(f"ETL {table} finished: {report}")
+        return report
+    
+    def run_table(self, table:str, options:dict, state:dict) -> tuple:
+        """
+        ETL of one dataset in the mode given by options (streaming, chunk_rows, incremental,
+        full_rebuild) -> (report, new watermark entry of the table or None).
+        """
+        _, log_kind, transform, path = next(spec for spec in self.etl_jobs() if spec[0] == table)
+        if options["incremental"]:
+            report = self.incremental_table(table, log_kind, transform, path, state, options["full_rebuild"], options["chunk_rows"])
+        elif options["streaming"]:
+            report = self.stream_table(table, log_kind, transform, path, options["chunk_rows"])
+        else:
+            report = self.load_table(table, log_kind, transform, path)
+        return report, state.get(table)
+    
+    def run_jobs(self, options:dict, state:dict, parallel:str=None, max_workers:int=ETL_MAX_WORKERS) -> dict:
+        """
+        Run every dataset one after another (parallel=None) or concurrently on a "thread" or
+        "process" pool, so wall-clock time is about the slowest table. Processes avoid the GIL
+        for the pandas-heavy parts; threads share this process's connection pool.
+        Incremental watermarks are saved after every finished table.
+        Fails fast: the first failure cancels the tables not started yet, stops running jobs at
+        their next chunk and is raised with the table name right away (running jobs are not awaited).
+        """
+        report = {}
+        state_lock = threading.Lock()
+        
+        def finished(table, result):
+            report[table], entry = result
+            if options["incremental"]:
+                with state_lock:
+                    state[table] = entry
+                    self.save_state(dict(state))
+        
+        tables = [spec[0] for spec in self.etl_jobs()]
+        if not parallel:
+            for table in tables:
+                finished(table, self.run_table(table, options, state))
+            return report
+        
+        start = time.perf_counter()
+        if parallel == "process":
+            self._cancelled = multiprocessing.Event()
+            pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_etl_worker, initargs=(self._cancelled,))
+            submit = lambda table: pool.submit(_run_table_in_process, self.pipeline_kwargs, table, options, state.get(table))
+        elif parallel == "thread":
+            self._cancelled = threading.Event()
+            pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="etl")
+            submit = lambda table: pool.submit(self.run_table, table, options, state)
+        else:
+            raise ValueError(f"Unknown parallel mode {parallel!r}, expected 'thread' or 'process'")
+        
+        futures = {submit(table): table for table in tables}
+        try:
+            for future in as_completed(futures):
+                table = futures[future]
+                try:
+                    finished(table, future.result())
+                except Exception as e:
+                    self._cancelled.set()
+                    # don't wait for running jobs (a whole-table load never checks the cancel flag)
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    logging.error(f"ETL of {table} failed, cancelling the other tables: {e}")
+                    raise RuntimeError(f"ETL of table {table} failed: {e}")
+        finally:
+            pool.shutdown(wait=not self._cancelled.is_set())
+        wall = time.perf_counter() - start
+        logging.info(f"Parallel ETL ({parallel}) took {wall:.3f}s for {sum(r['seconds'] for r in report.values()):.3f}s of table work.")
+        return report
+    
+    def run_etl(self, streaming:bool=False, chunk_rows:int=ETL_CHUNK_ROWS, incremental:bool=False, full_rebuild:bool=False,
+                parallel:str=None, max_workers:int=ETL_MAX_WORKERS):
+        """
+        streaming=False loads each table whole; streaming=True processes chunk_rows rows at a
+        time through a server-side cursor.
+        incremental=True (always chunked) only processes rows newer than the watermarks of the
+        previous run and appends them; full_rebuild=True rewrites every output and resets them.
+        parallel="thread" or "process" runs the tables concurrently on max_workers workers.
+        Returns {table: report} with row counts and timings.
+        """
         try:
             logging.info("ETL Pipeline initiated.")
-            # nutrition data
-            nutrition_df = self.extractor.from_db(table=NUTRITION_TABLE_NAME)
-            transformed_nutrition_df = self.transformer.transform_nutrition(nutrition_df)
-            self.loader.save_csv(df=pd.DataFrame(transformed_nutrition_df), path="data/processed/Nutrition_transformed.csv") # save the clean data in csv format in desired path
-            
-            # workout data
-            workout_df = self.extractor.from_db(table=WORKOUTS_TABLE_NAME)
-            transformed_workout_df = self.transformer.transform_workout(workout_df)
-            self.loader.save_csv(df=pd.DataFrame(transformed_workout_df), path="data/processed/Workout_tranformed.csv")
-            
-            # FAQ data
-            faq_df = self.extractor.from_db(table=FAQ_TABLE_NAME)
-            transformed_faq_df = self.transformer.transform_faq(faq_df)
-            self.loader.save_csv(df=pd.DataFrame(transformed_faq_df), path="data/processed/FAQ_transformed.csv")
+            if incremental and self.output_format != "csv":
+                raise ValueError("Incremental mode appends to CSV outputs; use a full or streaming run for Parquet/Feather")
+            options = {"streaming": streaming, "chunk_rows": chunk_rows, "incremental": incremental, "full_rebuild": full_rebuild}
+            if incremental:
+                state = self.load_state()
+            else:
+                self.reset_state() # outputs are rewritten, the old watermarks no longer match them
+                state = {}
             
+            report = self.run_jobs(options, state, parallel, max_workers)
             logging.info("ETL Pipeline finished.")
             
             print("ETL completed for all datasets.")
+            return report
             
-        except PersonalizedCoachException as e:
+        except Exception as e:
             logging.error(f"Error occured while running etl_pipeline: {e}")
             raise PersonalizedCoachException(e,sys)
         
 if __name__=="__main__":
-    etl=ETLPipeline().run_etl()
+    etl=ETLPipeline().run_etl(
+        streaming=os.getenv("ETL_STREAMING", "false").lower() == "true",
+        incremental=os.getenv("ETL_INCREMENTAL", "false").lower() == "true",
+        full_rebuild=os.getenv("ETL_FULL_REBUILD", "false").lower() == "true",
+        parallel=os.getenv("ETL_PARALLEL") # "thread" or "process"
+    )
     print(etl)
@@ -6,6 +6,10 @@ from sqlalchemy.exc import NoSuchTableError
 
 from src.custom_logging.logger import logging
 from src.exception.exception import PersonalizedCoachException
+from src.db.recommendation_log import LOG_TABLES, read_log_frame, iter_log_frames
+from src.db.models import base
+from src.contants import ETL_CHUNK_ROWS
+from sqlalchemy import select, func
 
 class Extractor:
     def __init__(self, db_engine:Engine=None):
@@ -36,5 +40,95 @@ class Extractor:
         except PersonalizedCoachException as e:
             logging.error(f"Error in from_db(): {e}")
             raise PersonalizedCoachException(e,sys)
-        
-        
\ No newline at end of file
+    
+    def from_recommendation_log(self, kind:str, since=None) -> pd.DataFrame:
+        """
+        Load logged predictions ('nutrition' or 'workout') in the training-table schema.
+        """
+        try:
+            return read_log_frame(self.db_engine, kind, since=since)
+        except Exception as e:
+            logging.error(f"Error in from_recommendation_log(): {e}")
+            raise PersonalizedCoachException(e,sys)
+
+    
+    def iter_db(self, table: str = None, query: str = None, chunk_rows:int=ETL_CHUNK_ROWS):
+        """
+        Generator of DataFrames of at most chunk_rows rows from a table or a custom SQL query.
+        Rows are fetched through a server-side cursor (stream_results), so memory stays bounded.
+        """
+        try:
+            if table is None and query is None:
+                raise ValueError("Either 'table' or 'query' must be provided.")
+            with self.db_engine.connect().execution_options(stream_results=True) as conn:
+                if query is not None:
+                    chunks = pd.read_sql(query, con=conn, chunksize=chunk_rows)
+                else:
+                    chunks = pd.read_sql_table(table, con=conn, chunksize=chunk_rows)
+                for chunk in chunks:
+                    yield chunk
+        except Exception as e:
+            logging.error(f"Error in iter_db(): {e}")
+            raise PersonalizedCoachException(e,sys)
+    
+    def iter_recommendation_log(self, kind:str, since=None, chunk_rows:int=ETL_CHUNK_ROWS, after=None, until=None):
+        """
+        Chunked version of from_recommendation_log(); after/until bound logged_at (after < t <= until).
+        """
+        return iter_log_frames(self.db_engine, kind, since=since, chunk_rows=chunk_rows, after=after, until=until)
+    
+    def iter_id_range(self, table:str, after_id=None, until_id=None, chunk_rows:int=ETL_CHUNK_ROWS):
+        """
+        Chunks of the rows with after_id < id <= until_id (each bound optional), in id order.
+        """
+        model = base.metadata.tables[table]
+        query = select(model)
+        if after_id is not None:
+            query = query.where(model.c.id > after_id)
+        if until_id is not None:
+            query = query.where(model.c.id <= until_id)
+        return self.iter_db(query=query.order_by(model.c.id), chunk_rows=chunk_rows)
+    
+    def max_value(self, table:str, column:str):
+        """
+        MAX(column) of a table (None when empty), used as the ETL high-water mark.
+        """
+        try:
+            model = base.metadata.tables[table]
+            with self.db_engine.connect() as conn:
+                return conn.execute(select(func.max(model.c[column]))).scalar()
+        except Exception as e:
+            logging.error(f"Error in max_value(): {e}")
+            raise PersonalizedCoachException(e,sys)
+    
+    def count_logged(self, kind:str, since=None, until=None) -> int:
+        """
+        Logged predictions (sum of hits, so compaction does not change it) with since <= logged_at <= until.
+        """
+        try:
+            model = LOG_TABLES[kind]
+            query = select(func.coalesce(func.sum(model.c.hits), 0))
+            if since is not None:
+                query = query.where(model.c.logged_at >= since)
+            if until is not None:
+                query = query.where(model.c.logged_at <= until)
+            with self.db_engine.connect() as conn:
+                return int(conn.execute(query).scalar())
+        except Exception as e:
+            logging.error(f"Error in count_logged(): {e}")
+            raise PersonalizedCoachException(e,sys)
+    
+    def count_rows(self, table:str, until_id=None) -> int:
+        """
+        Number of rows with id <= until_id (all rows when None).
+        """
+        try:
+            model = base.metadata.tables[table]
+            query = select(func.count()).select_from(model)
+            if until_id is not None:
+                query = query.where(model.c.id <= until_id)
+            with self.db_engine.connect() as conn:
+                return conn.execute(query).scalar()
+        except Exception as e:
+            logging.error(f"Error in count_rows(): {e}")
+            raise PersonalizedCoachException(e,sys)
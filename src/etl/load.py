@@ -3,8 +3,31 @@ from src.exception.exception import PersonalizedCoachException
 import os
 import sys
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 class Loader:
+    def save(self, df, path):
+        """
+        Save a processed DataFrame in the format given by the path extension (.csv, .parquet, .feather).
+        Parquet/Feather keep the dtypes (category, float32) for the training readers.
+        """
+        try:
+            extension = os.path.splitext(path)[1].lower()
+            if extension == ".csv":
+                return self.save_csv(df, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if extension == ".parquet":
+                df.to_parquet(path, index=False)
+            elif extension == ".feather":
+                df.reset_index(drop=True).to_feather(path)
+            else:
+                raise ValueError(f"Unsupported processed data file {path}")
+            print(f"Saved processed data to file path {path}")
+        except Exception as e:
+            logging.info(f"Error occured in saving the transformed data: {e}")
+            raise PersonalizedCoachException(e,sys)
+    
     def save_csv(self, df, path):
         try:
             os.makedirs(os.path.dirname(path), exist_ok=True)
@@ -12,4 +35,104 @@ class Loader:
             print(f"Saved processed data to file path {path}")
         except PersonalizedCoachException as e:
             logging.info(f"Error occured in saving the transformed data: {e}")
-            raise PersonalizedCoachException(e,sys)
\ No newline at end of file
+            raise PersonalizedCoachException(e,sys)
+    
+    def save_chunks(self, chunks, path, on_chunk=None) -> int:
+        """
+        Chunked save in the format given by the path extension (.csv or .parquet; Feather
+        files cannot be written incrementally with per-chunk categories).
+        """
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".parquet":
+            return self.save_parquet_chunks(chunks, path, on_chunk)
+        if extension == ".csv":
+            return self.save_csv_chunks(chunks, path, on_chunk)
+        raise ValueError(f"Chunked output is only supported for .csv and .parquet files, got {path}")
+    
+    def save_parquet_chunks(self, chunks, path, on_chunk=None) -> int:
+        """
+        Write DataFrame chunks as row groups of one Parquet file (moved into place when complete).
+        Categorical columns get a common dictionary type, each chunk keeps its own categories.
+        """
+        tmp_path = f"{path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            writer, schema, empty, rows = None, None, None, 0
+            for chunk in chunks:
+                if not len(chunk):
+                    empty = chunk if empty is None else empty
+                    continue
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    schema = pa.schema([
+                        field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+                        if pa.types.is_dictionary(field.type) else field
+                        for field in table.schema
+                    ], metadata=table.schema.metadata)
+                    writer = pq.ParquetWriter(tmp_path, schema)
+                writer.write_table(table.cast(schema))
+                rows += len(chunk)
+                if on_chunk is not None:
+                    on_chunk(rows)
+            if writer is None:
+                (empty if empty is not None else pd.DataFrame()).to_parquet(tmp_path, index=False)
+            else:
+                writer.close()
+            os.replace(tmp_path, path)
+            print(f"Saved processed data to file path {path}")
+            return rows
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            logging.info(f"Error occured in saving the transformed data: {e}")
+            raise PersonalizedCoachException(e,sys)
+    
+    def save_csv_chunks(self, chunks, path, on_chunk=None) -> int:
+        """
+        Append DataFrame chunks to one CSV (header written once) and return the row count.
+        The file is written next to path and moved into place when complete, so readers
+        never see a partial output. on_chunk(rows_so_far) is called after every chunk.
+        """
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            rows, header = 0, True
+            with open(tmp_path, "w", newline="") as f:
+                for chunk in chunks:
+                    if header or len(chunk):
+                        chunk.to_csv(f, index=False, header=header)
+                        header = False
+                    rows += len(chunk)
+                    if on_chunk is not None:
+                        on_chunk(rows)
+            os.replace(tmp_path, path)
+            print(f"Saved processed data to file path {path}")
+            return rows
+        except Exception as e:
+            if os.path.exists(f"{path}.tmp"):
+                os.remove(f"{path}.tmp")
+            logging.info(f"Error occured in saving the transformed data: {e}")
+            raise PersonalizedCoachException(e,sys)
+
+    
+    def append_csv_chunks(self, chunks, path, truncate_to:int, on_chunk=None) -> int:
+        """
+        Append DataFrame chunks (no header) to an existing CSV written by save_csv_chunks().
+        The file is first cut back to truncate_to bytes, dropping whatever an interrupted
+        earlier append left behind. Returns the number of appended rows.
+        """
+        try:
+            with open(path, "r+b") as f:
+                f.truncate(truncate_to)
+            rows = 0
+            with open(path, "a", newline="") as f:
+                for chunk in chunks:
+                    chunk.to_csv(f, index=False, header=False)
+                    rows += len(chunk)
+                    if on_chunk is not None:
+                        on_chunk(rows)
+            print(f"Appended {rows} rows to file path {path}")
+            return rows
+        except Exception as e:
+            logging.info(f"Error occured in appending the transformed data: {e}")
+            raise PersonalizedCoachException(e,sys)
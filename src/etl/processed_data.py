@@ -0,0 +1,66 @@
+from src.custom_logging.logger import logging
+from src.exception.exception import PersonalizedCoachException
+from src.contants import *
+import os
+import sys
+import pandas as pd
+
+# dtypes of the processed datasets: categorical features/labels as category, measurements as float32
+NUTRITION_SCHEMA = {
+    "category": ['meal_name', 'gender', 'goal', 'diet_type'],
+    "float32": ['calories', 'protein_g', 'carbs_g', 'fats_g', 'bmi'],
+    "int16": ['age']
+}
+WORKOUT_SCHEMA = {
+    "category": ['name', 'intensity', 'muscle_group', 'gender', 'goal', 'fitness_level'],
+    "float32": ['duration_min', 'bmi'],
+    "int16": ['age']
+}
+FAQ_SCHEMA = {}
+
+PROCESSED_EXTENSIONS = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}
+
+def processed_dir(directory:str=None) -> str:
+    """
+    Directory of the processed datasets: directory, else $PROCESSED_DATA_DIR, else PROCESSED_DATA_DIR.
+    """
+    return directory or os.getenv("PROCESSED_DATA_DIR", PROCESSED_DATA_DIR)
+
+def processed_path(path:str, fmt:str=PROCESSED_FORMAT) -> str:
+    """
+    path with the extension of fmt ("csv", "parquet" or "feather").
+    """
+    if fmt not in PROCESSED_EXTENSIONS:
+        raise ValueError(f"Unknown processed data format {fmt!r}, expected one of {list(PROCESSED_EXTENSIONS)}")
+    return os.path.splitext(path)[0] + PROCESSED_EXTENSIONS[fmt]
+
+def schema_dtypes(schema:dict, columns=None) -> dict:
+    dtypes = {column: dtype for dtype, names in schema.items() for column in names}
+    return {column: dtype for column, dtype in dtypes.items() if columns is None or column in columns}
+
+def apply_schema(df:pd.DataFrame, schema:dict) -> pd.DataFrame:
+    """
+    Cast the columns present in df to the schema dtypes.
+    """
+    dtypes = schema_dtypes(schema, df.columns)
+    return df.astype(dtypes) if dtypes else df
+
+def read_processed(path:str, columns:list=None, schema:dict=None) -> pd.DataFrame:
+    """
+    Read a processed dataset (format from the file extension), optionally only some columns.
+    Parquet/Feather keep the stored dtypes; CSV is parsed straight into the schema dtypes.
+    """
+    try:
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".parquet":
+            df = pd.read_parquet(path, columns=columns)
+        elif extension == ".feather":
+            df = pd.read_feather(path, columns=columns)
+        else:
+            df = pd.read_csv(path, usecols=columns, dtype=schema_dtypes(schema or {}, columns))
+        if columns is not None:
+            df = df[columns]
+        return apply_schema(df, schema) if schema else df
+    except Exception as e:
+        logging.error(f"Error while reading processed data {path}: {e}")
+        raise PersonalizedCoachException(e, sys)
@@ -7,8 +7,12 @@ import sys
 import re
 
 class Transformer:
-    def __init__(self):
-        pass
+    def __init__(self, vectorized:bool=True):
+        """
+        vectorized: normalize categorical features once per distinct value (category dtype output)
+        instead of calling clean_text on every row; the values are identical either way.
+        """
+        self.vectorized = vectorized
     
     def clean_text(self, text:str):
         try:
@@ -23,11 +27,35 @@ class Transformer:
             logging.error(f"Error occured in clean_text: {e}")
             raise PersonalizedCoachException(e,sys)
 
+    def normalize_categorical(self, series:pd.Series) -> pd.Series:
+        try:
+            """Same values as series.astype(str).apply(clean_text), as category dtype: factorize, clean the uniques, map back."""
+            # factorize the strings, not the raw values: 1 and 1.0 (or None and NaN) hash equal but stringify differently
+            codes, uniques = pd.factorize(series.astype(str))
+            cleaned = [self.clean_text(value) for value in uniques]
+            categories = list(dict.fromkeys(cleaned)) # different raw values may clean to the same text
+            position = {value: i for i, value in enumerate(categories)}
+            code_map = np.array([position[value] for value in cleaned], dtype=np.int32)
+            return pd.Series(pd.Categorical.from_codes(code_map[codes], categories=categories),
+                             index=series.index, name=series.name)
+        except Exception as e:
+            logging.error(f"Error occured in normalize_categorical: {e}")
+            raise PersonalizedCoachException(e,sys)
+    
+    def clean_features(self, df:pd.DataFrame, feature_cols:list) -> pd.DataFrame:
+        for col in feature_cols:
+            if col in df.columns:
+                if self.vectorized:
+                    df[col]=self.normalize_categorical(df[col])
+                else:
+                    df[col]=df[col].astype(str).apply(self.clean_text)
+        return df
+
     def drop_id(self,df:pd.DataFrame) ->pd.DataFrame:
         try:
-            """DROP ID column if it exists (case-insensitive)."""
+            """DROP ID and seeding bookkeeping (seed_key, legacy content_hash) columns if they exist (case-insensitive)."""
             for col in df.columns:
-                if col.lower()=="id":
+                if col.lower() in ("id", "seed_key", "content_hash"):
                     df=df.drop(columns=[col])
             return df
         except PersonalizedCoachException as e:
@@ -39,11 +67,7 @@ class Transformer:
             df=self.drop_id(df)
             """only clean input features (not targets)"""
             feature_cols=['gender','goal','diet_type']
-            for col in feature_cols:
-                if col in df.columns:
-                    df[col]=df[col].astype(str).apply(self.clean_text)
-                    
-            return df
+            return self.clean_features(df, feature_cols)
         except PersonalizedCoachException as e:
             logging.error(f"Error occured in transform_nutrition: {e}")
             raise PersonalizedCoachException(e,sys)
@@ -53,11 +77,7 @@ class Transformer:
             df = self.drop_id(df)
             """only clean input features"""
             feature_cols=['intensity','muscle_group','gender','goal','fitness_level']
-            for col in feature_cols:
-                if col in df.columns:
-                    df[col]=df[col].astype(str).apply(self.clean_text)
-                    
-            return df
+            return self.clean_features(df, feature_cols)
         except PersonalizedCoachException as e:
             logging.error(f"Error occured in transform_workout: {e}")
             raise PersonalizedCoachException(e,sys)
@@ -17,6 +17,7 @@ class NutritionRecommender:
     - meal_pipeline: classifier that predicts meal_name(LabelEncoded externally)
     - nutrients_pipeline: multi-output regressor predicting calories, protein_g, carbs_g, fats_g
     Both pipelines include a ColumnTransformer with numeric imputer + scaler and categorical OHE.
+    The ColumnTransformer instance is shared and fitted once for both estimators.
     """
 
     def __init__(self,categorial_features=None, numerical_features=None, random_state=RANDOM_STATE):
@@ -24,7 +25,7 @@ class NutritionRecommender:
         self.numerical_features = numerical_features or ['age', 'bmi']
         self.random_state = random_state
         
-        preprocessor = ColumnTransformer(
+        self.preprocessor = ColumnTransformer(
             transformers=[
                 ('cat', OneHotEncoder(handle_unknown='ignore',sparse_output=False),self.categorical_features),
                 ('num',Pipeline(steps=[
@@ -37,22 +38,24 @@ class NutritionRecommender:
         
         self.meal_pipeline = Pipeline(
             steps=[
-                ('preprocessor',preprocessor),
+                ('preprocessor',self.preprocessor),
                 ('classifier', RandomForestClassifier(n_estimators=200, random_state=self.random_state))
             ]
         )
         
         self.nutrients_pipeline = Pipeline(
             steps=[
-                ('preprocessor', preprocessor),
+                ('preprocessor', self.preprocessor),
                 ('regressor', MultiOutputRegressor(RandomForestRegressor(n_estimators=200, random_state=self.random_state)))
             ]
         )
         
     def fit(self, X, y_meal, y_nutrients):
         try:
-            self.meal_pipeline.fit(X, y_meal)
-            self.nutrients_pipeline.fit(X, y_nutrients)
+            # fit the shared preprocessor once and train both estimators on the same matrix
+            X_encoded = self.preprocessor.fit_transform(X)
+            self.meal_pipeline.named_steps['classifier'].fit(X_encoded, y_meal)
+            self.nutrients_pipeline.named_steps['regressor'].fit(X_encoded, y_nutrients)
         except PersonalizedCoachException as e:
             logging.info(f"error while fitting the data: {e}")
             raise PersonalizedCoachException(e,sys)
@@ -102,4 +105,88 @@ class NutrientModel:
     @classmethod
     def load(cls, filepath):
         logging.info(f"📦 Loading NutritionModel from: {filepath}")
-        return joblib.load(filepath)
\ No newline at end of file
+        return joblib.load(filepath)
+
+
+class FusedNutrientModel:
+    """
+    Combined model sharing one fitted preprocessor between the meal classifier
+    and the nutrients regressor, so every request is transformed only once.
+    Legacy NutrientModel artifacts are converted on load.
+    """
+    def __init__(self, preprocessor, meal_estimator, nutrients_estimator):
+        self.preprocessor = preprocessor
+        self.meal_estimator = meal_estimator
+        self.nutrients_estimator = nutrients_estimator
+
+    @classmethod
+    def from_recommender(cls, recommender:NutritionRecommender):
+        return cls(
+            preprocessor = recommender.preprocessor,
+            meal_estimator = recommender.meal_pipeline.named_steps['classifier'],
+            nutrients_estimator = recommender.nutrients_pipeline.named_steps['regressor']
+        )
+
+    @classmethod
+    def from_model(cls, model):
+        """
+        Convert a NutrientModel (two full pipelines) into a FusedNutrientModel.
+        """
+        if isinstance(model, cls):
+            return model
+        meal_preprocessor = model.meal_model.named_steps['preprocessor']
+        if meal_preprocessor is not model.nutrients_model.named_steps['preprocessor']:
+            logging.warning("NutrientModel pipelines hold separate preprocessors; using the meal pipeline's one.")
+        return cls(
+            preprocessor = meal_preprocessor,
+            meal_estimator = model.meal_model.named_steps['classifier'],
+            nutrients_estimator = model.nutrients_model.named_steps['regressor']
+        )
+
+    def transform(self, user_data):
+        return self.preprocessor.transform(user_data)
+
+    def predict_encoded(self, X):
+        """
+        Predict from an already preprocessed matrix.
+        Returns (meal_preds, nutrients_pred) arrays.
+        """
+        return self.meal_estimator.predict(X), self.nutrients_estimator.predict(X)
+
+    def to_records(self, meal_preds, nutrients_pred):
+        """
+        Turn prediction arrays into one result dict per row.
+        """
+        results = []
+        for i in range(len(meal_preds)):
+            results.append({
+                "meal":meal_preds[i],
+                "calories":nutrients_pred[i][0],
+                "protein_g":nutrients_pred[i][1],
+                "fats_g":nutrients_pred[i][2],
+                "carbs_g":nutrients_pred[i][3]
+            })
+        return results
+
+    def predict_records(self, X):
+        """
+        Predict from an already preprocessed matrix, one result dict per row.
+        """
+        return self.to_records(*self.predict_encoded(X))
+
+    def predict(self, user_data):
+        return self.predict_records(self.transform(user_data))
+
+    def save(self, filepath):
+        os.makedirs(os.path.dirname(filepath),exist_ok=True)
+        joblib.dump(self, filepath)
+        logging.info(f"💾 Fused NutritionModel saved at: {filepath}")
+
+    @classmethod
+    def load(cls, filepath):
+        logging.info(f"📦 Loading NutritionModel from: {filepath}")
+        model = joblib.load(filepath)
+        if isinstance(model, NutrientModel):
+            logging.info("Converting legacy NutrientModel artifact to FusedNutrientModel.")
+            model = cls.from_model(model)
+        return model
@@ -1,94 +1,140 @@
 import os,sys
-import joblib
 import numpy as np
 import torch
 from dotenv import load_dotenv
 load_dotenv()
-from huggingface_hub import InferenceClient
+from huggingface_hub import InferenceClient, AsyncInferenceClient
 from transformers import AutoModelForCausalLM, AutoTokenizer
 from sentence_transformers import SentenceTransformer
-from sklearn.neighbors import NearestNeighbors
 import pandas as pd
 from src.exception.exception import PersonalizedCoachException
 from src.custom_logging.logger import logging
+from src.contants import *
+from src.models.vector_index import IVFCosineIndex, build_index
+from src.models.embedding_cache import EmbeddingCache, cached_encode
+from src.models.semantic_cache import SemanticAnswerCache
 
 class ChatRetriever:
     """
     Builds and serves a retrivel-based FAQ system:
     - Uses SenetenceTransformer embeddings for faq['question]
-    - fits NearestNeighbors on embeddings (cosine)
-    - Saves embeddings array, FAQ dataframe, embedder, and NN model as artifacts.
+    - keeps one L2-normalized float32 embedding matrix, searched exactly (matmul + argpartition)
+      or through an IVF approximate index for large corpora (index_type)
+    - keeps questions/answers in plain arrays for the hits
+    - caches query embeddings (LRU, keyed by normalized query text)
+    - Saves embeddings array, IVF index, FAQ dataframe and embedder name as artifacts.
     """
-    def __init__(self, embedded_model_name='all-MiniLM-L6-v2', device=None):
+    def __init__(self, embedded_model_name='all-MiniLM-L6-v2', device=None, embedding_cache_size=None):
         self.embedded_model_name = embedded_model_name
         self.device = device
         self.embedder = SentenceTransformer(self.embedded_model_name, device = self.device)
+        if embedding_cache_size is None:
+            embedding_cache_size = int(os.getenv("EMBEDDING_CACHE_MAX_SIZE", EMBEDDING_CACHE_MAX_SIZE))
+        self.embedding_cache = EmbeddingCache(max_size=embedding_cache_size)
         self.faq_df = None
         self.embeddings = None
-        self.nn = None
+        self.index = None
+        self.questions = None
+        self.answers = None
     
-    def fit(self, faq_df:pd.DataFrame, question_col='question', answer_col='answer', n_neighbors=4):
+    def _set_corpus(self, faq_df:pd.DataFrame, index, question_col='question', answer_col='answer'):
+        self.faq_df = faq_df.reset_index(drop=True)
+        self.questions = self.faq_df[question_col].astype('str').to_numpy(dtype=object)
+        self.answers = self.faq_df[answer_col].astype('str').to_numpy(dtype=object)
+        self.index = index
+        self.embeddings = index.matrix # single normalized copy owned by the index (IVF keeps it grouped by list)
+    
+    def fit(self, faq_df:pd.DataFrame, question_col='question', answer_col='answer',
+            index_type=RETRIEVER_INDEX_TYPE, n_lists=None, n_probe=IVF_DEFAULT_N_PROBE):
         """
-        Encode FAQ questions and build NearestNeighbors index.
+        Encode FAQ questions and build the retrieval index.
+        index_type: "exact", "ivf" or "auto" (ivf from ANN_MIN_CORPUS_SIZE entries on).
         """
         try:
-            logging.info("Fitting of FAQ.csv with NearestNeighbor model for retrievel task.")
+            logging.info("Fitting of FAQ.csv with cosine retrieval index for retrievel task.")
             if question_col not in faq_df.columns or answer_col not in faq_df.columns:
                 raise ValueError("FAQ dataframe must have 'question' and 'answer' columns.")
             
-            self.faq_df = faq_df.reset_index(drop=True)
-            questions = self.faq_df[question_col].astype('str').tolist()
+            questions = faq_df[question_col].astype('str').tolist()
             
             print("Encoding FAQ questions into Embeddings...")
-            self.embeddings = self.embedder.encode(
+            embeddings = self.embedder.encode(
                 questions,
                 convert_to_numpy=True,
                 show_progress_bar=True
             )
             
-            print("Building NearestNeighbors index...")
-            self.nn = NearestNeighbors(n_neighbors=n_neighbors, metric='cosine')
-            self.nn.fit(self.embeddings)
-        except PersonalizedCoachException as e:
+            print("Building cosine retrieval index...")
+            self._set_corpus(faq_df, build_index(embeddings, index_type, n_lists, n_probe), question_col, answer_col)
+        except Exception as e:
             logging.info(f"Error while fitting the Retrievel Chatbot: {e}")
             raise PersonalizedCoachException(e,sys)
-    def retrieve(self, query:str, k=3):
+        
+    def retrieve(self, query, k=3, n_probe=None):
         """
         Retrieve top-k most similar FAQ answers for a query.
-        Returns a list of tuples: (index, similarity, question, answer)
+        Returns a list of tuples: (index, similarity, question, answer).
+        A list of queries returns one such list per query.
+        n_probe overrides the IVF recall/latency setting for this call.
+        """
+        if isinstance(query, (list, tuple)):
+            return self.retrieve_batch(list(query), k=k, n_probe=n_probe)
+        return self.retrieve_batch([query], k=k, n_probe=n_probe)[0]
+    
+    def retrieve_batch(self, queries:list, k=3, n_probe=None):
+        """
+        Retrieve top-k FAQ entries for a batch of queries with one encode + one index search.
+        """
+        return self.search(self.embed(queries), k=k, n_probe=n_probe)
+    
+    def embed(self, queries:list) -> np.ndarray:
+        """
+        Query embeddings, shape (n_queries, dim); repeated queries come from the embedding cache.
+        """
+        return cached_encode(
+            self.embedding_cache,
+            lambda texts: self.embedder.encode(texts, convert_to_numpy=True),
+            queries
+        )
+    
+    def search(self, query_embeddings:np.ndarray, k=3, n_probe=None):
+        """
+        Top-k FAQ entries for already embedded queries (one result list per row).
         """
         try:
             logging.info("Retrieving the FAQ based on cosine sim for inference.")
-            if self.nn is None or self.faq_df is None or self.embeddings is None:
+            if self.index is None or self.questions is None:
                 raise RuntimeError("Model not fitted or loaded. Call fit() or load().")
             
-            q_emb = self.embedder.encode([query], convert_to_numpy=True)
-            dists, idxs = self.nn.kneighbors(q_emb, n_neighbors=k)
+            idxs, sims = self.index.search(query_embeddings, k=k, n_probe=n_probe)
             
             results=[]
-            for i in range(len(idxs[0])):
-                idx = int(idxs[0][i])
-                sim = float(1-dists[0][i]) # cosine similarity = 1-distance
-                q_text = self.faq_df.iloc[idx]['question']
-                a_text = self.faq_df.iloc[idx]['answer']
-                results.append((idx,sim,q_text,a_text))
+            for row_idxs, row_sims in zip(idxs, sims):
+                results.append([
+                    (int(idx), float(sim), self.questions[idx], self.answers[idx])
+                    for idx, sim in zip(row_idxs, row_sims)
+                    if idx >= 0 # IVF may find fewer than k candidates in the probed lists
+                ])
             return results
-        except PersonalizedCoachException as e:
+        except Exception as e:
             logging.info(f"Error while retriveing the FAQ from the dataset: {e}")
             raise PersonalizedCoachException(e,sys)
     
     def save(self, out_dir="models/chatbot"):
         """
-        Save embeddings, NearestNeighbors index, and embedder name.
+        Save normalized embeddings (corpus order), IVF index structure, FAQ data, and embedder name.
         """
         try:
             os.makedirs(out_dir, exist_ok=True)
             
-            if self.embeddings is not None:
-                np.save(os.path.join(out_dir, 'faq_embeddings.npy'),self.embeddings)
-                
-            if self.nn is not None:
-                joblib.dump(self.nn, os.path.join(out_dir, 'nn.joblib'))
+            if self.index is not None:
+                np.save(os.path.join(out_dir, 'faq_embeddings.npy'),self.index.original_matrix())
+            
+            ivf_path = os.path.join(out_dir, IVF_INDEX_FILE)
+            if isinstance(self.index, IVFCosineIndex):
+                self.index.save(ivf_path)
+            elif os.path.exists(ivf_path):
+                os.remove(ivf_path) # stale index from a previous ivf fit
             
             if self.faq_df is not None:
                 self.faq_df.to_csv(os.path.join(out_dir, "faq_data.csv"),index=False)
@@ -98,29 +144,36 @@ class ChatRetriever:
                 f.write(self.embedded_model_name)
                 
             print(f"ChatbotRetriever saved to {out_dir}")
-        except PersonalizedCoachException as e:
+        except Exception as e:
             logging.info(f"Error whike saving the info of the Retrievel Chatbot model: {e}")
             raise PersonalizedCoachException(e,sys)
         
     def load(self, out_dir="models/chatbot", device=None):
         """
-        Load retriever artifacts (embeddings, NN index, embedder by name).
+        Load retriever artifacts (embeddings, IVF index if present, FAQ data, embedder by name).
+        A legacy nn.joblib next to them is no longer needed and is ignored.
         """
         try:
             print(f"Loading retriever from {out_dir}...")
 
-            self.embeddings = np.load(os.path.join(out_dir, 'faq_embeddings.npy'))
-            self.nn = joblib.load(os.path.join(out_dir, 'nn.joblib'))
-            self.faq_df = pd.read_csv(os.path.join(out_dir, 'faq_data.csv'))
+            embeddings = np.load(os.path.join(out_dir, 'faq_embeddings.npy'))
+            faq_df = pd.read_csv(os.path.join(out_dir, 'faq_data.csv'))
+            ivf_path = os.path.join(out_dir, IVF_INDEX_FILE)
+            if os.path.exists(ivf_path):
+                index = IVFCosineIndex.load(ivf_path, embeddings)
+            else:
+                index = build_index(embeddings, index_type="exact")
+            self._set_corpus(faq_df, index)
 
             with open(os.path.join(out_dir, 'embedder_name.txt'), 'r') as f:
                 self.embed_model_name = f.read().strip()
 
             self.embedder = SentenceTransformer(self.embed_model_name, device=device or self.device)
+            self.embedding_cache.clear() # embeddings of the previous embedder are not comparable
             print(f"✅ Loaded embedder '{self.embed_model_name}' successfully.")
 
             return self
-        except PersonalizedCoachException as e:
+        except Exception as e:
             logging.info(f"Error while Loading the info of the Retrievel Chatbot model form the saved dir:{e}")
             raise PersonalizedCoachException(e,sys)
     
@@ -140,6 +193,7 @@ class Generative_Chatbot:
             logging.info(f"Initializing API-based Generative ChatBot: {model_name}")
             
             self.client=InferenceClient(provider="auto", api_key=self.hf_token)
+            self.async_client=AsyncInferenceClient(provider="auto", api_key=self.hf_token)
         except PersonalizedCoachException as e:
             logging.info(f"Error initializing API Generative Chatbot: {e}")
             raise PersonalizedCoachException(e, sys)
@@ -148,6 +202,12 @@ class Generative_Chatbot:
         """
         Generate text using Hugging Face API with streaming.
         """
+        return "".join(self.generate_stream(messages))
+    
+    def generate_stream(self, messages:list):
+        """
+        Yield text chunks from the Hugging Face API as they arrive.
+        """
         try:
             logging.info("Generating response via HuggingFace API...")
             stream = self.client.chat.completions.create(
@@ -158,68 +218,130 @@ class Generative_Chatbot:
                 stream=True
             )
             
-            # stream response
-            output=""
             for chunk in stream:
-                output+=chunk.choices[0].delta.content
-            return output
-        except PersonalizedCoachException as e:
+                content = chunk.choices[0].delta.content
+                if content: # role-only / final chunks carry no text
+                    yield content
+        except Exception as e:
             logging.info(f"Error generating API response: {e}")
             raise PersonalizedCoachException(e,sys)
+    
+    async def agenerate(self, messages:list)->str:
+        """
+        Async variant of generate(): waits on the HF API without holding a thread.
+        """
+        return "".join([content async for content in self.agenerate_stream(messages)])
+    
+    async def agenerate_stream(self, messages:list):
+        """
+        Async variant of generate_stream().
+        """
+        try:
+            logging.info("Generating response via async HuggingFace API...")
+            stream = await self.async_client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                temperature=self.temperature,
+                top_p=self.top_p,
+                stream=True
+            )
+            
+            async for chunk in stream:
+                content = chunk.choices[0].delta.content
+                if content:
+                    yield content
+        except Exception as e:
+            logging.info(f"Error generating async API response: {e}")
+            raise PersonalizedCoachException(e,sys)
 
 class Hybrid_Chatbot:
     """
     Combines retrieval (semantic search on FAQ) and generative (LLM) responses.
+    RAG answers are served from answer_cache (SemanticAnswerCache) when a close enough query was answered before.
     """
-    def __init__(self, retriever:ChatRetriever, generator:Generative_Chatbot, retrievel_threshold:float=0.65):
+    def __init__(self, retriever:ChatRetriever, generator:Generative_Chatbot, retrievel_threshold:float=0.65,
+                 answer_cache:SemanticAnswerCache=None):
         try:
             logging.info("Initializing Hybrid Chatbot with retriever and generative components")
             self.retriever=retriever
             self.generator=generator
             self.threshold=retrievel_threshold
+            self.answer_cache=answer_cache
             logging.info("HybridChatbot intialized with API generator successfully...")
         except PersonalizedCoachException as e:
             logging.info(f"Error initializing Hybrid Chatbot: {e}")
             raise PersonalizedCoachException(e,sys)
         
-    def rag_generate(self, query:str, k:int=3)->str:
+    def rag_generate(self, query:str, k:int=3, results:list=None)->str:
         """
         Use retrieved FAQ context + generative reasoning to produce a detailed answer.
+        results: retrieval hits already computed for this query (retrieved here if None).
         """
         try:
             logging.info("Generating response using RAG pipeline.")
-            results = self.retriever.retrieve(query, k=k)
-
-            # Combine FAQ Q&A pairs into contextual knowledge
-            context = "\n\n".join([f"Q: {r[2]}\nA: {r[3]}" for r in results])
+            if results is None:
+                results = self.retriever.retrieve(query, k=k)
 
-            messages = [
-                {'role':"system","content":"You are a professional AI fitness and nutrition assistant."},
-                {'role':'assistant',"content":f"Here are some FAQ entries that might help:\n\n{context}"},
-                {'role':'user','content':query}
-            ]
             # Use the LLM to generate a contextual, motivational, and structured answer
-            gen_response = self.generator.generate(messages)
+            gen_response = self.generator.generate(self.rag_messages(query, results))
             return gen_response
 
         except PersonalizedCoachException as e:
             logging.info(f"Error while generating RAG response: {e}")
             raise PersonalizedCoachException(e, sys)
+    
+    def rag_messages(self, query:str, results:list)->list:
+        """
+        Chat messages for the LLM: FAQ Q&A pairs as context, then the user query.
+        """
+        # Combine FAQ Q&A pairs into contextual knowledge
+        context = "\n\n".join([f"Q: {r[2]}\nA: {r[3]}" for r in results])
+        return [
+            {'role':"system","content":"You are a professional AI fitness and nutrition assistant."},
+            {'role':'assistant',"content":f"Here are some FAQ entries that might help:\n\n{context}"},
+            {'role':'user','content':query}
+        ]
+        
+    def cached_rag_generate(self, query:str, query_embedding, k:int, results:list):
+        """
+        RAG answer through the semantic answer cache (if configured). Returns (answer, cached).
+        """
+        if self.answer_cache is None:
+            return self.rag_generate(query, k=k, results=results), False
+        return self.answer_cache.get_or_generate(
+            EmbeddingCache.normalize(query),
+            query_embedding,
+            lambda: self.rag_generate(query, k=k, results=results)
+        )
+        
+    def retrieve_with_embedding(self, query:str, k:int=3):
+        """
+        Query embedding (1, dim) and its top-k FAQ hits.
+        """
+        return self.retrieve_many_with_embeddings([query], k=k)[0]
+    
+    def retrieve_many_with_embeddings(self, queries:list, k:int=3)->list:
+        """
+        Batched retrieve_with_embedding: one encode + one index search for all queries.
+        """
+        query_embeddings = self.retriever.embed(queries)
+        results = self.retriever.search(query_embeddings, k=k)
+        return [(query_embeddings[i:i + 1], hits) for i, hits in enumerate(results)]
         
     def chat(self, query: str, k: int = 3) -> dict:
         """
         Decides whether to use direct FAQ retrieval or RAG generation.
-        Returns a dict: {'mode': 'retrieval'/'rag', 'answer': str, 'score': float}
+        Returns a dict: {'mode': 'retrieval'/'rag', 'answer': str, 'score': float, 'cached': bool}
         """
         try:
             logging.info(f"Processing query through Hybrid Chatbot: {query}")
 
-            # Step 1: Retrieve relevant FAQs
-            results = self.retriever.retrieve(query, k=k)
+            # Step 1: Retrieve relevant FAQs (embedding reused by the answer cache, hits reused as RAG context)
+            query_embedding, results = self.retrieve_with_embedding(query, k)
             if not results:
                 logging.info("No FAQ results found; defaulting to RAG mode.")
-                gen_response = self.rag_generate(query, k=k)
-                return {"mode": "rag", "answer": gen_response, "score": None}
+                gen_response, cached = self.cached_rag_generate(query, query_embedding, k, results)
+                return {"mode": "rag", "answer": gen_response, "score": None, "cached": cached}
 
             top_idx, top_sim, q_text, ans_text = results[0]
             logging.info(f"Top similarity score from retrieval: {top_sim}")
@@ -230,20 +352,128 @@ class Hybrid_Chatbot:
                 return {
                     "mode": "retrieval",
                     "answer": ans_text,
-                    "score": float(top_sim)
+                    "score": float(top_sim),
+                    "cached": False
                 }
 
             # Step 3: Otherwise → use RAG (retrieval + generation)
             logging.info("Low similarity; using RAG Mode (context + LLM generation).")
-            gen_response = self.rag_generate(query, k=k)
+            gen_response, cached = self.cached_rag_generate(query, query_embedding, k, results)
             return {
                 "mode": "rag",
                 "answer": gen_response,
-                "score": float(top_sim)
+                "score": float(top_sim),
+                "cached": cached
             }
 
         except PersonalizedCoachException as e:
             logging.info(f"Error in Hybrid Chatbot chat method: {e}")
             raise PersonalizedCoachException(e, sys)
-        
-                
\ No newline at end of file
+
+    def chat_stream(self, query: str, k: int = 3):
+        """
+        Streaming variant of chat(). Yields event dicts:
+        - {'event': 'meta', 'mode', 'score', 'cached'} first, with 'answer' for retrieval mode and cached RAG answers
+        - {'event': 'token', 'text'} for every generated chunk (RAG mode)
+        - {'event': 'done'} at the end
+        A streamed RAG answer is stored in the answer cache once complete; concurrent streams are not coalesced.
+        """
+        try:
+            logging.info(f"Processing streaming query through Hybrid Chatbot: {query}")
+            query_embedding, results = self.retrieve_with_embedding(query, k)
+            score = float(results[0][1]) if results else None
+
+            if score is not None and score >= self.threshold:
+                logging.info("High similarity found; using Retrieval Mode.")
+                yield {"event": "meta", "mode": "retrieval", "score": score, "cached": False, "answer": results[0][3]}
+                yield {"event": "done"}
+                return
+
+            cached_answer = self.answer_cache.get(query_embedding) if self.answer_cache is not None else None
+            if cached_answer is not None:
+                yield {"event": "meta", "mode": "rag", "score": score, "cached": True, "answer": cached_answer}
+                yield {"event": "done"}
+                return
+
+            logging.info("Low similarity; streaming RAG Mode (context + LLM generation).")
+            yield {"event": "meta", "mode": "rag", "score": score, "cached": False}
+            chunks = []
+            for text in self.generator.generate_stream(self.rag_messages(query, results)):
+                chunks.append(text)
+                yield {"event": "token", "text": text}
+            if self.answer_cache is not None:
+                self.answer_cache.put(query_embedding, "".join(chunks))
+            yield {"event": "done"}
+        except Exception as e:
+            logging.info(f"Error in Hybrid Chatbot chat_stream method: {e}")
+            raise PersonalizedCoachException(e, sys)
+
+    async def achat(self, query: str, k: int = 3, retrieve=None) -> dict:
+        """
+        Async variant of chat(): retrieve(query) is an async callable returning
+        (query_embedding, hits), e.g. a CPU executor or micro-batcher; it defaults to
+        retrieve_with_embedding on the event loop. LLM generation uses the async client.
+        """
+        try:
+            logging.info(f"Processing async query through Hybrid Chatbot: {query}")
+            query_embedding, results = await (retrieve or self.aretrieve_inline(k))(query)
+            score = float(results[0][1]) if results else None
+
+            if score is not None and score >= self.threshold:
+                logging.info("High similarity found; using Retrieval Mode.")
+                return {"mode": "retrieval", "answer": results[0][3], "score": score, "cached": False}
+
+            logging.info("Low similarity; using RAG Mode (context + async LLM generation).")
+            messages = self.rag_messages(query, results)
+            if self.answer_cache is None:
+                answer, cached = await self.generator.agenerate(messages), False
+            else:
+                answer, cached = await self.answer_cache.aget_or_generate(
+                    EmbeddingCache.normalize(query),
+                    query_embedding,
+                    lambda: self.generator.agenerate(messages)
+                )
+            return {"mode": "rag", "answer": answer, "score": score, "cached": cached}
+        except Exception as e:
+            logging.info(f"Error in Hybrid Chatbot achat method: {e}")
+            raise PersonalizedCoachException(e, sys)
+
+    async def achat_stream(self, query: str, k: int = 3, retrieve=None):
+        """
+        Async variant of chat_stream() (same events), generation through the async client.
+        """
+        try:
+            logging.info(f"Processing async streaming query through Hybrid Chatbot: {query}")
+            query_embedding, results = await (retrieve or self.aretrieve_inline(k))(query)
+            score = float(results[0][1]) if results else None
+
+            if score is not None and score >= self.threshold:
+                yield {"event": "meta", "mode": "retrieval", "score": score, "cached": False, "answer": results[0][3]}
+                yield {"event": "done"}
+                return
+
+            cached_answer = self.answer_cache.get(query_embedding) if self.answer_cache is not None else None
+            if cached_answer is not None:
+                yield {"event": "meta", "mode": "rag", "score": score, "cached": True, "answer": cached_answer}
+                yield {"event": "done"}
+                return
+
+            yield {"event": "meta", "mode": "rag", "score": score, "cached": False}
+            chunks = []
+            async for text in self.generator.agenerate_stream(self.rag_messages(query, results)):
+                chunks.append(text)
+                yield {"event": "token", "text": text}
+            if self.answer_cache is not None:
+                self.answer_cache.put(query_embedding, "".join(chunks))
+            yield {"event": "done"}
+        except Exception as e:
+            logging.info(f"Error in Hybrid Chatbot achat_stream method: {e}")
+            raise PersonalizedCoachException(e, sys)
+
+    def aretrieve_inline(self, k:int=3):
+        """
+        Default retrieve for the async chat methods: retrieve_with_embedding on the event loop thread.
+        """
+        async def retrieve(query):
+            return self.retrieve_with_embedding(query, k)
+        return retrieve
@@ -0,0 +1,195 @@
+from src.exception.exception import PersonalizedCoachException
+from src.custom_logging.logger import logging
+from src.contants import *
+import os
+import sys
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.utils.fixes import parse_version
+from src.models.Nutrition_recommender import FusedNutrientModel
+from src.models.workout_recommender import FusedWorkoutModel
+
+# scikit-learn >= 1.4 stores class fractions in tree_.value and returns them as-is from predict_proba;
+# older versions store weighted counts and normalise them per prediction
+TREE_VALUE_IS_FRACTION = parse_version(sklearn.__version__) >= parse_version("1.4")
+
+class CompiledForest:
+    """
+    Flat array-of-nodes form of a fitted RandomForestClassifier/RandomForestRegressor:
+    - every tree is concatenated into shared feature/threshold/left/right/value arrays
+    - leaves point to themselves, so all trees are walked together level by level
+    - evaluation is plain NumPy indexing, no per-estimator Python dispatch
+    """
+    def __init__(self, forest):
+        try:
+            self.is_classifier = isinstance(forest, RandomForestClassifier)
+            self.classes_ = getattr(forest, 'classes_', None)
+
+            features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+            offset = 0
+            max_depth = 0
+            for estimator in forest.estimators_:
+                tree = estimator.tree_
+                node_ids = np.arange(tree.node_count)
+                is_leaf = tree.children_left == -1
+
+                features.append(np.where(is_leaf, 0, tree.feature).astype(np.intp))
+                thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+                lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+                rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+
+                if self.is_classifier and TREE_VALUE_IS_FRACTION:
+                    values.append(tree.value[:, 0, :].copy())
+                elif self.is_classifier:
+                    # same normalisation as DecisionTreeClassifier.predict_proba
+                    value = tree.value[:, 0, :].copy()
+                    normalizer = value.sum(axis=1, keepdims=True)
+                    normalizer[normalizer == 0.0] = 1.0
+                    values.append(value / normalizer)
+                else:
+                    values.append(tree.value[:, 0, 0].copy())
+
+                roots.append(offset)
+                offset += tree.node_count
+                max_depth = max(max_depth, tree.max_depth)
+
+            self.feature = np.concatenate(features)
+            self.threshold = np.concatenate(thresholds)
+            self.left = np.concatenate(lefts).astype(np.intp)
+            self.right = np.concatenate(rights).astype(np.intp)
+            self.value = np.concatenate(values)
+            self.roots = np.asarray(roots, dtype=np.intp)
+            self.max_depth = max_depth
+            self.n_trees = len(roots)
+        except Exception as e:
+            logging.info(f"Error while compiling the forest: {e}")
+            raise PersonalizedCoachException(e,sys)
+
+    def apply(self, X):
+        """
+        Return the leaf index reached in every tree, shape (n_trees, n_samples).
+        """
+        # trees split on float32 features, exactly like sklearn
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])[np.newaxis, :]
+        nodes = np.repeat(self.roots[:, np.newaxis], X.shape[0], axis=1)
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def _mean_over_trees(self, leaves):
+        # accumulate tree by tree like sklearn (same summation order), one tree's values in memory at a time
+        total = self.value[leaves[0]].copy()
+        for tree_leaves in leaves[1:]:
+            total += self.value[tree_leaves]
+        return total / self.n_trees
+
+    def predict_proba(self, X):
+        return self._mean_over_trees(self.apply(X))
+
+    def predict(self, X):
+        if self.is_classifier:
+            return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+        return self._mean_over_trees(self.apply(X))
+
+class CompiledNutrientModel(FusedNutrientModel):
+    """
+    NutrientModel/FusedNutrientModel served by compiled forests:
+    - the fitted preprocessor is reused as-is
+    - meal classifier and every nutrient regressor are CompiledForest objects
+    """
+    def __init__(self, nutrient_model):
+        try:
+            fused = FusedNutrientModel.from_model(nutrient_model)
+            super().__init__(fused.preprocessor, fused.meal_estimator, fused.nutrients_estimator)
+            self.meal_forest = CompiledForest(fused.meal_estimator)
+            self.nutrients_forests = [
+                CompiledForest(estimator)
+                for estimator in fused.nutrients_estimator.estimators_
+            ]
+        except Exception as e:
+            logging.info(f"Error while compiling NutrientModel: {e}")
+            raise PersonalizedCoachException(e,sys)
+
+    def predict_encoded(self, X):
+        meal_preds = self.meal_forest.predict(X)
+        nutrients_pred = np.column_stack([forest.predict(X) for forest in self.nutrients_forests])
+        return meal_preds, nutrients_pred
+
+class CompiledWorkoutModel(FusedWorkoutModel):
+    """
+    WorkoutModel/FusedWorkoutModel served by compiled forests (workout classifier + duration regressor).
+    """
+    def __init__(self, workout_model):
+        try:
+            fused = FusedWorkoutModel.from_model(workout_model)
+            super().__init__(fused.preprocessor, fused.workout_estimator, fused.duration_estimator)
+            self.workout_forest = CompiledForest(fused.workout_estimator)
+            self.duration_forest = CompiledForest(fused.duration_estimator)
+        except Exception as e:
+            logging.info(f"Error while compiling WorkoutModel: {e}")
+            raise PersonalizedCoachException(e,sys)
+
+    def predict_encoded(self, X):
+        return self.workout_forest.predict(X), self.duration_forest.predict(X)
+
+def sample_inputs(preprocessor, n_samples=64, random_state=RANDOM_STATE):
+    """
+    Build synthetic raw input rows from a fitted ColumnTransformer:
+    categorical values are drawn from the OneHotEncoder categories,
+    numeric values from the scaler mean/scale.
+    """
+    rng = np.random.default_rng(random_state)
+    data = {}
+    for name, transformer, columns in preprocessor.transformers_:
+        if name == 'cat':
+            for col, categories in zip(columns, transformer.categories_):
+                data[col] = rng.choice(categories, size=n_samples)
+        elif name == 'num':
+            scaler = transformer.named_steps['scaler']
+            for col, mean, scale in zip(columns, scaler.mean_, scaler.scale_):
+                data[col] = rng.normal(mean, scale, size=n_samples)
+    return pd.DataFrame(data)
+
+def verify_parity(reference_model, compiled_model, user_data, atol=1e-9):
+    """
+    Compare compiled predictions against the sklearn model on the same rows.
+    Returns a report with the number of label mismatches and the max absolute
+    deviation over the numeric outputs.
+    """
+    reference = reference_model.predict(user_data)
+    compiled = compiled_model.predict(user_data)
+
+    label_mismatches = 0
+    max_abs_diff = 0.0
+    for ref, comp in zip(reference, compiled):
+        for key, ref_value in ref.items():
+            if isinstance(ref_value, (float, np.floating)):
+                max_abs_diff = max(max_abs_diff, abs(float(ref_value) - float(comp[key])))
+            elif ref_value != comp[key]:
+                label_mismatches += 1
+
+    return {
+        "n_samples": len(reference),
+        "label_mismatches": label_mismatches,
+        "max_abs_diff": max_abs_diff,
+        "passed": label_mismatches == 0 and max_abs_diff <= atol
+    }
+
+if __name__=="__main__":
+    # Parity check of the compiled engine against the saved sklearn models
+    try:
+        nutrition_model = FusedNutrientModel.load(os.path.join(NUTRITION_OUT, "nutrition_combined_model.joblib"))
+        compiled_nutrition = CompiledNutrientModel(nutrition_model)
+        nutrition_rows = sample_inputs(compiled_nutrition.preprocessor, n_samples=512)
+        print("Nutrition parity:", verify_parity(nutrition_model, compiled_nutrition, nutrition_rows))
+
+        workout_model = FusedWorkoutModel.load(os.path.join(WORKOUT_OUT, "workout_combined_model.joblib"))
+        compiled_workout = CompiledWorkoutModel(workout_model)
+        workout_rows = sample_inputs(compiled_workout.preprocessor, n_samples=512)
+        print("Workout parity:", verify_parity(workout_model, compiled_workout, workout_rows))
+    except Exception as e:
+        raise PersonalizedCoachException(e,sys)
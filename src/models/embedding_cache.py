@@ -0,0 +1,91 @@
+from src.exception.exception import PersonalizedCoachException
+from src.custom_logging.logger import logging
+from src.contants import *
+from collections import OrderedDict
+import sys
+import threading
+import numpy as np
+
+class EmbeddingCache:
+    """
+    Bounded LRU cache of query embeddings keyed by normalized query text:
+    - normalization is case folding + whitespace collapsing, which does not change
+      what an uncased embedder (all-MiniLM-L6-v2) sees
+    - stores read-only float32 rows, so memory is at most max_size * dim * 4 bytes
+    - hit/miss/eviction counters are exposed through stats()
+    """
+    def __init__(self, max_size:int=EMBEDDING_CACHE_MAX_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict() # normalized text -> embedding row
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(text:str) -> str:
+        return " ".join(str(text).casefold().split())
+
+    def get_many(self, keys:list) -> list:
+        """
+        Cached embedding per key, None for misses.
+        """
+        found = []
+        with self._lock:
+            for key in keys:
+                row = self._entries.get(key)
+                if row is None:
+                    self.misses += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                found.append(row)
+        return found
+
+    def put_many(self, keys:list, embeddings:np.ndarray):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            for key, row in zip(keys, embeddings):
+                row = np.array(row, dtype=np.float32)
+                row.setflags(write=False)
+                self._entries[key] = row
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions
+            }
+
+def cached_encode(cache:EmbeddingCache, encode_fn, queries:list) -> np.ndarray:
+    """
+    Embed queries through the cache: every distinct missing text is encoded once,
+    in a single encode_fn call.
+    """
+    try:
+        keys = [cache.normalize(query) for query in queries]
+        rows = cache.get_many(keys)
+        missing = list(dict.fromkeys(key for key, row in zip(keys, rows) if row is None))
+        if missing:
+            encoded = np.asarray(encode_fn(missing), dtype=np.float32)
+            cache.put_many(missing, encoded)
+            fresh = dict(zip(missing, encoded))
+            rows = [fresh[key] if row is None else row for key, row in zip(keys, rows)]
+        return np.vstack(rows)
+    except Exception as e:
+        logging.info(f"Error while encoding queries through the embedding cache: {e}")
+        raise PersonalizedCoachException(e,sys)
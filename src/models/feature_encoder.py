@@ -0,0 +1,107 @@
+from src.exception.exception import PersonalizedCoachException
+from src.custom_logging.logger import logging
+import sys
+import numpy as np
+import pandas as pd
+
+class FeatureEncoder:
+    """
+    DataFrame-free replacement for the fitted ColumnTransformer on the request path:
+    - reads OneHotEncoder categories and StandardScaler mean/scale from the fitted preprocessor
+    - writes one request (dict or Pydantic model) straight into a float32 row
+    - rows with missing numeric values go through the sklearn preprocessor (KNN imputation)
+    """
+    def __init__(self, preprocessor):
+        try:
+            self.preprocessor = preprocessor
+            self.categorical = [] # (column, {category: output index})
+            self.numerical = []   # (column, output index, mean, scale)
+            self.input_columns = []
+
+            offset = 0
+            for name, transformer, columns in preprocessor.transformers_:
+                if name == 'remainder' or transformer == 'drop':
+                    continue
+                if name == 'cat':
+                    if transformer.drop is not None or transformer.min_frequency is not None or transformer.max_categories is not None:
+                        raise ValueError("OneHotEncoder with drop/infrequent categories is not supported")
+                    for col, categories in zip(columns, transformer.categories_):
+                        self.categorical.append((col, {cat: offset + i for i, cat in enumerate(categories)}))
+                        offset += len(categories)
+                elif name == 'num':
+                    scaler = transformer.named_steps['scaler']
+                    means = scaler.mean_ if scaler.mean_ is not None else np.zeros(len(columns))
+                    scales = scaler.scale_ if scaler.scale_ is not None else np.ones(len(columns))
+                    for col, mean, scale in zip(columns, means, scales):
+                        self.numerical.append((col, offset, float(mean), float(scale)))
+                        offset += 1
+                else:
+                    raise ValueError(f"Unsupported transformer in preprocessor: {name}")
+                self.input_columns.extend(columns)
+
+            self.n_features = offset
+        except Exception as e:
+            logging.info(f"Error while building FeatureEncoder: {e}")
+            raise PersonalizedCoachException(e,sys)
+
+    def _as_dict(self, record):
+        if isinstance(record, dict):
+            return record
+        # Pydantic models
+        return record.model_dump() if hasattr(record, 'model_dump') else record.dict()
+
+    def _fill_row(self, row, record):
+        """
+        Write one record into a zeroed row. Returns False if a numeric value is missing.
+        """
+        for col, index in self.categorical:
+            position = index.get(record[col])
+            if position is not None: # unknown categories stay all-zero (handle_unknown='ignore')
+                row[position] = 1.0
+        for col, position, mean, scale in self.numerical:
+            value = record[col]
+            if value is None or value != value:
+                return False
+            row[position] = (float(value) - mean) / scale
+        return True
+
+    def encode(self, record, out=None):
+        """
+        Encode a single record into a (1, n_features) float32 array.
+        `out` may be a preallocated row that is overwritten in place.
+        """
+        return self.encode_many([record], out=out)
+
+    def encode_many(self, records, out=None):
+        """
+        Encode a list of records into a (n_records, n_features) float32 block.
+        """
+        try:
+            records = [self._as_dict(record) for record in records]
+            if out is None:
+                out = np.zeros((len(records), self.n_features), dtype=np.float32)
+            else:
+                out[:] = 0.0
+
+            missing = []
+            for i, record in enumerate(records):
+                if not self._fill_row(out[i], record):
+                    missing.append(i)
+
+            if missing:
+                # same imputation as training for rows with missing numerics
+                frame = pd.DataFrame([records[i] for i in missing], columns=self.input_columns)
+                out[missing] = self.preprocessor.transform(frame)
+            return out
+        except Exception as e:
+            logging.info(f"Error while encoding features: {e}")
+            raise PersonalizedCoachException(e,sys)
+
+    def check_parity(self, user_data:pd.DataFrame):
+        """
+        Compare the native encoding with the sklearn preprocessor on the same rows.
+        Returns True if both give identical float32 features.
+        """
+        reference = np.asarray(self.preprocessor.transform(user_data), dtype=np.float32)
+        native = self.encode_many(user_data.to_dict('records'))
+        return bool(np.array_equal(reference, native))
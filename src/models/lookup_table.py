@@ -0,0 +1,190 @@
+from src.exception.exception import PersonalizedCoachException
+from src.custom_logging.logger import logging
+from src.contants import *
+from src.models.feature_encoder import FeatureEncoder
+import os
+import sys
+import json
+import math
+import hashlib
+import numpy as np
+
+def artifact_fingerprint(filepath:str, block_size:int=1 << 20) -> str:
+    """
+    sha256 of a model artifact file, ties a lookup table to the model that produced it.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class PredictionLookupTable:
+    """
+    Precomputed predictions over the full bounded input space:
+    - one axis per categorical feature (OneHotEncoder categories)
+    - one axis per numeric feature, sampled on a regular grid (inputs snap to the nearest grid point)
+    - every model output stored as a flat array indexed by the grid position
+    Inputs outside the grid (unknown category, out-of-range or missing numeric) are misses
+    and must be answered by the live model.
+    model_fingerprint: artifact_fingerprint of the saved model the table was built from.
+    """
+    def __init__(self, categories, numeric_grid, outputs, report=None, model_fingerprint=None):
+        self.categories = categories     # [(column, [values...])]
+        self.numeric_grid = numeric_grid # [(column, start, step, n_points)]
+        self.outputs = outputs           # [np.ndarray of shape (grid_size, ...)]
+        self.report = report or {}
+        self.model_fingerprint = model_fingerprint
+        self._category_index = [
+            (col, {value: code for code, value in enumerate(values)}, len(values))
+            for col, values in categories
+        ]
+        self.shape = tuple(len(values) for _, values in categories) + tuple(n for *_, n in numeric_grid)
+
+    @classmethod
+    def build(cls, model, numeric_ranges:dict, chunk_size:int=65536, model_fingerprint:str=None):
+        """
+        Score every grid point with the model.
+        numeric_ranges: {column: (min, max, step)} for each numeric feature.
+        model_fingerprint: artifact_fingerprint of the saved model file.
+        """
+        try:
+            encoder = FeatureEncoder(model.preprocessor)
+            categories = [(col, list(index.keys())) for col, index in encoder.categorical]
+            cat_positions = [np.fromiter(index.values(), dtype=np.intp) for _, index in encoder.categorical]
+
+            numeric_grid, numeric_axes = [], []
+            for col, position, mean, scale in encoder.numerical:
+                low, high, step = numeric_ranges[col]
+                # anchor the grid on multiples of step so round inputs land exactly on grid points
+                low = math.floor(low / step + 1e-9) * step
+                high = math.ceil(high / step - 1e-9) * step
+                n_points = int(math.floor((high - low) / step + 0.5)) + 1
+                numeric_grid.append((col, float(low), float(step), n_points))
+                grid_values = np.round(low + np.arange(n_points) * step, 10)
+                numeric_axes.append((position, ((grid_values - mean) / scale).astype(np.float32)))
+
+            shape = tuple(len(values) for _, values in categories) + tuple(n for *_, n in numeric_grid)
+            grid_size = int(np.prod(shape))
+            logging.info(f"Building prediction lookup table with {grid_size} grid points, shape {shape}")
+
+            outputs = None
+            for start in range(0, grid_size, chunk_size):
+                flat = np.arange(start, min(start + chunk_size, grid_size))
+                coords = np.unravel_index(flat, shape)
+                rows = np.arange(len(flat))
+
+                X = np.zeros((len(flat), encoder.n_features), dtype=np.float32)
+                for axis, positions in enumerate(cat_positions):
+                    X[rows, positions[coords[axis]]] = 1.0
+                for offset, (position, scaled) in enumerate(numeric_axes):
+                    X[:, position] = scaled[coords[len(cat_positions) + offset]]
+
+                preds = model.predict_encoded(X)
+                if outputs is None:
+                    # labels as int32, numeric outputs as float32
+                    outputs = [
+                        np.empty((grid_size,) + np.shape(pred)[1:], dtype=np.int32 if np.issubdtype(np.asarray(pred).dtype, np.integer) else np.float32)
+                        for pred in preds
+                    ]
+                for output, pred in zip(outputs, preds):
+                    output[flat] = pred
+
+            return cls(categories, numeric_grid, outputs, model_fingerprint=model_fingerprint)
+        except Exception as e:
+            logging.info(f"Error while building prediction lookup table: {e}")
+            raise PersonalizedCoachException(e,sys)
+
+    def index_of(self, record:dict) -> int:
+        """
+        Flat grid index of a raw input record, or -1 if it is outside the table.
+        """
+        flat = 0
+        for col, index, size in self._category_index:
+            code = index.get(record.get(col))
+            if code is None:
+                return -1
+            flat = flat * size + code
+        for col, start, step, n_points in self.numeric_grid:
+            value = record.get(col)
+            if value is None or value != value:
+                return -1
+            position = int(math.floor((float(value) - start) / step + 0.5))
+            if position < 0 or position >= n_points:
+                return -1
+            flat = flat * n_points + position
+        return flat
+
+    def lookup(self, records:list) -> np.ndarray:
+        """
+        Grid indices for a list of records (-1 marks a miss).
+        """
+        return np.fromiter((self.index_of(record) for record in records), dtype=np.int64, count=len(records))
+
+    def outputs_at(self, indices):
+        """
+        Stored predictions for the given grid indices, as a tuple shaped like model.predict_encoded.
+        Numeric outputs are returned as float64 like the live model.
+        """
+        return tuple(
+            output[indices].astype(np.float64) if output.dtype == np.float32 else output[indices]
+            for output in self.outputs
+        )
+
+    def sample_records(self, n_samples:int=2000, random_state=RANDOM_STATE) -> list:
+        """
+        Uniform random records inside the table's range (not snapped to the grid).
+        """
+        rng = np.random.default_rng(random_state)
+        columns = {col: rng.choice(np.array(values, dtype=object), size=n_samples) for col, values in self.categories}
+        for col, start, step, n_points in self.numeric_grid:
+            columns[col] = rng.uniform(start - step / 2, start + (n_points - 0.5) * step, size=n_samples)
+            columns[col] = np.clip(columns[col], start - step / 2, start + (n_points - 0.5) * step - 1e-9)
+        return [{col: values[i] for col, values in columns.items()} for i in range(n_samples)]
+
+    def evaluate(self, model, output_names:list, n_samples:int=2000) -> dict:
+        """
+        Compare table answers against the live model on random in-range inputs.
+        Label outputs report their mismatch rate, numeric outputs their max absolute deviation.
+        """
+        try:
+            records = self.sample_records(n_samples)
+            encoder = FeatureEncoder(model.preprocessor)
+            live = model.predict_encoded(encoder.encode_many(records))
+            table = self.outputs_at(self.lookup(records))
+
+            report = {"n_samples": n_samples}
+            for name, live_values, table_values in zip(output_names, live, table):
+                live_values = np.asarray(live_values)
+                if np.issubdtype(live_values.dtype, np.integer):
+                    report[f"{name}_mismatch_rate"] = float(np.mean(live_values != table_values))
+                else:
+                    report[f"{name}_max_abs_deviation"] = float(np.max(np.abs(live_values - table_values)))
+            self.report = report
+            return report
+        except Exception as e:
+            logging.info(f"Error while evaluating prediction lookup table: {e}")
+            raise PersonalizedCoachException(e,sys)
+
+    def save(self, filepath):
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        meta = {
+            "categories": [[col, np.asarray(values).tolist()] for col, values in self.categories],
+            "numeric_grid": [list(axis) for axis in self.numeric_grid],
+            "report": self.report,
+            "model_fingerprint": self.model_fingerprint
+        }
+        arrays = {f"output_{i}": output for i, output in enumerate(self.outputs)}
+        np.savez_compressed(filepath, meta=np.array(json.dumps(meta)), **arrays)
+        logging.info(f"Prediction lookup table saved at: {filepath}")
+
+    @classmethod
+    def load(cls, filepath):
+        logging.info(f"Loading prediction lookup table from: {filepath}")
+        with np.load(filepath, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            n_outputs = len([key for key in data.files if key.startswith("output_")])
+            outputs = [data[f"output_{i}"] for i in range(n_outputs)]
+        categories = [(col, values) for col, values in meta["categories"]]
+        numeric_grid = [tuple(axis) for axis in meta["numeric_grid"]]
+        return cls(categories, numeric_grid, outputs, report=meta["report"], model_fingerprint=meta.get("model_fingerprint"))
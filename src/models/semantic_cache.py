@@ -0,0 +1,191 @@
+from src.exception.exception import PersonalizedCoachException
+from src.custom_logging.logger import logging
+from src.contants import *
+from src.models.vector_index import l2_normalize
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import asyncio
+import sys
+import threading
+import time
+import numpy as np
+
+class SemanticAnswerCache:
+    """
+    Cache of generated (RAG) answers looked up by query meaning, not exact text:
+    - a new query reuses a stored answer if its embedding has cosine similarity
+      >= min_similarity with a cached query (the retrieval embedding is reused)
+    - entries live in a fixed (max_size, dim) matrix; once full the least recently
+      used slot is overwritten, and entries older than ttl_seconds are ignored/reclaimed
+    - identical concurrent misses are coalesced: one generation runs, the others wait for it
+      up to wait_timeout_seconds, then generate on their own (a hung leader blocks nobody else)
+    """
+    def __init__(self, max_size:int=SEMANTIC_CACHE_MAX_SIZE, ttl_seconds:float=SEMANTIC_CACHE_TTL_SECONDS,
+                 min_similarity:float=SEMANTIC_CACHE_MIN_SIMILARITY, clock=time.monotonic,
+                 wait_timeout_seconds:float=SEMANTIC_CACHE_WAIT_TIMEOUT_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.min_similarity = min_similarity
+        self.clock = clock
+        self.wait_timeout_seconds = wait_timeout_seconds
+
+        self._matrix = None # (max_size, dim) normalized query embeddings, allocated on first put
+        self._answers = [None] * max_size
+        self._created = np.full(max_size, -np.inf)
+        self._last_used = np.full(max_size, -np.inf)
+        self._lock = threading.Lock()
+        self._in_flight = {} # normalized query -> Future
+        self._async_in_flight = {} # normalized query -> asyncio.Future (event loop thread only)
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.wait_timeouts = 0
+        self.evictions = 0
+
+    def _live(self, now):
+        return self._created > now - self.ttl_seconds
+
+    def get(self, embedding):
+        """
+        Cached answer for the closest live query above min_similarity, or None.
+        """
+        query = l2_normalize(embedding)[0]
+        with self._lock:
+            if self._matrix is not None:
+                now = self.clock()
+                sims = self._matrix @ query
+                sims[~self._live(now)] = -np.inf
+                best = int(np.argmax(sims))
+                if sims[best] >= self.min_similarity:
+                    self._last_used[best] = now
+                    self.hits += 1
+                    return self._answers[best]
+            self.misses += 1
+            return None
+
+    def put(self, embedding, answer):
+        if self.max_size <= 0:
+            return
+        query = l2_normalize(embedding)[0]
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_size, query.shape[0]), dtype=np.float32)
+            now = self.clock()
+            free = np.flatnonzero(~self._live(now))
+            if len(free):
+                slot = int(free[0])
+            else:
+                slot = int(np.argmin(self._last_used))
+                self.evictions += 1
+            self._matrix[slot] = query
+            self._answers[slot] = answer
+            self._created[slot] = now
+            self._last_used[slot] = now
+
+    def get_or_generate(self, key:str, embedding, generate_fn):
+        """
+        Serve a semantically cached answer, or run generate_fn once per key even under
+        concurrent requests. Failed generations are not cached and re-raise in every waiter.
+        Returns (answer, cached).
+        """
+        try:
+            answer = self.get(embedding)
+            if answer is not None:
+                return answer, True
+
+            with self._lock:
+                future = self._in_flight.get(key)
+                leader = future is None
+                if leader:
+                    future = Future()
+                    self._in_flight[key] = future
+                else:
+                    self.coalesced += 1
+            if not leader:
+                try:
+                    return future.result(timeout=self.wait_timeout_seconds), True
+                except FutureTimeoutError:
+                    with self._lock:
+                        self.wait_timeouts += 1
+                    logging.warning(f"Waited {self.wait_timeout_seconds}s for a coalesced answer, generating independently.")
+                    answer = generate_fn()
+                    self.put(embedding, answer)
+                    return answer, False
+
+            try:
+                answer = generate_fn()
+                self.put(embedding, answer)
+                future.set_result(answer)
+                return answer, False
+            except Exception as e:
+                future.set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    self._in_flight.pop(key, None)
+        except Exception as e:
+            logging.info(f"Error in semantic answer cache: {e}")
+            raise PersonalizedCoachException(e,sys)
+
+    async def aget_or_generate(self, key:str, embedding, agenerate_fn):
+        """
+        Async variant of get_or_generate(): agenerate_fn() returns an awaitable, and
+        followers await the leader's future instead of blocking a thread.
+        """
+        try:
+            answer = self.get(embedding)
+            if answer is not None:
+                return answer, True
+
+            future = self._async_in_flight.get(key)
+            if future is not None:
+                with self._lock:
+                    self.coalesced += 1
+                try:
+                    return await asyncio.wait_for(asyncio.shield(future), self.wait_timeout_seconds), True
+                except asyncio.TimeoutError:
+                    with self._lock:
+                        self.wait_timeouts += 1
+                    logging.warning(f"Waited {self.wait_timeout_seconds}s for a coalesced answer, generating independently.")
+                    answer = await agenerate_fn()
+                    self.put(embedding, answer)
+                    return answer, False
+
+            future = asyncio.get_running_loop().create_future()
+            self._async_in_flight[key] = future
+            try:
+                answer = await agenerate_fn()
+                self.put(embedding, answer)
+                future.set_result(answer)
+                return answer, False
+            except BaseException as e:
+                future.set_exception(e if isinstance(e, Exception) else RuntimeError("Generation cancelled"))
+                future.exception() # waiters re-raise it; avoid 'never retrieved' warnings
+                raise
+            finally:
+                self._async_in_flight.pop(key, None)
+        except Exception as e:
+            logging.info(f"Error in semantic answer cache: {e}")
+            raise PersonalizedCoachException(e,sys)
+
+    def clear(self):
+        with self._lock:
+            self._created[:] = -np.inf
+            self._last_used[:] = -np.inf
+            self._answers = [None] * self.max_size
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": int(np.count_nonzero(self._live(self.clock()))),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "min_similarity": self.min_similarity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "coalesced": self.coalesced,
+                "wait_timeouts": self.wait_timeouts,
+                "evictions": self.evictions,
+                "in_flight": len(self._in_flight) + len(self._async_in_flight)
+            }
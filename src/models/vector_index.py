@@ -0,0 +1,202 @@
+from src.exception.exception import PersonalizedCoachException
+from src.custom_logging.logger import logging
+from src.contants import *
+import sys
+import numpy as np
+from scipy.sparse import csr_matrix
+
+def l2_normalize(vectors) -> np.ndarray:
+    """
+    Row-wise L2 normalisation to float32 (zero rows stay zero).
+    """
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    return vectors / norms
+
+def top_k(scores:np.ndarray, k:int):
+    """
+    Indices and values of the k largest scores per row, best first.
+    """
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+class ExactCosineIndex:
+    """
+    Exact cosine top-k search over a single L2-normalized float32 matrix:
+    - one matmul scores every entry for every query in the batch
+    - argpartition selects the top-k without a full sort
+    """
+    def __init__(self, embeddings=None):
+        self.matrix = None
+        if embeddings is not None:
+            self.fit(embeddings)
+
+    def fit(self, embeddings):
+        self.matrix = l2_normalize(embeddings)
+        return self
+
+    def __len__(self):
+        return 0 if self.matrix is None else self.matrix.shape[0]
+
+    def search(self, queries, k:int=3, n_probe:int=None):
+        """
+        queries: one vector or a (n_queries, dim) batch.
+        Returns (indices, similarities), both shaped (n_queries, k).
+        n_probe is accepted for interface parity with IVFCosineIndex and ignored.
+        """
+        try:
+            if self.matrix is None:
+                raise RuntimeError("Index is empty. Call fit() first.")
+            scores = l2_normalize(queries) @ self.matrix.T
+            return top_k(scores, k)
+        except Exception as e:
+            logging.info(f"Error while searching the exact cosine index: {e}")
+            raise PersonalizedCoachException(e,sys)
+
+    def original_matrix(self) -> np.ndarray:
+        """
+        Normalized embeddings in corpus order (what gets saved as faq_embeddings.npy).
+        """
+        return self.matrix
+
+class IVFCosineIndex:
+    """
+    Approximate cosine top-k search with an inverted-file (IVF) index, pure NumPy:
+    - spherical k-means splits the normalized corpus into n_lists clusters
+    - vectors are stored grouped by cluster, so every list is one contiguous slice
+    - a query scores the centroids, then only the n_probe closest lists
+    n_probe is the recall/latency knob and can be changed per query.
+    """
+    def __init__(self, n_lists:int=None, n_probe:int=IVF_DEFAULT_N_PROBE, n_iter:int=20,
+                 sample_per_list:int=128, random_state:int=RANDOM_STATE):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.sample_per_list = sample_per_list
+        self.random_state = random_state
+        self.centroids = None
+        self.matrix = None  # normalized vectors grouped by list
+        self.order = None   # corpus id of every row of matrix
+        self.offsets = None # list l owns rows offsets[l]:offsets[l+1]
+
+    def __len__(self):
+        return 0 if self.matrix is None else self.matrix.shape[0]
+
+    def _assign(self, vectors, chunk_size=65536):
+        assignments = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], chunk_size):
+            chunk = vectors[start:start + chunk_size]
+            assignments[start:start + chunk_size] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return assignments
+
+    def _train_centroids(self, vectors, rng):
+        n_samples = min(vectors.shape[0], self.n_lists * self.sample_per_list)
+        sample = vectors[rng.choice(vectors.shape[0], size=n_samples, replace=False)]
+        self.centroids = sample[rng.choice(n_samples, size=self.n_lists, replace=False)].copy()
+        for _ in range(self.n_iter):
+            assignments = np.argmax(sample @ self.centroids.T, axis=1)
+            # per-cluster sums via a sparse one-hot matmul (no copy of the sample)
+            one_hot = csr_matrix(
+                (np.ones(n_samples, dtype=np.float32), (assignments, np.arange(n_samples))),
+                shape=(self.n_lists, n_samples)
+            )
+            sums = np.asarray(one_hot @ sample)
+            empty = np.flatnonzero(np.bincount(assignments, minlength=self.n_lists) == 0)
+            sums[empty] = sample[rng.choice(n_samples, size=len(empty))]
+            self.centroids = l2_normalize(sums)
+
+    def fit(self, embeddings):
+        try:
+            vectors = l2_normalize(embeddings)
+            if self.n_lists is None:
+                self.n_lists = max(1, int(4 * np.sqrt(vectors.shape[0])))
+            self.n_lists = min(self.n_lists, vectors.shape[0])
+            logging.info(f"Training IVF index with {self.n_lists} lists on {vectors.shape[0]} vectors")
+
+            self._train_centroids(vectors, np.random.default_rng(self.random_state))
+            self._build_lists(vectors, self._assign(vectors))
+            return self
+        except Exception as e:
+            logging.info(f"Error while fitting the IVF index: {e}")
+            raise PersonalizedCoachException(e,sys)
+
+    def _build_lists(self, vectors, assignments):
+        self.order = np.argsort(assignments, kind='stable')
+        self.matrix = vectors[self.order]
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=self.n_lists))))
+
+    def search(self, queries, k:int=3, n_probe:int=None):
+        """
+        queries: one vector or a (n_queries, dim) batch.
+        Returns (indices, similarities), both shaped (n_queries, k); missing hits are -1 / -inf.
+        """
+        try:
+            if self.matrix is None:
+                raise RuntimeError("Index is empty. Call fit() first.")
+            queries = l2_normalize(queries)
+            n_probe = min(n_probe or self.n_probe, self.n_lists)
+            probe_lists, _ = top_k(queries @ self.centroids.T, n_probe)
+
+            indices = np.full((queries.shape[0], k), -1, dtype=np.int64)
+            similarities = np.full((queries.shape[0], k), -np.inf, dtype=np.float32)
+            for qi, lists in enumerate(probe_lists):
+                rows = [np.arange(self.offsets[l], self.offsets[l + 1]) for l in lists]
+                scores = [self.matrix[self.offsets[l]:self.offsets[l + 1]] @ queries[qi] for l in lists]
+                rows, scores = np.concatenate(rows), np.concatenate(scores)
+                if len(rows) == 0:
+                    continue
+                best, best_scores = top_k(scores[np.newaxis, :], k)
+                indices[qi, :best.shape[1]] = self.order[rows[best[0]]]
+                similarities[qi, :best.shape[1]] = best_scores[0]
+            return indices, similarities
+        except Exception as e:
+            logging.info(f"Error while searching the IVF index: {e}")
+            raise PersonalizedCoachException(e,sys)
+
+    def original_matrix(self) -> np.ndarray:
+        """
+        Normalized embeddings in corpus order (what gets saved as faq_embeddings.npy).
+        """
+        inverse = np.empty_like(self.order)
+        inverse[self.order] = np.arange(len(self.order))
+        return self.matrix[inverse]
+
+    def save(self, filepath):
+        """
+        Save the index structure only; vectors live in faq_embeddings.npy.
+        """
+        np.savez(filepath, centroids=self.centroids, order=self.order, offsets=self.offsets,
+                 n_probe=np.array(self.n_probe))
+
+    @classmethod
+    def load(cls, filepath, embeddings):
+        with np.load(filepath, allow_pickle=False) as data:
+            index = cls(n_lists=data["centroids"].shape[0], n_probe=int(data["n_probe"]))
+            index.centroids = data["centroids"]
+            index.order = data["order"]
+            index.offsets = data["offsets"]
+        index.matrix = l2_normalize(embeddings)[index.order]
+        return index
+
+def build_index(embeddings, index_type:str=RETRIEVER_INDEX_TYPE, n_lists:int=None, n_probe:int=IVF_DEFAULT_N_PROBE):
+    """
+    Build the retrieval index for a corpus:
+    - "exact": ExactCosineIndex
+    - "ivf": IVFCosineIndex
+    - "auto": ivf once the corpus has ANN_MIN_CORPUS_SIZE entries, exact below that
+    """
+    n_vectors = np.atleast_2d(embeddings).shape[0]
+    if index_type == "auto":
+        index_type = "ivf" if n_vectors >= ANN_MIN_CORPUS_SIZE else "exact"
+    if index_type == "exact":
+        return ExactCosineIndex(embeddings)
+    if index_type == "ivf":
+        return IVFCosineIndex(n_lists=n_lists, n_probe=n_probe).fit(embeddings)
+    raise ValueError(f"Unknown retriever index type: {index_type}")
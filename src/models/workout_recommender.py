@@ -15,6 +15,7 @@ class WorkoutRecommender:
     - workout_pipeline: classifier that predicts the workout
     - duration_pipeline: regressor for predicting the duration of workout
     Both pipelines include a ColumnTransformer with numeric imputer + scaler and categorical features.
+    The ColumnTransformer instance is shared and fitted once for both estimators.
     """
     
     def __init__(self, categorical_features=None, numeric_features=None, random_state=42):
@@ -22,7 +23,7 @@ class WorkoutRecommender:
         self.numeric_features = numeric_features or ['age', 'bmi']
         self.random_state = random_state
         
-        preprocessor = ColumnTransformer(
+        self.preprocessor = ColumnTransformer(
             transformers=[
                 ('cat',OneHotEncoder(handle_unknown='ignore',sparse_output=False),self.categorical_features),
                 ('num',Pipeline(steps=[
@@ -35,22 +36,24 @@ class WorkoutRecommender:
         
         self.workout_pipeline = Pipeline(
             steps=[
-                ('preprocessor',preprocessor),
+                ('preprocessor',self.preprocessor),
                 ('classifier', RandomForestClassifier(n_estimators=200,random_state=self.random_state))
             ]
         )
         
         self.duration_pipeline = Pipeline(
             steps=[
-                ('preprocessor',preprocessor),
+                ('preprocessor',self.preprocessor),
                 ('regressor', RandomForestRegressor(n_estimators=200, random_state=self.random_state))
             ]
         )
         
     def fit(self, X, y_workout, y_duration):
         try:
-            self.workout_pipeline.fit(X,y_workout)
-            self.duration_pipeline.fit(X, y_duration)
+            # fit the shared preprocessor once and train both estimators on the same matrix
+            X_encoded = self.preprocessor.fit_transform(X)
+            self.workout_pipeline.named_steps['classifier'].fit(X_encoded, y_workout)
+            self.duration_pipeline.named_steps['regressor'].fit(X_encoded, y_duration)
         except PersonalizedCoachException as e:
             logging.info(f"Erro while fitting the data: {e}")
             raise PersonalizedCoachException(e,sys)
@@ -98,4 +101,85 @@ class WorkoutModel:
     @classmethod
     def load(cls, filepath):
         logging.info(f"Loading Workout Model from: {filepath}")
-        return joblib.load(filepath)
\ No newline at end of file
+        return joblib.load(filepath)
+
+
+class FusedWorkoutModel:
+    """
+    Combined Workout Model sharing one fitted preprocessor between the workout
+    classifier and the duration regressor, so every request is transformed only once.
+    Legacy WorkoutModel artifacts are converted on load.
+    """
+    def __init__(self, preprocessor, workout_estimator, duration_estimator):
+        self.preprocessor = preprocessor
+        self.workout_estimator = workout_estimator
+        self.duration_estimator = duration_estimator
+
+    @classmethod
+    def from_recommender(cls, recommender:WorkoutRecommender):
+        return cls(
+            preprocessor=recommender.preprocessor,
+            workout_estimator=recommender.workout_pipeline.named_steps['classifier'],
+            duration_estimator=recommender.duration_pipeline.named_steps['regressor']
+        )
+
+    @classmethod
+    def from_model(cls, model):
+        """
+        Convert a WorkoutModel (two full pipelines) into a FusedWorkoutModel.
+        """
+        if isinstance(model, cls):
+            return model
+        workout_preprocessor = model.workout_model.named_steps['preprocessor']
+        if workout_preprocessor is not model.duration_model.named_steps['preprocessor']:
+            logging.warning("WorkoutModel pipelines hold separate preprocessors; using the workout pipeline's one.")
+        return cls(
+            preprocessor=workout_preprocessor,
+            workout_estimator=model.workout_model.named_steps['classifier'],
+            duration_estimator=model.duration_model.named_steps['regressor']
+        )
+
+    def transform(self, user_data):
+        return self.preprocessor.transform(user_data)
+
+    def predict_encoded(self, X):
+        """
+        Predict from an already preprocessed matrix.
+        Returns (workout, duration) arrays.
+        """
+        return self.workout_estimator.predict(X), self.duration_estimator.predict(X)
+
+    def to_records(self, workout, duration):
+        """
+        Turn prediction arrays into one result dict per row.
+        """
+        results = []
+        for i in range(len(workout)):
+            results.append({
+                "workout":workout[i],
+                "duration":duration[i]
+            })
+        return results
+
+    def predict_records(self, X):
+        """
+        Predict from an already preprocessed matrix, one result dict per row.
+        """
+        return self.to_records(*self.predict_encoded(X))
+
+    def predict(self, user_data):
+        return self.predict_records(self.transform(user_data))
+
+    def save(self, filepath):
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        joblib.dump(self, filepath)
+        logging.info(f"Fused WorkoutModel saved at:{filepath}")
+
+    @classmethod
+    def load(cls, filepath):
+        logging.info(f"Loading Workout Model from: {filepath}")
+        model = joblib.load(filepath)
+        if isinstance(model, WorkoutModel):
+            logging.info("Converting legacy WorkoutModel artifact to FusedWorkoutModel.")
+            model = cls.from_model(model)
+        return model
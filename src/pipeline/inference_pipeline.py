@@ -3,10 +3,32 @@ from src.custom_logging.logger import logging
 from src.contants import *
 import os,sys
 import joblib
+from typing import NamedTuple
+import numpy as np
 import pandas as pd
 from src.models.chatbot_retriver import ChatRetriever, Generative_Chatbot, Hybrid_Chatbot
-from src.models.Nutrition_recommender import NutrientModel
-from src.models.workout_recommender import WorkoutModel
+from src.models.semantic_cache import SemanticAnswerCache
+from src.models.Nutrition_recommender import FusedNutrientModel
+from src.models.workout_recommender import FusedWorkoutModel
+from src.models.compiled_forest import CompiledNutrientModel, CompiledWorkoutModel, sample_inputs, verify_parity
+from src.models.feature_encoder import FeatureEncoder
+from src.models.lookup_table import PredictionLookupTable, artifact_fingerprint
+from src.pipeline.recommendation_cache import RecommendationCache
+from src.etl.transform import Transformer
+
+class RecommenderArtifacts(NamedTuple):
+    """
+    Everything one recommendation is scored with. Immutable and replaced as a whole on reload,
+    so a request that captured it never mixes old and new artifacts.
+    """
+    nutrition_model: object
+    meal_encoder: object
+    nutrition_features: object
+    nutrition_lookup: object
+    workout_model: object
+    workout_encoder: object
+    workout_features: object
+    workout_lookup: object
 
 class InferencePipeline:
     '''
@@ -14,69 +36,318 @@ class InferencePipeline:
     - Nutrition Recommender
     - Workout Recommender
     - Hybrid Chatbot
+    engine: "sklearn" serves the saved pipelines directly,
+            "compiled" serves flat-array forests (see src/models/compiled_forest.py)
+    lookup: answer in-range requests from the precomputed prediction lookup tables,
+            falling back to the model for everything else
+    cache: RecommendationCache in front of recommend_* (built from RESULT_CACHE_* settings by default)
     '''
-    def __init__(self):
+    def __init__(self, engine:str=None, lookup:bool=None, cache:RecommendationCache=None):
         try:
             logging.info("Initilizing inference pipeline...")
+            self.engine = engine or os.getenv("INFERENCE_ENGINE", INFERENCE_ENGINE)
+            if self.engine not in ("sklearn", "compiled"):
+                raise ValueError(f"Unknown inference engine: {self.engine}")
+            if lookup is None:
+                lookup = os.getenv("INFERENCE_LOOKUP", str(INFERENCE_LOOKUP)).lower() in ("1", "true", "yes")
+            self.use_lookup = lookup
             
-            # Load Nutrition Model
-            self.nutrition_model_path = os.path.join(NUTRITION_OUT,"nutrition_combined_model.joblib")
-            self.nutrition_label_path = os.path.join(NUTRITION_OUT,"meal_label_encoder.joblib")
-            
-            self.nutrition_model = NutrientModel.load(self.nutrition_model_path)
-            self.meal_encoder = joblib.load(self.nutrition_label_path)
-            
-            logging.info("Loaded Nutrition Recommender Model successfully...")
-            
-            # Load workout model
-            self.workout_model_path = os.path.join(WORKOUT_OUT, "workout_combined_model.joblib")
-            self.workout_label_path = os.path.join(WORKOUT_OUT, "workout_le.joblib")
+            # request normalization, applied before cache lookup and scoring alike
+            self.transformer = Transformer()
+            self.bmi_precision = int(os.getenv("INPUT_BMI_PRECISION", INPUT_BMI_PRECISION))
             
-            self.workout_model = WorkoutModel.load(self.workout_model_path)
-            self.workout_encoder = joblib.load(self.workout_label_path)
+            # Load Nutrition + Workout models
+            self.load_recommenders()
             
-            logging.info("Loaded Workout Recommender Model successfully...")
+            # Result cache in front of the recommenders (max size 0 disables it)
+            self.cache = cache if cache is not None else self.build_result_cache()
             
             # Load Hybrid Chatbot (Retriever + Generative)
             retriever = ChatRetriever().load(CHATBOT_OUT)
             generator = Generative_Chatbot(model_name="google/gemma-2-2b-it")
-            self.chatbot = Hybrid_Chatbot(retriever=retriever, generator=generator)
+            self.chatbot = Hybrid_Chatbot(retriever=retriever, generator=generator, answer_cache=self.build_answer_cache())
             
             logging.info("Hybrid Chatbot Initialized successfully...")
-        except PersonalizedCoachException as e:
+        except Exception as e:
             logging.info(f"Error while initializing Inference Pipeline: {e}")
             raise PersonalizedCoachException(e,sys)
         
+    def load_recommenders(self):
+        """
+        (Re)load the nutrition and workout models with their encoders and lookup tables.
+        """
+        # Load Nutrition Model
+        self.nutrition_model_path = os.path.join(NUTRITION_OUT,"nutrition_combined_model.joblib")
+        self.nutrition_label_path = os.path.join(NUTRITION_OUT,"meal_label_encoder.joblib")
+        
+        nutrition_model = FusedNutrientModel.load(self.nutrition_model_path)
+        meal_encoder = joblib.load(self.nutrition_label_path)
+        
+        logging.info("Loaded Nutrition Recommender Model successfully...")
+        
+        # Load workout model
+        self.workout_model_path = os.path.join(WORKOUT_OUT, "workout_combined_model.joblib")
+        self.workout_label_path = os.path.join(WORKOUT_OUT, "workout_le.joblib")
+        
+        workout_model = FusedWorkoutModel.load(self.workout_model_path)
+        workout_encoder = joblib.load(self.workout_label_path)
+        
+        logging.info("Loaded Workout Recommender Model successfully...")
+        
+        if self.engine == "compiled":
+            nutrition_model = self.compile_model(nutrition_model, CompiledNutrientModel)
+            workout_model = self.compile_model(workout_model, CompiledWorkoutModel)
+        
+        # DataFrame-free feature encoders for the request path
+        nutrition_features = self.build_feature_encoder(nutrition_model)
+        workout_features = self.build_feature_encoder(workout_model)
+        
+        # Optional prediction lookup tables
+        nutrition_lookup = self.load_lookup_table(os.path.join(NUTRITION_OUT, NUTRITION_LOOKUP_FILE), self.nutrition_model_path)
+        workout_lookup = self.load_lookup_table(os.path.join(WORKOUT_OUT, WORKOUT_LOOKUP_FILE), self.workout_model_path)
+        
+        # one reference assignment: requests see either the old or the new artifacts, never a mix
+        self.artifacts = RecommenderArtifacts(
+            nutrition_model, meal_encoder, nutrition_features, nutrition_lookup,
+            workout_model, workout_encoder, workout_features, workout_lookup)
+        
+    def reload_models(self):
+        """
+        Reload the recommender artifacts from disk and invalidate cached results.
+        The cache is cleared after the swap: in-flight requests scored with the old
+        artifacts hold the old cache generation and their puts are dropped.
+        """
+        try:
+            logging.info("Reloading recommender models...")
+            self.load_recommenders()
+            if self.cache is not None:
+                self.cache.clear()
+        except Exception as e:
+            logging.info(f"Error while reloading recommender models: {e}")
+            raise PersonalizedCoachException(e,sys)
+        
+    def build_result_cache(self):
+        max_size = int(os.getenv("RESULT_CACHE_MAX_SIZE", RESULT_CACHE_MAX_SIZE))
+        if max_size <= 0:
+            logging.info("Recommendation result cache disabled.")
+            return None
+        return RecommendationCache(
+            max_size=max_size,
+            ttl_seconds=float(os.getenv("RESULT_CACHE_TTL_SECONDS", RESULT_CACHE_TTL_SECONDS))
+        )
+        
+    def build_answer_cache(self):
+        max_size = int(os.getenv("SEMANTIC_CACHE_MAX_SIZE", SEMANTIC_CACHE_MAX_SIZE))
+        if max_size <= 0:
+            logging.info("Semantic answer cache disabled.")
+            return None
+        return SemanticAnswerCache(
+            max_size=max_size,
+            ttl_seconds=float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", SEMANTIC_CACHE_TTL_SECONDS)),
+            min_similarity=float(os.getenv("SEMANTIC_CACHE_MIN_SIMILARITY", SEMANTIC_CACHE_MIN_SIMILARITY)),
+            wait_timeout_seconds=float(os.getenv("SEMANTIC_CACHE_WAIT_TIMEOUT_SECONDS", SEMANTIC_CACHE_WAIT_TIMEOUT_SECONDS))
+        )
+        
+    def cache_stats(self) -> dict:
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats()}
+        
+    def chat_cache_stats(self) -> dict:
+        answer_cache = self.chatbot.answer_cache
+        return {
+            "embedding": self.chatbot.retriever.embedding_cache.stats(),
+            "answers": {"enabled": False} if answer_cache is None else {"enabled": True, **answer_cache.stats()}
+        }
+        
+    def compile_model(self, model, compiled_cls):
+        """
+        Compile a loaded sklearn model and check parity on synthetic rows.
+        Falls back to the sklearn model if the compiled outputs differ.
+        """
+        compiled = compiled_cls(model)
+        report = verify_parity(model, compiled, sample_inputs(compiled.preprocessor))
+        if not report["passed"]:
+            logging.warning(f"{compiled_cls.__name__} parity check failed, serving sklearn model: {report}")
+            return model
+        logging.info(f"{compiled_cls.__name__} ready, parity check: {report}")
+        return compiled
+        
+    def build_feature_encoder(self, model):
+        """
+        Build a FeatureEncoder from the model's fitted preprocessor.
+        Returns None (sklearn preprocessor path) if it does not reproduce the sklearn features.
+        """
+        try:
+            encoder = FeatureEncoder(model.preprocessor)
+            if encoder.check_parity(sample_inputs(model.preprocessor)):
+                return encoder
+            logging.warning("FeatureEncoder parity check failed, using the sklearn preprocessor.")
+        except PersonalizedCoachException as e:
+            logging.warning(f"FeatureEncoder unavailable, using the sklearn preprocessor: {e}")
+        return None
+        
+    def load_lookup_table(self, filepath:str, model_path:str):
+        """
+        Load a prediction lookup table if lookup mode is on, the table exists
+        and it was built from the model file at model_path.
+        """
+        if not self.use_lookup:
+            return None
+        if not os.path.exists(filepath):
+            logging.warning(f"Lookup mode enabled but no lookup table at {filepath}, serving the model.")
+            return None
+        table = PredictionLookupTable.load(filepath)
+        if table.model_fingerprint != artifact_fingerprint(model_path):
+            logging.warning(f"Lookup table {filepath} was not built from {model_path} (stale or unversioned), serving the model.")
+            return None
+        logging.info(f"Lookup table loaded from {filepath}, deviation report: {table.report}")
+        return table
+        
+    def encode_features(self, model, encoder, records:list):
+        """
+        Turn raw request records into the model's feature matrix.
+        """
+        if encoder is not None:
+            return encoder.encode_many(records)
+        return model.transform(pd.DataFrame(records))
+        
+    def score_records(self, model, encoder, lookup, records:list):
+        """
+        Predict one result dict per record.
+        Records inside the lookup table are answered from it, the rest by the model.
+        """
+        if lookup is None:
+            return model.predict_records(self.encode_features(model, encoder, records))
+        
+        indices = lookup.lookup(records)
+        hits = indices >= 0
+        if hits.all():
+            return model.to_records(*lookup.outputs_at(indices))
+        
+        results = [None]*len(records)
+        if hits.any():
+            hit_rows = np.flatnonzero(hits)
+            for i, result in zip(hit_rows, model.to_records(*lookup.outputs_at(indices[hit_rows]))):
+                results[i] = result
+        miss_rows = np.flatnonzero(~hits)
+        X = self.encode_features(model, encoder, [records[i] for i in miss_rows])
+        for i, result in zip(miss_rows, model.predict_records(X)):
+            results[i] = result
+        return results
+        
+    def normalize_records(self, records:list) -> list:
+        """
+        Canonical form of the requests, the same normalization the ETL applies at training time:
+        Transformer.clean_text on text fields, BMI rounded to bmi_precision. Runs whether or not
+        the cache is on, so the cache never changes what the model scores.
+        """
+        normalized = []
+        for record in records:
+            row = {}
+            for field, value in record.items():
+                if isinstance(value, str):
+                    value = self.transformer.clean_text(value)
+                elif field == 'bmi' and value is not None:
+                    value = round(float(value), self.bmi_precision)
+                row[field] = value
+            normalized.append(row)
+        return normalized
+        
+    def cached_recommend(self, kind:str, records:list, score_fn):
+        """
+        Normalize records, serve them from the result cache (keyed on the normalized record)
+        and score only the misses with score_fn(records, artifacts).
+        """
+        records = self.normalize_records(records)
+        if self.cache is None:
+            return score_fn(records, self.artifacts)
+        
+        # generation before artifacts: a reload in between bumps the generation, so results
+        # scored with the old artifacts are dropped instead of landing in the fresh cache
+        generation = self.cache.generation
+        artifacts = self.artifacts
+        keys = [self.cache.make_key(kind, record) for record in records]
+        results = [self.cache.get(key) for key in keys]
+        
+        miss_rows = [i for i, result in enumerate(results) if result is None]
+        if miss_rows:
+            for i, result in zip(miss_rows, score_fn([records[i] for i in miss_rows], artifacts)):
+                self.cache.put(keys[i], result, generation=generation)
+                results[i] = result
+        return results
+        
+    def score_nutrition(self, records:list, artifacts:RecommenderArtifacts):
+        """
+        Score nutrition records with one model call and decode meal names
+        with a single inverse_transform.
+        """
+        preds = self.score_records(artifacts.nutrition_model, artifacts.nutrition_features, artifacts.nutrition_lookup, records)
+        
+        # decode all meal names at once
+        meal_codes = np.fromiter((int(p['meal']) for p in preds), dtype=int, count=len(preds))
+        meals = artifacts.meal_encoder.inverse_transform(meal_codes)
+        for p, meal in zip(preds, meals):
+            p['meal'] = meal
+        return preds
+        
+    def score_workout(self, records:list, artifacts:RecommenderArtifacts):
+        """
+        Score workout records with one model call and decode workout names
+        with a single inverse_transform.
+        """
+        preds = self.score_records(artifacts.workout_model, artifacts.workout_features, artifacts.workout_lookup, records)
+        
+        # decode all workout names at once
+        workout_codes = np.fromiter((int(p['workout']) for p in preds), dtype=int, count=len(preds))
+        workouts = artifacts.workout_encoder.inverse_transform(workout_codes)
+        for p, workout in zip(preds, workouts):
+            p['workout'] = workout
+        return preds
+        
     def recommend_nutrition(self, user_data:dict):
         try:
-            user_df = pd.DataFrame([user_data])
-            preds = self.nutrition_model.predict(user_df)
-            
-            # decode meal name
-            for p in preds:
-                p['meal']=self.meal_encoder.inverse_transform([int(p['meal'])])[0]
-                
+            preds = self.cached_recommend('nutrition', [user_data], self.score_nutrition)
             logging.info("Nutrition recommendation completed...")
             return preds[0]
         
-        except PersonalizedCoachException as e:
+        except Exception as e:
             logging.info(f"Error during Nutrition inference: {e}")
             raise PersonalizedCoachException(e,sys) 
 
     def recommend_workout(self, user_data:dict):
         try:
-            user_df = pd.DataFrame([user_data])
-            preds = self.workout_model.predict(user_df)
-            
-            # decode workout name
-            for p in preds:
-                p['workout'] = self.workout_encoder.inverse_transform([int(p['workout'])])[0]
-
+            preds = self.cached_recommend('workout', [user_data], self.score_workout)
             logging.info("Workout recommendation completed...")
             return preds[0]
-        except PersonalizedCoachException as e:
+        except Exception as e:
             logging.info(f"Error during Workout inference: {e}")
-            
+            raise PersonalizedCoachException(e,sys)
+
+    def recommend_nutrition_batch(self, records:list):
+        """
+        Score many nutrition requests; cache misses go through a single model call.
+        """
+        try:
+            preds = self.cached_recommend('nutrition', records, self.score_nutrition)
+            logging.info(f"Batch nutrition recommendation completed for {len(preds)} records...")
+            return preds
+        except Exception as e:
+            logging.info(f"Error during batch Nutrition inference: {e}")
+            raise PersonalizedCoachException(e,sys)
+
+    def recommend_workout_batch(self, records:list):
+        """
+        Score many workout requests; cache misses go through a single model call.
+        """
+        try:
+            preds = self.cached_recommend('workout', records, self.score_workout)
+            logging.info(f"Batch workout recommendation completed for {len(preds)} records...")
+            return preds
+        except Exception as e:
+            logging.info(f"Error during batch Workout inference: {e}")
+            raise PersonalizedCoachException(e,sys)
+
     def chat_with_bot(self, query:str):
         try:
             response = self.chatbot.chat(query)
@@ -84,6 +355,34 @@ class InferencePipeline:
         except PersonalizedCoachException as e:
             logging.info(f"Error during ChatBot inference: {e}")
             raise PersonalizedCoachException(e,sys)
+
+    def chat_with_bot_stream(self, query:str):
+        """
+        Generator of chat events (see Hybrid_Chatbot.chat_stream).
+        """
+        return self.chatbot.chat_stream(query)
+
+    async def achat_with_bot(self, query:str, retrieve=None):
+        """
+        Async chat: retrieval through retrieve(query) (executor / micro-batcher), LLM through the async HF client.
+        """
+        try:
+            return await self.chatbot.achat(query, retrieve=retrieve)
+        except Exception as e:
+            logging.info(f"Error during async ChatBot inference: {e}")
+            raise PersonalizedCoachException(e,sys)
+        
+    def achat_with_bot_stream(self, query:str, retrieve=None):
+        """
+        Async generator of chat events (see Hybrid_Chatbot.achat_stream).
+        """
+        return self.chatbot.achat_stream(query, retrieve=retrieve)
+    
+    def retrieve_chat_batch(self, queries:list):
+        """
+        Embedding + FAQ search for a batch of chat queries (micro-batcher entry point).
+        """
+        return self.chatbot.retrieve_many_with_embeddings(queries)
         
 if __name__=="__main__":
     try:
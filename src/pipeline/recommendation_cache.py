@@ -0,0 +1,92 @@
+from src.custom_logging.logger import logging
+from src.contants import *
+from collections import OrderedDict
+import copy
+import threading
+import time
+
+class RecommendationCache:
+    """
+    Bounded in-process cache for recommendation results:
+    - keys are built from records already normalized by InferencePipeline.normalize_records,
+      i.e. exactly what the model scores, so the cache never changes a result
+    - least recently used entries are evicted once max_size is reached
+    - entries expire after ttl_seconds
+    - hit/miss/eviction counters are exposed through stats()
+    """
+    def __init__(self, max_size:int=RESULT_CACHE_MAX_SIZE, ttl_seconds:float=RESULT_CACHE_TTL_SECONDS, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+
+        self._entries = OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.generation = 0 # bumped by clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def make_key(self, kind:str, normalized_record:dict) -> tuple:
+        return (kind,) + tuple(sorted(normalized_record.items()))
+
+    def get(self, key):
+        """
+        Cached value for key, or None on a miss (absent or expired).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return copy.copy(value)
+
+    def put(self, key, value, generation:int=None):
+        """
+        Store value under key. If generation is given and the cache was cleared
+        since it was read, the value is stale and dropped.
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (self.clock() + self.ttl_seconds, copy.copy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Drop every entry, e.g. after the models are reloaded.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+            self.invalidations += 1
+        logging.info("Recommendation cache invalidated.")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
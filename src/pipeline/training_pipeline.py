@@ -17,30 +17,79 @@ dagshub.init(repo_owner='samarthchugh', repo_name='AI---Personalized-Workout-Nut
 mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI"))
 mlflow.set_experiment(os.getenv("MLFLOW_EXPERIMENT_NAME"))
 
-from src.models.Nutrition_recommender import NutrientModel, NutritionRecommender
-from src.models.workout_recommender import WorkoutModel, WorkoutRecommender
+from src.models.Nutrition_recommender import FusedNutrientModel, NutritionRecommender
+from src.models.workout_recommender import FusedWorkoutModel, WorkoutRecommender
 from src.models.chatbot_retriver import ChatRetriever
+from src.models.lookup_table import PredictionLookupTable, artifact_fingerprint
+from src.etl.processed_data import NUTRITION_SCHEMA, WORKOUT_SCHEMA, apply_schema, processed_dir, processed_path, read_processed
 
 class TrainingPipeline:
-    def __init__(self):
-        # DATA
-        self.nutrition_csv=NUTRITION_PATH
-        self.workout_csv=WORKOUT_PATH
-        self.faq_csv=FAQ_PATH
+    def __init__(self, build_lookup_tables:bool=BUILD_LOOKUP_TABLES, lookup_steps:dict=None, processed_format:str=None,
+                 data_dir:str=None):
+        # DATA (processed_format: "csv", "parquet" or "feather", as written by the ETL; data_dir: default $PROCESSED_DATA_DIR)
+        processed_format = processed_format or os.getenv("PROCESSED_FORMAT", PROCESSED_FORMAT)
+        data_dir = processed_dir(data_dir)
+        self.nutrition_csv=processed_path(os.path.join(data_dir, NUTRITION_PROCESSED_FILE), processed_format)
+        self.workout_csv=processed_path(os.path.join(data_dir, WORKOUT_PROCESSED_FILE), processed_format)
+        self.faq_csv=processed_path(os.path.join(data_dir, FAQ_PROCESSED_FILE), processed_format)
         
         # OUTPUT DIR
         self.nutrition_out=NUTRITION_OUT
         self.workout_out=WORKOUT_OUT
         self.chatbot_out=CHATBOT_OUT
         
-    def train_nutrition(self):
+        # optional prediction lookup tables
+        self.build_lookup_tables=build_lookup_tables
+        self.lookup_steps=lookup_steps or {'age':LOOKUP_AGE_STEP, 'bmi':LOOKUP_BMI_STEP}
+        
+    def build_lookup_table(self, model, X, output_names:list, filepath:str, model_path:str):
+        """
+        Score the full categorical x age x bmi grid and save it next to the model.
+        The table records the fingerprint of the model file at model_path.
+        Logs the max deviation from the live model at the chosen resolution.
+        """
+        try:
+            numeric_ranges = {
+                col: (float(X[col].min()), float(X[col].max()), step)
+                for col, step in self.lookup_steps.items()
+            }
+            table = PredictionLookupTable.build(model, numeric_ranges, model_fingerprint=artifact_fingerprint(model_path))
+            report = table.evaluate(model, output_names)
+            table.save(filepath)
+            
+            for key, value in report.items():
+                mlflow.log_metric(f"lookup_{key}", float(value))
+            mlflow.log_artifact(filepath)
+            logging.info(f"Lookup table saved at {filepath}, deviation report: {report}")
+            print(f"Lookup table saved! deviation report: {report}")
+            return table
+        except Exception as e:
+            logging.info(f"Error occur in build_lookup_table function: {e}")
+            raise PersonalizedCoachException(e,sys)
+        
+    def remove_stale_lookup_table(self, filepath:str):
+        """
+        Delete a lookup table left by a previous model when this run does not rebuild it.
+        """
+        if os.path.exists(filepath):
+            os.remove(filepath)
+            logging.info(f"Removed stale lookup table {filepath}")
+        
+    def train_nutrition(self, df:pd.DataFrame=None):
+        """
+        df: transformed nutrition data handed over in memory; read from the processed file when None.
+        """
         try:
             # mlflow.set_experiment("Nutrition-Recommender")
 
-            df = pd.read_csv(self.nutrition_csv)
             feature_cols = ['age','gender','bmi','goal','diet_type']
             target_meal = 'meal_name'
             target_nutrients = ['calories','protein_g','fats_g','carbs_g']
+            columns = feature_cols + [target_meal] + target_nutrients
+            if df is None:
+                df = read_processed(self.nutrition_csv, columns=columns, schema=NUTRITION_SCHEMA)
+            else:
+                df = apply_schema(df[columns], NUTRITION_SCHEMA)
             
             X = df[feature_cols]
             y_meal = df[target_meal]
@@ -66,9 +115,11 @@ class TrainingPipeline:
                 
                 nutrition_model.fit(X_train,y_meal_train,y_nutrients_train)
                 
+                # combined model shares one preprocessor between both estimators
+                combined = FusedNutrientModel.from_recommender(nutrition_model)
+                
                 # Evaluate
-                meal_pred = nutrition_model.predict_meal(X_test)
-                nutrients_pred = nutrition_model.predict_nutrients(X_test)
+                meal_pred, nutrients_pred = combined.predict_encoded(combined.transform(X_test))
                 
                 meal_acc = accuracy_score(y_meal_test, meal_pred)
                 mlflow.log_metric("meal_accuracy",float(meal_acc))
@@ -87,29 +138,38 @@ class TrainingPipeline:
                 joblib.dump(meal_le, meal_le_path)
                 
                 # save combined model
-                combined = NutrientModel(
-                    meal_model = nutrition_model.meal_pipeline,
-                    nutrients_model = nutrition_model.nutrients_pipeline
-                )
                 combined_path = os.path.join(self.nutrition_out, "nutrition_combined_model.joblib")
                 combined.save(combined_path)
                 
                 # log artifacts
                 mlflow.log_artifact(meal_le_path)
                 mlflow.log_artifact(combined_path)
+                
+                lookup_path = os.path.join(self.nutrition_out, NUTRITION_LOOKUP_FILE)
+                if self.build_lookup_tables:
+                    self.build_lookup_table(combined, X, ['meal','nutrients'], lookup_path, combined_path)
+                else:
+                    self.remove_stale_lookup_table(lookup_path)
             print(f"Nutrition model trained and saved! Meal acc: {meal_acc:.3f}")
             return combined
         except PersonalizedCoachException as e:
             logging.info("Error occur in train_nutrition function: ",e)
             raise PersonalizedCoachException(e,sys)
         
-    def train_workout(self):
+    def train_workout(self, df:pd.DataFrame=None):
+        """
+        df: transformed workout data handed over in memory; read from the processed file when None.
+        """
         try:
             # mlflow.set_experiment("Workout-Recommender")
-            df = pd.read_csv(self.workout_csv)
             feature_cols = ['intensity','muscle_group','age','gender','goal','bmi','fitness_level']
             target_workout_name = 'name'
             target_duration = 'duration_min'
+            columns = feature_cols + [target_workout_name, target_duration]
+            if df is None:
+                df = read_processed(self.workout_csv, columns=columns, schema=WORKOUT_SCHEMA)
+            else:
+                df = apply_schema(df[columns], WORKOUT_SCHEMA)
             
             X = df[feature_cols]
             y_workout_name = df[target_workout_name]
@@ -133,9 +193,11 @@ class TrainingPipeline:
                 
                 workout_model.fit(X_train,y_workout_train,y_duration_train)
                 
+                # combined model shares one preprocessor between both estimators
+                combined = FusedWorkoutModel.from_recommender(workout_model)
+                
                 # evaluate
-                workout_pred = workout_model.predict_workout(X_test)
-                duration_pred = workout_model.predict_duration(X_test)
+                workout_pred, duration_pred = combined.predict_encoded(combined.transform(X_test))
                 
                 workout_acc = accuracy_score(y_workout_test, workout_pred)
                 mlflow.log_metric("Workout-Accuracy",float(workout_acc))
@@ -151,33 +213,36 @@ class TrainingPipeline:
                 joblib.dump(workout_enc,workout_le_path)
                 
                 # save combined model
-                combined = WorkoutModel(
-                    workout_model=workout_model.workout_pipeline,
-                    duration_model=workout_model.duration_pipeline
-                )
                 combined_path = os.path.join(self.workout_out,"workout_combined_model.joblib")
                 combined.save(combined_path)
                 
                 # log artifacts
                 mlflow.log_artifact(workout_le_path)
                 mlflow.log_artifact(combined_path)
+                
+                lookup_path = os.path.join(self.workout_out, WORKOUT_LOOKUP_FILE)
+                if self.build_lookup_tables:
+                    self.build_lookup_table(combined, X, ['workout','duration'], lookup_path, combined_path)
+                else:
+                    self.remove_stale_lookup_table(lookup_path)
             print(f"Workout model trained and saved! workout acc: {workout_acc:.3f}")
             return combined
         except PersonalizedCoachException as e:
             logging.info("Error occur in train_workout function: ",e)
             raise PersonalizedCoachException(e,sys)
         
-    def train_retrievel_chatbot(self):
+    def train_retrievel_chatbot(self, df:pd.DataFrame=None):
         try:
             # mlflow.set_experiment("ChatBot-Retriever")
-            df = pd.read_csv(self.faq_csv)
+            if df is None:
+                df = read_processed(self.faq_csv)
             # expect columns ['question','answer']
             if not {'question','answer'}.issubset(set(df.columns)):
                 raise ValueError("FAQ CSV must contain 'question' and 'answer' columns")
             
             chatbot = ChatRetriever(device='cpu')
             logging.info("Training Retrievel Chatbot...")
-            chatbot.fit(df,question_col='question', answer_col='answer', n_neighbors=6)
+            chatbot.fit(df,question_col='question', answer_col='answer')
             
             os.makedirs(CHATBOT_OUT, exist_ok=True)
             chatbot.save(CHATBOT_OUT)
@@ -185,11 +250,14 @@ class TrainingPipeline:
             # Log artifacts under mlflow
             with mlflow.start_run(run_name="chatbot_retriever_build"):
                 mlflow.log_param("n_faqs", len(df))
-                # log embeddings file & faq csv & nn file & embedder (these are in CHATBOT_OUT)
+                # log embeddings file & faq csv & embedder (these are in CHATBOT_OUT)
                 mlflow.log_artifact(os.path.join(CHATBOT_OUT, 'faq_data.csv'))
                 mlflow.log_artifact(os.path.join(CHATBOT_OUT, 'faq_embeddings.npy'))
-                mlflow.log_artifact(os.path.join(CHATBOT_OUT, 'nn.joblib'))
                 mlflow.log_artifact(os.path.join(CHATBOT_OUT, 'embedder_name.txt'))
+                mlflow.log_param("index_type", type(chatbot.index).__name__)
+                if os.path.exists(os.path.join(CHATBOT_OUT, IVF_INDEX_FILE)):
+                    mlflow.log_param("ivf_n_lists", chatbot.index.n_lists)
+                    mlflow.log_artifact(os.path.join(CHATBOT_OUT, IVF_INDEX_FILE))
             print("Chatbot retriever built and saved.")
             return chatbot
         except PersonalizedCoachException as e:
@@ -197,14 +265,19 @@ class TrainingPipeline:
             raise PersonalizedCoachException(e,sys)
         
 
-    def initiate_training(self):
+    def initiate_training(self, frames:dict=None):
+        """
+        frames: {table name: transformed DataFrame} from ETLPipeline.run_etl_in_memory();
+        datasets missing from it are read from the processed files.
+        """
         try:
+            frames = frames or {}
             logging.info("Initiate Training ....")
-            self.train_nutrition()
+            self.train_nutrition(frames.get(NUTRITION_TABLE_NAME))
             print("Nutrition Model Trained...")
-            self.train_workout()
+            self.train_workout(frames.get(WORKOUTS_TABLE_NAME))
             print("Workout Model Trained...")
-            self.train_retrievel_chatbot()
+            self.train_retrievel_chatbot(frames.get(FAQ_TABLE_NAME))
             print("Retriever ChatBot Trained...")
         except PersonalizedCoachException as e:
             logging.info(f"error in initiating the model training: {e}")
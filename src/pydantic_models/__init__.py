@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List
+from src.contants import RECOMMEND_BATCH_MAX_SIZE
 
 class NutritionInput(BaseModel):
     age:int
@@ -16,5 +18,11 @@ class WorkoutInput(BaseModel):
     bmi: float
     fitness_level: str
     
+class NutritionBatchInput(BaseModel):
+    records: List[NutritionInput] = Field(..., min_length=1, max_length=RECOMMEND_BATCH_MAX_SIZE)
+    
+class WorkoutBatchInput(BaseModel):
+    records: List[WorkoutInput] = Field(..., min_length=1, max_length=RECOMMEND_BATCH_MAX_SIZE)
+    
 class ChatInput(BaseModel):
     query: str
\ No newline at end of file
@@ -2,20 +2,33 @@
 from src.exception.exception import PersonalizedCoachException
 from src.etl.etl_pipeline import ETLPipeline
 from src.pipeline.training_pipeline import TrainingPipeline
+from src.contants import TRAINING_HANDOFF, PERSIST_PROCESSED
 import os,sys
 from dotenv import load_dotenv
 load_dotenv()
 
 class Trainer:
-    def __init__(self):
+    def __init__(self, handoff:str=None, persist:str=None):
+        """
+        handoff: "files" (ETL writes the processed files, training reads them back) or "memory"
+        (transformed DataFrames go straight to training); persist: processed files in memory
+        handoff, "async", "sync" or "none". Both default to the environment / constants.
+        """
         self.etl=ETLPipeline()
         self.training=TrainingPipeline()
+        self.handoff=handoff or os.getenv("TRAINING_HANDOFF", TRAINING_HANDOFF)
+        self.persist=persist or os.getenv("PERSIST_PROCESSED", PERSIST_PROCESSED)
         
     def initiate_trainer(self):
         try:
-            self.etl.run_etl()
-            self.training.initiate_training()
-        except PersonalizedCoachException as e:
+            if self.handoff == "memory":
+                frames = self.etl.run_etl_in_memory(persist=self.persist)
+                self.training.initiate_training(frames)
+                self.etl.wait_for_persistence()
+            else:
+                self.etl.run_etl()
+                self.training.initiate_training()
+        except Exception as e:
             raise PersonalizedCoachException(e,sys)
 if __name__=="__main__":
     train=Trainer().initiate_trainer()
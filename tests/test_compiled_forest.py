@@ -0,0 +1,31 @@
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from src.models.compiled_forest import CompiledForest
+
+def make_data(n_samples=300, n_features=6, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_samples, n_features))
+    labels = np.array(["low", "mid", "high"])[np.digitize(X[:, 0] + 0.5 * X[:, 1], [-0.5, 0.5])]
+    target = 3.0 * X[:, 0] - X[:, 2] ** 2 + rng.normal(scale=0.1, size=n_samples)
+    return X, labels, target
+
+def test_classifier_parity():
+    X, labels, _ = make_data()
+    forest = RandomForestClassifier(n_estimators=25, max_depth=8, random_state=42).fit(X, labels)
+    compiled = CompiledForest(forest)
+    X_new = make_data(seed=1)[0]
+    np.testing.assert_array_equal(compiled.predict_proba(X_new), forest.predict_proba(X_new))
+    np.testing.assert_array_equal(compiled.predict(X_new), forest.predict(X_new))
+
+def test_regressor_parity():
+    X, _, target = make_data()
+    forest = RandomForestRegressor(n_estimators=25, random_state=42).fit(X, target)
+    compiled = CompiledForest(forest)
+    X_new = make_data(seed=1)[0]
+    np.testing.assert_array_equal(compiled.predict(X_new), forest.predict(X_new))
+
+def test_single_row_parity():
+    X, labels, _ = make_data()
+    forest = RandomForestClassifier(n_estimators=10, random_state=42).fit(X, labels)
+    compiled = CompiledForest(forest)
+    np.testing.assert_array_equal(compiled.predict_proba(X[:1]), forest.predict_proba(X[:1]))
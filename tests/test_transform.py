@@ -0,0 +1,11 @@
+import numpy as np
+import pandas as pd
+from src.etl.transform import Transformer
+
+def test_normalize_categorical_matches_clean_text():
+    transformer = Transformer()
+    series = pd.Series([1, 1.0, None, np.nan, "Build  Muscle!", "build muscle", True, 1], dtype=object)
+    expected = series.astype(str).apply(transformer.clean_text)
+    normalized = transformer.normalize_categorical(series)
+    assert normalized.dtype == "category"
+    assert list(normalized.astype(str)) == list(expected)